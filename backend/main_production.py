@@ -3,21 +3,73 @@ Production FastAPI backend for the AI Terminal Emulator with static file serving
 """
 import os
 import sys
-from fastapi import FastAPI, HTTPException
+import json
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import List, Optional
 import asyncio
+from contextlib import asynccontextmanager
 
 # Add the src directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
 
-from terminal.core import TerminalCore
+from terminal.sessions import SessionManager
+from terminal.scheduler import ExecutionScheduler
+from terminal.suggestion_stream import SuggestionStream
+from terminal.output_buffer import parse_output_caps
+from terminal.file_index import FileIndex
+from terminal.system_monitor import get_sampler
+from terminal.metrics_store import MetricsFeed, json_point
 from terminal.ai_interpreter import GeminiAIInterpreter
 
-app = FastAPI(title="AI Terminal Emulator API", version="1.0.0")
+# Services are created when the server starts rather than at import: grep's
+# worker processes re-import the main module, and must not start them again
+file_index: Optional[FileIndex] = None
+sessions: Optional[SessionManager] = None
+ai_interpreter: Optional[GeminiAIInterpreter] = None
+sampler = None
+metrics_feed: Optional[MetricsFeed] = None
+scheduler: Optional[ExecutionScheduler] = None
+
+def start_services():
+    """Create the shared services and start their background threads."""
+    global file_index, sessions, ai_interpreter, sampler, metrics_feed, scheduler
+    # Optional path index for find and locate, refreshed in the background
+    file_index = FileIndex.from_environment()
+    if file_index is not None:
+        file_index.start()
+    
+    # Per-session terminals - each session starts in the home directory
+    sessions = SessionManager(
+        max_sessions=int(os.environ.get("TERMINAL_MAX_SESSIONS", 256)),
+        idle_timeout=float(os.environ.get("TERMINAL_SESSION_IDLE_TIMEOUT", 1800)),
+        max_history=int(os.environ.get("TERMINAL_MAX_HISTORY", 1000)),
+        initial_directory="~",
+        inline_output_limit=int(os.environ.get("TERMINAL_INLINE_OUTPUT", 256 * 1024)),
+        max_output=int(os.environ.get("TERMINAL_MAX_OUTPUT", 64 * 1024 * 1024)),
+        output_caps=parse_output_caps(os.environ.get("TERMINAL_OUTPUT_CAPS", "")),
+        file_index=file_index,
+        # Each session's history is logged here and reloaded after a restart
+        history_dir=os.environ.get("TERMINAL_HISTORY_DIR", ".cache/history") or None,
+        history_retention=float(os.environ.get("TERMINAL_HISTORY_RETENTION", 30 * 86400)) or None,
+    )
+    ai_interpreter = GeminiAIInterpreter()
+    # System metrics are sampled once and shared by top, ps and every metrics stream
+    sampler = get_sampler()
+    metrics_feed = MetricsFeed(sampler.metrics)
+    scheduler = ExecutionScheduler(max_workers=int(os.environ.get("TERMINAL_MAX_WORKERS", 8)))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the services when the server starts."""
+    start_services()
+    yield
+
+app = FastAPI(title="AI Terminal Emulator API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -28,12 +80,109 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global terminal instance - start in home directory
-terminal = TerminalCore(initial_directory="~")
-ai_interpreter = GeminiAIInterpreter()
+class ClientDisconnected(Exception):
+    """Raised when the client goes away before its request finishes."""
+
+async def wait_for_disconnect(http_request: Request):
+    """Return once the client has disconnected."""
+    while True:
+        message = await http_request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def cancel_on_disconnect(http_request: Request, coro):
+    """Await coro, cancelling it if the client disconnects first."""
+    task = asyncio.ensure_future(coro)
+    watcher = asyncio.ensure_future(wait_for_disconnect(http_request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+    if not task.done():
+        task.cancel()
+        raise ClientDisconnected()
+    return task.result()
+
+async def run_user_input(session_id: str, terminal, user_input: str):
+    """Interpret and execute user input in order for its session."""
+    async with scheduler.session(session_id):
+        processed = await ai_interpreter.process_input_async(user_input)
+        output, exit_code = await scheduler.submit(
+            terminal.execute_command, processed['command']
+        )
+        result = terminal.last_result
+    return processed, output, exit_code, result
+
+def ndjson_frame(frame: dict) -> str:
+    """Encode one frame of a streaming response."""
+    return json.dumps(frame) + "\n"
+
+async def stream_user_input(session_id: str, terminal, user_input: str):
+    """Interpret and execute user input, yielding NDJSON frames as output is produced."""
+    async with scheduler.session(session_id):
+        stream = None
+        result = None
+        try:
+            processed = await ai_interpreter.process_input_async(user_input)
+            yield ndjson_frame({
+                "type": "start",
+                "session_id": session_id,
+                "interpreted_command": processed['command'] if processed['is_natural_language'] else None,
+                "is_natural_language": processed['is_natural_language'],
+                "original_input": processed['original_input'],
+                "interpretation": processed['interpretation']
+            })
+            
+            # Each chunk is only produced once the previous frame has been
+            # sent, so a slow client holds back the command
+            stream = await scheduler.submit(terminal.stream_command, processed['command'])
+            limiter = terminal.output_limiter(stream)
+            async for chunk in scheduler.iterate(limiter.limit(stream)):
+                yield ndjson_frame({"type": "output", "data": chunk})
+            exit_code = stream.exit_code if stream.exit_code is not None else 0
+            
+            # Output past the inline limit is fetched page by page from /api/output
+            result = terminal.store_result(limiter)
+            if result is not None:
+                yield ndjson_frame({"type": "output", "data": "\n" + limiter.notice(result['result_id'])})
+        except Exception as e:
+            yield ndjson_frame({"type": "output", "data": f"Error: {str(e)}"})
+            exit_code = 1
+        finally:
+            # Stops the command if the client went away
+            if stream is not None:
+                stream.close()
+        
+        yield ndjson_frame({
+            "type": "exit",
+            "exit_code": exit_code,
+            "directory": terminal.current_directory,
+            "result": result
+        })
+
+def sse_event(event: str, data: dict) -> str:
+    """Encode one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_metrics(seconds: float, points: int):
+    """Yield recent metrics history, then each new point as it is sampled."""
+    queue = metrics_feed.subscribe()
+    try:
+        yield sse_event("history", sampler.metrics.query(seconds, points))
+        while True:
+            try:
+                point = await asyncio.wait_for(queue.get(), timeout=15)
+            except asyncio.TimeoutError:
+                # A comment keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            yield sse_event("sample", json_point(point))
+    finally:
+        metrics_feed.unsubscribe(queue)
 
 class CommandRequest(BaseModel):
     command: str
+    session_id: Optional[str] = None
 
 class SuggestionRequest(BaseModel):
     partial: str
@@ -42,10 +191,22 @@ class CommandResponse(BaseModel):
     output: str
     exit_code: int
     directory: str
+    session_id: str
     interpreted_command: Optional[str] = None
     is_natural_language: Optional[bool] = False
     original_input: Optional[str] = None
     interpretation: Optional[str] = None
+    result_id: Optional[str] = None
+    total_size: Optional[int] = None
+    truncated: bool = False
+
+class OutputPageResponse(BaseModel):
+    result_id: str
+    data: str
+    offset: int
+    next_offset: int
+    total_size: int
+    capped: bool
 
 class SuggestionResponse(BaseModel):
     suggestions: List[str]
@@ -55,9 +216,10 @@ async def root():
     return {"message": "AI Terminal Emulator API", "status": "running"}
 
 @app.post("/api/execute", response_model=CommandResponse)
-async def execute_command(request: CommandRequest):
+async def execute_command(request: CommandRequest, http_request: Request):
     """Execute a terminal command or AI natural language command."""
     try:
+        session_id, terminal = sessions.get(request.session_id)
         user_input = request.command.strip()
         
         if not user_input:
@@ -65,14 +227,15 @@ async def execute_command(request: CommandRequest):
                 output="",
                 exit_code=0,
                 directory=terminal.current_directory,
+                session_id=session_id,
                 interpreted_command=None
             )
         
-        # Process input with AI interpreter
-        processed = ai_interpreter.process_input(user_input)
-        
-        # Execute the command
-        output, exit_code = terminal.execute_command(processed['command'])
+        # Interpret and execute without blocking the event loop, giving up
+        # on the work if the client goes away
+        processed, output, exit_code, result = await cancel_on_disconnect(
+            http_request, run_user_input(session_id, terminal, user_input)
+        )
         
         # Prepare response
         interpreted_command = processed['command'] if processed['is_natural_language'] else None
@@ -88,17 +251,44 @@ async def execute_command(request: CommandRequest):
             output=output,
             exit_code=exit_code,
             directory=terminal.current_directory,
+            session_id=session_id,
             interpreted_command=interpreted_command,
             is_natural_language=processed['is_natural_language'],
             original_input=processed['original_input'],
-            interpretation=processed['interpretation']
+            interpretation=processed['interpretation'],
+            result_id=result['result_id'] if result else None,
+            total_size=result['total_size'] if result else None,
+            truncated=result is not None
         )
         
+    except ClientDisconnected:
+        return Response(status_code=499)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/execute/stream")
+async def execute_command_stream(request: CommandRequest):
+    """Execute a command, streaming its output as newline-delimited JSON frames."""
+    session_id, terminal = sessions.get(request.session_id)
+    return StreamingResponse(
+        stream_user_input(session_id, terminal, request.command.strip()),
+        media_type="application/x-ndjson"
+    )
+
+@app.get("/api/output/{result_id}", response_model=OutputPageResponse)
+async def get_output_page(result_id: str, session_id: Optional[str] = None,
+                          offset: int = 0, limit: int = 64 * 1024):
+    """Page through the full output of a command whose output was truncated."""
+    terminal = sessions.lookup(session_id)
+    if terminal is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    page = await scheduler.submit(terminal.results.page, result_id, max(0, offset), max(1, limit))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Result not found or expired")
+    return OutputPageResponse(**page)
+
 @app.post("/api/suggestions", response_model=SuggestionResponse)
-async def get_suggestions(request: SuggestionRequest):
+async def get_suggestions(request: SuggestionRequest, http_request: Request):
     """Get AI-powered command suggestions."""
     try:
         partial = request.partial.strip()
@@ -107,22 +297,78 @@ async def get_suggestions(request: SuggestionRequest):
             return SuggestionResponse(suggestions=[])
         
         # Get AI suggestions
-        suggestions = await ai_interpreter.get_suggestions_async(partial)
+        suggestions = await cancel_on_disconnect(
+            http_request, ai_interpreter.get_suggestions_async(partial)
+        )
         
         return SuggestionResponse(suggestions=suggestions)
         
+    except ClientDisconnected:
+        return Response(status_code=499)
     except Exception as e:
         # Fallback to basic suggestions if AI fails
         basic_suggestions = ai_interpreter.get_basic_suggestions(request.partial)
         return SuggestionResponse(suggestions=basic_suggestions)
 
+@app.websocket("/api/suggestions/ws")
+async def suggestions_stream(websocket: WebSocket):
+    """Stream suggestions as the user types, debounced and cancelled server-side."""
+    await websocket.accept()
+    stream = SuggestionStream(
+        ai_interpreter,
+        websocket.send_json,
+        debounce=float(os.environ.get("SUGGESTION_DEBOUNCE", 0.15))
+    )
+    try:
+        while True:
+            data = await websocket.receive_json()
+            stream.update(str(data.get("partial", "")))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await stream.close()
+
+@app.get("/api/metrics/history")
+async def get_metrics_history(seconds: Optional[float] = None, points: Optional[int] = 300,
+                              metrics: Optional[str] = None):
+    """Get recent system metrics, averaged down to at most the given number of points."""
+    try:
+        return sampler.metrics.query(seconds, points, metrics.split(",") if metrics else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/metrics/stream")
+async def get_metrics_stream(seconds: float = 300, points: int = 150):
+    """Stream system metrics as server-sent events: recent history, then every new sample."""
+    return StreamingResponse(
+        stream_metrics(seconds, points),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/status")
-async def get_status():
-    """Get terminal status."""
+async def get_status(session_id: Optional[str] = None):
+    """Get server status, plus the session's terminal status if it exists."""
+    # Health checks poll this without a session, so never create one here
+    terminal = sessions.lookup(session_id)
     return {
-        "current_directory": terminal.current_directory,
-        "command_history_count": len(terminal.command_history),
-        "ai_enabled": ai_interpreter.is_available()
+        "session_id": session_id if terminal is not None else None,
+        "current_directory": terminal.current_directory if terminal is not None else None,
+        "command_history_count": len(terminal.command_history) if terminal is not None else None,
+        "ai_enabled": ai_interpreter.is_available(),
+        "ai_cache": ai_interpreter.cache.stats(),
+        "model_calls": {
+            **ai_interpreter.single_flight.stats(),
+            **ai_interpreter.model_caller.stats()
+        },
+        "sessions": sessions.stats(),
+        "scheduler": scheduler.stats(),
+        "file_index": file_index.stats() if file_index is not None else None,
+        "metrics": {
+            "interval": sampler.interval,
+            "points": min(sampler.metrics.count, sampler.metrics.capacity),
+            "subscribers": metrics_feed.subscribers
+        }
     }
 
 # Serve static files from frontend build directory
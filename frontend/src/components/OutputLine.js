@@ -3,7 +3,7 @@ import { motion } from 'framer-motion';
 import SyntaxHighlighterComponent, { highlightTerminalOutput } from './SyntaxHighlighter';
 import './OutputLine.css';
 
-const OutputLine = ({ entry, directory, themeColors }) => {
+const OutputLine = ({ entry, directory, themeColors, onLoadMore }) => {
   const formatTimestamp = (timestamp) => {
     return timestamp.toLocaleTimeString('en-US', { 
       hour12: false,
@@ -138,6 +138,15 @@ const OutputLine = ({ entry, directory, themeColors }) => {
             }}
           >
             {renderContent()}
+            {entry.result && entry.result.nextOffset < entry.result.totalSize && onLoadMore && (
+              <button
+                className="output-load-more"
+                style={{ color: colors.accent, borderColor: colors.accent }}
+                onClick={() => onLoadMore(entry)}
+              >
+                Load more output ({Math.ceil((entry.result.totalSize - entry.result.nextOffset) / 1024)} KB remaining)
+              </button>
+            )}
           </div>
           <span 
             className="output-timestamp"
@@ -1,6 +1,5 @@
 import React, { useState, useEffect, useRef } from 'react';
 import { motion, AnimatePresence } from 'framer-motion';
-import axios from 'axios';
 import './Terminal.css';
 import Sidebar from './Sidebar';
 import CommandInput from './CommandInput';
@@ -10,6 +9,10 @@ import KeyboardShortcuts from './KeyboardShortcuts';
 import { ThemeProvider, useTheme } from '../contexts/ThemeContext';
 import { getSuggestions as getCommandSuggestions } from '../utils/commandRegistry';
 
+const SESSION_STORAGE_KEY = 'aiTerminalSessionId';
+// Bytes of truncated output fetched per load more click
+const OUTPUT_PAGE_SIZE = 256 * 1024;
+
 const TerminalContent = () => {
   const [history, setHistory] = useState([]);
   const [currentDirectory, setCurrentDirectory] = useState('~');
@@ -22,6 +25,11 @@ const TerminalContent = () => {
   const [commandHistory, setCommandHistory] = useState([]);
   const [selectedCommand, setSelectedCommand] = useState(null);
   const terminalRef = useRef(null);
+  const sessionIdRef = useRef(localStorage.getItem(SESSION_STORAGE_KEY));
+  const suggestionSocketRef = useRef(null);
+  const latestPartialRef = useRef('');
+  const localSuggestionsRef = useRef([]);
+  const activeRequestRef = useRef(null);
   const { getThemeColors, isAnimating } = useTheme();
   const themeColors = getThemeColors();
 
@@ -41,6 +49,15 @@ const TerminalContent = () => {
     ]);
   }, []);
 
+  useEffect(() => {
+    // Close the suggestions channel on unmount
+    return () => {
+      if (suggestionSocketRef.current) {
+        suggestionSocketRef.current.close();
+      }
+    };
+  }, []);
+
   useEffect(() => {
     // Auto scroll to bottom
     if (terminalRef.current) {
@@ -74,6 +91,13 @@ const TerminalContent = () => {
         clearTerminal();
       }
 
+      // Ctrl + C stops the running command, unless text is selected for copying
+      if (e.ctrlKey && e.key === 'c' && activeRequestRef.current &&
+          !window.getSelection().toString()) {
+        e.preventDefault();
+        activeRequestRef.current.abort();
+      }
+
       // F1 for shortcuts help
       if (e.key === 'F1') {
         e.preventDefault();
@@ -109,34 +133,135 @@ const TerminalContent = () => {
     
     setIsLoading(true);
 
+    // Aborting the request closes the stream, which stops the command server-side
+    const controller = new AbortController();
+    activeRequestRef.current = controller;
+
     try {
       const apiUrl = process.env.REACT_APP_API_URL || '';
-      const response = await axios.post(`${apiUrl}/api/execute`, {
-        command: command.trim()
+      const response = await fetch(`${apiUrl}/api/execute/stream`, {
+        method: 'POST',
+        signal: controller.signal,
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          command: command.trim(),
+          session_id: sessionIdRef.current
+        })
       });
+      if (!response.ok) {
+        throw new Error(`Request failed with status code ${response.status}`);
+      }
 
-      // Handle natural language interpretation
-      if (response.data.is_natural_language && response.data.interpretation) {
-        const interpretationEntry = {
-          type: 'system',
-          content: response.data.interpretation,
+      // Output arrives as newline-delimited JSON frames while the command runs
+      const outputId = `${Date.now()}-${Math.random()}`;
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffered = '';
+      let output = '';
+      let lastChunk = '';
+      let hasOutputEntry = false;
+
+      const updateOutput = (type, result = null) => {
+        const outputEntry = {
+          id: outputId,
+          type,
+          content: output,
           timestamp: new Date()
         };
-        setHistory(prev => [...prev, interpretationEntry]);
+        if (result) {
+          // The rest of the output is fetched page by page on request
+          outputEntry.result = {
+            resultId: result.result_id,
+            nextOffset: result.inline_size,
+            totalSize: result.total_size
+          };
+        }
+        if (hasOutputEntry) {
+          setHistory(prev => prev.map(entry => entry.id === outputId ? outputEntry : entry));
+        } else {
+          hasOutputEntry = true;
+          setHistory(prev => [...prev, outputEntry]);
+        }
+      };
+
+      const handleFrame = (frame) => {
+        if (frame.type === 'start') {
+          // Remember the session so the backend keeps our directory and history
+          if (frame.session_id && frame.session_id !== sessionIdRef.current) {
+            sessionIdRef.current = frame.session_id;
+            localStorage.setItem(SESSION_STORAGE_KEY, frame.session_id);
+          }
+
+          // Handle natural language interpretation
+          if (frame.is_natural_language && frame.interpretation) {
+            const interpretationEntry = {
+              type: 'system',
+              content: frame.interpretation,
+              timestamp: new Date()
+            };
+            setHistory(prev => [...prev, interpretationEntry]);
+          }
+        } else if (frame.type === 'output') {
+          output += frame.data;
+          lastChunk = frame.data;
+          updateOutput('output');
+        } else if (frame.type === 'exit') {
+          if (frame.result) {
+            // Drop the truncation notice; a load more button replaces it
+            output = output.slice(0, output.length - lastChunk.length);
+          }
+          updateOutput(frame.exit_code === 0 ? 'output' : 'error', frame.result);
+          if (frame.directory) {
+            setCurrentDirectory(frame.directory);
+          }
+        }
+      };
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => handleFrame(JSON.parse(line)));
       }
 
-      const outputEntry = {
-        type: response.data.exit_code === 0 ? 'output' : 'error',
-        content: response.data.output,
+    } catch (error) {
+      const errorEntry = error.name === 'AbortError' ? {
+        type: 'system',
+        content: '^C',
+        timestamp: new Date()
+      } : {
+        type: 'error',
+        content: `Error: ${error.message}`,
         timestamp: new Date()
       };
+      setHistory(prev => [...prev, errorEntry]);
+    }
 
-      setHistory(prev => [...prev, outputEntry]);
-      
-      if (response.data.directory) {
-        setCurrentDirectory(response.data.directory);
-      }
+    activeRequestRef.current = null;
+    setIsLoading(false);
+  };
 
+  const loadMoreOutput = async (entry) => {
+    const { resultId, nextOffset } = entry.result;
+    try {
+      const apiUrl = process.env.REACT_APP_API_URL || '';
+      const params = new URLSearchParams({
+        session_id: sessionIdRef.current,
+        offset: nextOffset,
+        limit: OUTPUT_PAGE_SIZE
+      });
+      const response = await fetch(`${apiUrl}/api/output/${resultId}?${params}`);
+      if (!response.ok) {
+        throw new Error(`Request failed with status code ${response.status}`);
+      }
+      const page = await response.json();
+      setHistory(prev => prev.map(item => item.id === entry.id ? {
+        ...item,
+        content: item.content + page.data,
+        result: { ...item.result, nextOffset: page.next_offset }
+      } : item));
     } catch (error) {
       const errorEntry = {
         type: 'error',
@@ -145,42 +270,63 @@ const TerminalContent = () => {
       };
       setHistory(prev => [...prev, errorEntry]);
     }
+  };
 
-    setIsLoading(false);
+  const getSuggestionSocket = () => {
+    const existing = suggestionSocketRef.current;
+    if (existing && existing.readyState <= WebSocket.OPEN) {
+      return existing;
+    }
+
+    const apiUrl = process.env.REACT_APP_API_URL || window.location.origin;
+    const socket = new WebSocket(`${apiUrl.replace(/^http/, 'ws')}/api/suggestions/ws`);
+
+    socket.onmessage = (event) => {
+      const frame = JSON.parse(event.data);
+      // Ignore frames for input the user has already typed past
+      if (frame.partial !== latestPartialRef.current) return;
+
+      const allSuggestions = [...new Set([...localSuggestionsRef.current, ...frame.suggestions])];
+      setSuggestions(allSuggestions.slice(0, 10));
+      setShowSuggestions(allSuggestions.length > 0);
+    };
+    socket.onclose = () => {
+      if (suggestionSocketRef.current === socket) {
+        suggestionSocketRef.current = null;
+      }
+    };
+
+    suggestionSocketRef.current = socket;
+    return socket;
   };
 
-  const getSuggestions = async (partial) => {
+  const getSuggestions = (partial) => {
+    latestPartialRef.current = partial;
+
     if (partial.length < 1) {
       setSuggestions([]);
       setShowSuggestions(false);
       return;
     }
 
-    // Get local command suggestions first
-    const localSuggestions = getCommandSuggestions(partial, 5);
-    
-    // Try to get AI suggestions for natural language
+    // Show local command suggestions right away
+    const localSuggestions = getCommandSuggestions(partial, 5).map(s => s.command);
+    localSuggestionsRef.current = localSuggestions;
+    setSuggestions(localSuggestions);
+    setShowSuggestions(localSuggestions.length > 0);
+
+    // The backend debounces, drops superseded requests and streams
+    // its suggestions back over the socket
     try {
-      const apiUrl = process.env.REACT_APP_API_URL || '';
-      const response = await axios.post(`${apiUrl}/api/suggestions`, {
-        partial: partial
-      });
-      const aiSuggestions = response.data.suggestions || [];
-      
-      // Combine local and AI suggestions, removing duplicates
-      const allSuggestions = [...new Set([...localSuggestions.map(s => s.command), ...aiSuggestions])];
-      setSuggestions(allSuggestions.slice(0, 10));
-      setShowSuggestions(allSuggestions.length > 0);
-    } catch (error) {
-      // If AI suggestions fail, use local suggestions
-      if (localSuggestions.length > 0) {
-        const suggestionStrings = localSuggestions.map(s => s.command);
-        setSuggestions(suggestionStrings);
-        setShowSuggestions(true);
+      const socket = getSuggestionSocket();
+      const sendLatest = () => socket.send(JSON.stringify({ partial: latestPartialRef.current }));
+      if (socket.readyState === WebSocket.OPEN) {
+        sendLatest();
       } else {
-        setSuggestions([]);
-        setShowSuggestions(false);
+        socket.addEventListener('open', sendLatest, { once: true });
       }
+    } catch (error) {
+      // Keep the local suggestions if the channel is unavailable
     }
   };
 
@@ -288,6 +434,7 @@ const TerminalContent = () => {
                 entry={entry} 
                 directory={entry.directory || currentDirectory}
                 themeColors={themeColors}
+                onLoadMore={loadMoreOutput}
               />
             ))}
           </AnimatePresence>
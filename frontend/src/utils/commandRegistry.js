@@ -62,10 +62,16 @@ export const commandRegistry = {
       examples: ['find . -name "*.js"', 'find /home -type f -size +100M'],
       category: 'file-system'
     },
+    'locate': {
+      description: 'Find indexed files by name',
+      usage: 'locate [-i] [-b] [-e] [-l N] pattern',
+      examples: ['locate config.json', 'locate -b -i "*.md"'],
+      category: 'file-system'
+    },
     'ps': {
-      description: 'Display running processes',
-      usage: 'ps [options]',
-      examples: ['ps', 'ps aux', 'ps -ef'],
+      description: 'Display running processes, busiest first',
+      usage: 'ps [--sort cpu|mem|pid] [-n N] [-u user] [name...]',
+      examples: ['ps', 'ps --sort mem -n 10', 'ps -u root python'],
       category: 'system'
     },
     'top': {
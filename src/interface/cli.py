@@ -81,15 +81,8 @@ class CLIInterface:
                             print(f"{Fore.RED}{output}{Style.RESET_ALL}")
                     continue
                 
-                # Execute command
-                output, exit_code = self.terminal.execute_command(user_input)
-                
-                # Display output
-                if output:
-                    if exit_code == 0:
-                        print(output)
-                    else:
-                        print(f"{Fore.RED}{output}{Style.RESET_ALL}")
+                # Execute command, displaying output as it is produced
+                self.display_stream(self.terminal.stream_command(user_input))
                 
             except KeyboardInterrupt:
                 print(f"\n{Fore.YELLOW}Use 'exit' to quit{Style.RESET_ALL}")
@@ -101,6 +94,31 @@ class CLIInterface:
             except Exception as e:
                 print(f"{Fore.RED}Error: {str(e)}{Style.RESET_ALL}")
 
+    
+    def display_stream(self, stream):
+        """Print a command's output as it streams in."""
+        try:
+            if stream.exit_code is not None:
+                # Output is already complete, so errors can be shown in red
+                output = stream.read()
+                if output:
+                    if stream.exit_code == 0:
+                        print(output)
+                    else:
+                        print(f"{Fore.RED}{output}{Style.RESET_ALL}")
+                return
+            
+            wrote_output = False
+            for chunk in stream:
+                sys.stdout.write(chunk)
+                sys.stdout.flush()
+                wrote_output = True
+            if wrote_output:
+                print()
+        finally:
+            # Stops the command if Ctrl+C interrupted it
+            stream.close()
+
 
 def main():
     """Entry point for CLI interface."""
@@ -3,7 +3,8 @@ Web interface for the terminal using Flask.
 """
 import sys
 import os
-from flask import Flask, render_template, request, jsonify
+import json
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context
 
 # Add parent directory to path for imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -49,7 +50,8 @@ class WebInterface:
                 'prompt': self.terminal.get_prompt(),
                 'is_natural_language': processed['is_natural_language'],
                 'original_input': processed['original_input'],
-                'interpretation': processed['interpretation']
+                'interpretation': processed['interpretation'],
+                'result': self.terminal.last_result
             }
             
             # If it was natural language, show the interpretation
@@ -58,14 +60,60 @@ class WebInterface:
             
             return jsonify(response_data)
         
+        @self.app.route('/execute/stream', methods=['POST'])
+        def execute_command_stream():
+            data = request.get_json()
+            user_input = data.get('command', '').strip()
+            
+            def frames():
+                processed = self.ai_interpreter.process_input(user_input)
+                yield json.dumps({
+                    'type': 'start',
+                    'is_natural_language': processed['is_natural_language'],
+                    'original_input': processed['original_input'],
+                    'interpretation': processed['interpretation']
+                }) + '\n'
+                
+                stream = self.terminal.stream_command(processed['command'])
+                limiter = self.terminal.output_limiter(stream)
+                try:
+                    for chunk in limiter.limit(stream):
+                        yield json.dumps({'type': 'output', 'data': chunk}) + '\n'
+                finally:
+                    # Stops the command if the client went away
+                    stream.close()
+                
+                result = self.terminal.store_result(limiter)
+                if result is not None:
+                    notice = '\n' + limiter.notice(result['result_id'])
+                    yield json.dumps({'type': 'output', 'data': notice}) + '\n'
+                
+                yield json.dumps({
+                    'type': 'exit',
+                    'exit_code': stream.exit_code if stream.exit_code is not None else 0,
+                    'prompt': self.terminal.get_prompt(),
+                    'result': result
+                }) + '\n'
+            
+            return Response(stream_with_context(frames()), mimetype='application/x-ndjson')
+        
+        @self.app.route('/output/<result_id>', methods=['GET'])
+        def output_page(result_id):
+            # Page through output that was too large to return with the command
+            offset = request.args.get('offset', 0, type=int)
+            limit = request.args.get('limit', 64 * 1024, type=int)
+            page = self.terminal.results.page(result_id, max(0, offset), max(1, limit))
+            if page is None:
+                return jsonify({'error': 'Result not found or expired'}), 404
+            return jsonify(page)
+        
         @self.app.route('/complete', methods=['POST'])
         def auto_complete():
             data = request.get_json()
             partial_command = data.get('command', '')
             
-            # Simple completion for commands
-            commands = list(self.terminal.command_registry.commands.keys())
-            matches = [cmd for cmd in commands if cmd.startswith(partial_command)]
+            # Commands and recent history, most used first
+            matches = self.terminal.completion_index.complete(partial_command, 10)
             
             return jsonify({'completions': matches})
         
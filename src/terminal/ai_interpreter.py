@@ -1,29 +1,81 @@
 """
 AI-driven natural language command interpretation using Google Gemini.
 """
-import re
 import os
 import asyncio
-from typing import List, Optional
+from typing import Iterable, List, Optional
 import google.generativeai as genai
 from dotenv import load_dotenv
+from .interpretation_cache import InterpretationCache
+from .pattern_matcher import PatternMatcher
+from .input_classifier import InputClassifier
+from .commands import CommandRegistry
+from .model_calls import ModelCaller, ModelUnavailable, SingleFlight
+from .prefix_index import PrefixIndex
 
 # Load environment variables
 load_dotenv()
 
+# Bump when the interpretation prompt changes so cached results are not reused
+PROMPT_VERSION = "2"
+MODEL_NAME = 'gemini-pro'
+
+# Phrases offered as suggestions without asking the model
+COMMON_PHRASES = [
+    "create a new file called",
+    "create a new folder called", 
+    "show me the contents of",
+    "list the files in",
+    "go to directory",
+    "delete the file",
+    "copy file",
+    "move file",
+    "show current directory",
+    "show running processes",
+    "show system information",
+    "find file",
+    "clear the screen"
+]
+
 
 class GeminiAIInterpreter:
     """Interprets natural language commands using Google Gemini AI."""
     
-    def __init__(self):
+    def __init__(self, cache: Optional[InterpretationCache] = None,
+                 command_names: Optional[Iterable[str]] = None):
         self.api_key = os.getenv('GEMINI_API_KEY')
         self.model = None
         self.fallback_patterns = self._init_fallback_patterns()
+        self.pattern_matcher = PatternMatcher(self.fallback_patterns)
+        self.phrase_index = PrefixIndex(COMMON_PHRASES)
+        if command_names is None:
+            command_names = CommandRegistry().commands
+        # Commands the model's answers may start with
+        self.command_names = frozenset(command_names)
+        self.classifier = InputClassifier(self.command_names)
+        self.single_flight = SingleFlight()
+        self.model_caller = ModelCaller(
+            max_workers=int(os.getenv('AI_MAX_WORKERS', 4)),
+            rate=float(os.getenv('AI_RATE_LIMIT', 5)),
+            burst=float(os.getenv('AI_RATE_BURST', 10)),
+            timeout=float(os.getenv('AI_TIMEOUT', 15)),
+            failure_threshold=int(os.getenv('AI_BREAKER_THRESHOLD', 5)),
+            reset_timeout=float(os.getenv('AI_BREAKER_RESET', 30))
+        )
+        
+        if cache is None:
+            cache = InterpretationCache(
+                max_size=int(os.getenv('AI_CACHE_SIZE', 1024)),
+                ttl=float(os.getenv('AI_CACHE_TTL', 86400)),
+                path=os.getenv('AI_CACHE_PATH') or None,
+                version=f"{MODEL_NAME}:{PROMPT_VERSION}"
+            )
+        self.cache = cache
         
         if self.api_key:
             try:
                 genai.configure(api_key=self.api_key)
-                self.model = genai.GenerativeModel('gemini-pro')
+                self.model = genai.GenerativeModel(MODEL_NAME)
             except Exception as e:
                 print(f"Warning: Could not initialize Gemini AI: {e}")
                 self.model = None
@@ -38,41 +90,7 @@ class GeminiAIInterpreter:
         Returns:
             True if input appears to be natural language, False if it's a command
         """
-        input_text = input_text.strip().lower()
-        
-        # If it starts with common command patterns, it's likely a command
-        command_indicators = [
-            'ls', 'cd', 'pwd', 'mkdir', 'rm', 'cp', 'mv', 'cat', 'echo', 'touch',
-            'find', 'grep', 'ps', 'top', 'df', 'whoami', 'date', 'clear', 'history',
-            'git', 'npm', 'docker', 'python', 'node', 'sudo', 'chmod', 'chown'
-        ]
-        
-        first_word = input_text.split()[0] if input_text else ""
-        if first_word in command_indicators:
-            return False
-        
-        # If it contains natural language indicators, it's likely natural language
-        natural_language_indicators = [
-            'create', 'make', 'show', 'display', 'list', 'go to', 'change to',
-            'navigate to', 'delete', 'remove', 'copy', 'move', 'find', 'search',
-            'look for', 'where', 'what', 'how', 'can you', 'please', 'help me',
-            'i want', 'i need', 'tell me', 'give me', 'open', 'close', 'start',
-            'stop', 'run', 'execute', 'launch', 'install', 'uninstall', 'update'
-        ]
-        
-        for indicator in natural_language_indicators:
-            if indicator in input_text:
-                return True
-        
-        # If it's a single word and not a command, it might be natural language
-        if len(input_text.split()) == 1 and first_word not in command_indicators:
-            return True
-        
-        # If it contains spaces and doesn't start with a command, likely natural language
-        if ' ' in input_text and first_word not in command_indicators:
-            return True
-        
-        return False
+        return self.classifier.is_natural_language(input_text)
 
     def _init_fallback_patterns(self):
         """Initialize fallback regex patterns for when AI is unavailable."""
@@ -145,7 +163,8 @@ class GeminiAIInterpreter:
         Returns:
             Terminal command string or None if no match
         """
-        if self.model:
+        # Skip straight to the patterns while the model is failing
+        if self.model and self.model_caller.available():
             try:
                 return await self._interpret_with_gemini(natural_command)
             except Exception as e:
@@ -157,22 +176,34 @@ class GeminiAIInterpreter:
     
     def interpret(self, natural_command: str) -> Optional[str]:
         """Synchronous version of interpret_async."""
-        if self.model:
+        if self.model and self.model_caller.available():
             try:
-                loop = asyncio.get_event_loop()
-                return loop.run_until_complete(self._interpret_with_gemini(natural_command))
+                # asyncio.run works from worker threads, which have no event loop
+                return asyncio.run(self._interpret_with_gemini(natural_command))
             except Exception as e:
                 print(f"AI interpretation failed: {e}")
                 return self._interpret_with_patterns(natural_command)
         else:
             return self._interpret_with_patterns(natural_command)
     
+    async def _generate(self, prompt: str):
+        """Call the model, sharing the call with any identical prompt already in flight."""
+        return await self.single_flight.do(
+            prompt, lambda: self.model_caller.call(self.model.generate_content, prompt)
+        )
+    
     async def _interpret_with_gemini(self, natural_command: str) -> Optional[str]:
         """Use Gemini AI to interpret natural language commands."""
+        # The cache may read and commit to sqlite, so keep it off the event loop
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(None, self.cache.get, natural_command)
+        if cached is not None:
+            return cached
+        
         prompt = f"""
 You are a terminal command interpreter. Convert the following natural language request into a single, executable terminal command.
 
-Available commands include: ls, cd, pwd, mkdir, rmdir, rm, cp, mv, cat, echo, touch, find, grep, ps, top, df, whoami, date, clear, history, help
+Available commands include: ls, cd, pwd, mkdir, rmdir, rm, cp, mv, cat, echo, touch, find, grep, locate, ps, top, df, whoami, date, clear, history, help
 
 Rules:
 1. Return ONLY the terminal command, no explanations
@@ -186,24 +217,22 @@ Natural language request: "{natural_command}"
 Terminal command:"""
 
         try:
-            response = await asyncio.to_thread(self.model.generate_content, prompt)
+            response = await self._generate(prompt)
             command = response.text.strip()
             
             # Validate the response
             if command and command != "INVALID" and not command.startswith("I"):
                 # Basic validation - ensure it starts with a known command
                 first_word = command.split()[0]
-                valid_commands = {
-                    'ls', 'cd', 'pwd', 'mkdir', 'rmdir', 'rm', 'cp', 'mv', 
-                    'cat', 'echo', 'touch', 'find', 'grep', 'ps', 'top', 
-                    'df', 'whoami', 'date', 'clear', 'history', 'help'
-                }
-                
-                if first_word in valid_commands:
+                if first_word in self.command_names:
+                    await loop.run_in_executor(None, self.cache.put, natural_command, command)
                     return command
             
             return None
             
+        except ModelUnavailable:
+            # Let the caller fall back to the patterns
+            raise
         except Exception as e:
             print(f"Gemini API error: {e}")
             return None
@@ -212,28 +241,27 @@ Terminal command:"""
         """Fallback interpretation using regex patterns."""
         natural_command = natural_command.strip().lower()
         
-        for pattern, command_template in self.fallback_patterns.items():
-            match = re.match(pattern, natural_command)
-            if match:
-                groups = match.groups()
-                cleaned_groups = []
-                for group in groups:
-                    if group:
-                        cleaned = group.strip().strip('"\'')
-                        cleaned_groups.append(cleaned)
-                    else:
-                        cleaned_groups.append('')
-                
-                try:
-                    return command_template.format(*cleaned_groups)
-                except IndexError:
-                    return command_template.format(*cleaned_groups[:command_template.count('{')])
+        match = self.pattern_matcher.match(natural_command)
+        if not match:
+            return None
+        
+        command_template, groups = match
+        cleaned_groups = []
+        for group in groups:
+            if group:
+                cleaned = group.strip().strip('"\'')
+                cleaned_groups.append(cleaned)
+            else:
+                cleaned_groups.append('')
         
-        return None
+        try:
+            return command_template.format(*cleaned_groups)
+        except IndexError:
+            return command_template.format(*cleaned_groups[:command_template.count('{')])
     
     async def get_suggestions_async(self, partial_input: str) -> List[str]:
         """Get AI-powered command suggestions."""
-        if self.model and len(partial_input) >= 3:
+        if self.model and self.model_caller.available() and len(partial_input) >= 3:
             try:
                 return await self._get_ai_suggestions(partial_input)
             except Exception:
@@ -254,7 +282,7 @@ Focus on common terminal operations like file management, directory navigation,
 Completions:"""
 
         try:
-            response = await asyncio.to_thread(self.model.generate_content, prompt)
+            response = await self._generate(prompt)
             suggestions = [line.strip() for line in response.text.strip().split('\n') if line.strip()]
             return suggestions[:5]  # Limit to 5 suggestions
         except Exception:
@@ -262,30 +290,7 @@ Completions:"""
     
     def get_basic_suggestions(self, partial_input: str) -> List[str]:
         """Get basic suggestions using predefined patterns."""
-        suggestions = []
-        partial_lower = partial_input.lower()
-        
-        common_phrases = [
-            "create a new file called",
-            "create a new folder called", 
-            "show me the contents of",
-            "list the files in",
-            "go to directory",
-            "delete the file",
-            "copy file",
-            "move file",
-            "show current directory",
-            "show running processes",
-            "show system information",
-            "find file",
-            "clear the screen"
-        ]
-        
-        for phrase in common_phrases:
-            if phrase.startswith(partial_lower):
-                suggestions.append(phrase)
-        
-        return suggestions[:5]
+        return self.phrase_index.complete(partial_input.lower(), 5)
     
     def process_input(self, user_input: str) -> dict:
         """
@@ -299,43 +304,55 @@ Completions:"""
         """
         user_input = user_input.strip()
         
-        if not user_input:
+        if user_input and self.is_natural_language(user_input):
+            # Try to interpret as natural language
+            return self._build_result(user_input, True, self.interpret(user_input))
+        return self._build_result(user_input, False, None)
+    
+    async def process_input_async(self, user_input: str) -> dict:
+        """
+        Async version of process_input that awaits the model without blocking the event loop.
+        
+        Args:
+            user_input: User input string
+            
+        Returns:
+            Dictionary with 'command', 'is_natural_language', 'original_input', and 'interpretation'
+        """
+        user_input = user_input.strip()
+        
+        if user_input and self.is_natural_language(user_input):
+            interpreted_command = await self.interpret_async(user_input)
+            return self._build_result(user_input, True, interpreted_command)
+        return self._build_result(user_input, False, None)
+    
+    def _build_result(self, user_input: str, is_natural: bool,
+                      interpreted_command: Optional[str]) -> dict:
+        """Build the process_input result dictionary."""
+        if not is_natural:
+            # Empty input, or it's already a command
             return {
-                'command': '',
+                'command': user_input,
                 'is_natural_language': False,
                 'original_input': user_input,
                 'interpretation': None
             }
         
-        # Check if it's natural language
-        is_natural = self.is_natural_language(user_input)
-        
-        if is_natural:
-            # Try to interpret as natural language
-            interpreted_command = self.interpret(user_input)
-            if interpreted_command:
-                return {
-                    'command': interpreted_command,
-                    'is_natural_language': True,
-                    'original_input': user_input,
-                    'interpretation': f"Interpreted: '{user_input}' -> '{interpreted_command}'"
-                }
-            else:
-                # If interpretation fails, return the original input as a command
-                return {
-                    'command': user_input,
-                    'is_natural_language': False,
-                    'original_input': user_input,
-                    'interpretation': f"Could not interpret natural language: '{user_input}'"
-                }
-        else:
-            # It's already a command
+        if interpreted_command:
             return {
-                'command': user_input,
-                'is_natural_language': False,
+                'command': interpreted_command,
+                'is_natural_language': True,
                 'original_input': user_input,
-                'interpretation': None
+                'interpretation': f"Interpreted: '{user_input}' -> '{interpreted_command}'"
             }
+        
+        # If interpretation fails, return the original input as a command
+        return {
+            'command': user_input,
+            'is_natural_language': False,
+            'original_input': user_input,
+            'interpretation': f"Could not interpret natural language: '{user_input}'"
+        }
 
 
 # Backward compatibility
@@ -1,13 +1,62 @@
 """
 Command implementations for the terminal.
 """
+import errno
+import fnmatch
 import os
+import re
 import shutil
 import stat
 import time
 import subprocess
-from typing import Dict, List, Tuple, Callable
+from functools import lru_cache
+from typing import Dict, Generator, List, Optional, Tuple, Callable
 from datetime import datetime
+from .streams import CommandStream, join_lines, LINES_PER_CHUNK
+from .grep_engine import GrepEngine, collect_files
+from .find_engine import FindQuery, search_index, walk as find_walk
+from .file_index import GLOB_CHARS, longest_literal
+from .copy_engine import CopyJob
+from .system_monitor import (PROCESS_SORT_KEYS, DEFAULT_PROCESS_LIMIT,
+                             user_name, group_name)
+
+# Characters per chunk when streaming file contents
+READ_CHUNK_SIZE = 64 * 1024
+# ps options asking for every process, which is what ps always considers
+PS_ALL_OPTIONS = {'aux', 'ax', '-aux', '-e', '-f', '-ef', '-A', '-a', '-x'}
+# Entries per page of history -p, unless -n is given
+HISTORY_PAGE_SIZE = 50
+# Most matches history -s shows when history has no in-memory limit
+DEFAULT_HISTORY_LIMIT = 1000
+
+
+@lru_cache(maxsize=4096)
+def format_minute(minute: int) -> str:
+    """Format a modification time, given in minutes since the epoch, for ls -l."""
+    return time.strftime('%b %d %H:%M', time.localtime(minute * 60))
+
+
+def format_long_entry(name: str, path: str, stat_info: os.stat_result) -> str:
+    """
+    Format one line of ls -l output.
+
+    Args:
+        name: Name to show
+        path: Path of the entry, to show symlink targets
+        stat_info: lstat result for the entry
+
+    Returns:
+        Mode, link count, owner, group, size, date and name
+    """
+    mode = stat_info.st_mode
+    if stat.S_ISLNK(mode):
+        try:
+            name = f"{name} -> {os.readlink(path)}"
+        except OSError:
+            pass
+    return (f"{stat.filemode(mode)} {stat_info.st_nlink:>3} "
+            f"{user_name(stat_info.st_uid):<8} {group_name(stat_info.st_gid):<8} "
+            f"{stat_info.st_size:>8} {format_minute(int(stat_info.st_mtime // 60))} {name}")
 
 
 class CommandRegistry:
@@ -28,6 +77,7 @@ class CommandRegistry:
             'touch': self.cmd_touch,
             'find': self.cmd_find,
             'grep': self.cmd_grep,
+            'locate': self.cmd_locate,
             'ps': self.cmd_ps,
             'top': self.cmd_top,
             'df': self.cmd_df,
@@ -38,66 +88,92 @@ class CommandRegistry:
             'help': self.cmd_help,
             'exit': self.cmd_exit,
         }
+        # Commands that can produce unbounded output yield it in chunks
+        self.streaming_commands: Dict[str, Callable] = {
+            'ls': self.stream_ls,
+            'cp': self.stream_cp,
+            'mv': self.stream_mv,
+            'cat': self.stream_cat,
+            'find': self.stream_find,
+            'grep': self.stream_grep,
+            'locate': self.stream_locate,
+        }
     
     def execute(self, command: str, args: List[str], terminal) -> Tuple[str, int]:
         """Execute a command with given arguments."""
         return self.commands[command](args, terminal)
     
+    def stream(self, command: str, args: List[str], terminal) -> CommandStream:
+        """Execute a command with given arguments, returning its output as a stream."""
+        if command in self.streaming_commands:
+            return CommandStream(self.streaming_commands[command](args, terminal))
+        return CommandStream.from_result(*self.commands[command](args, terminal))
+    
+    def _collect(self, chunks: Generator[str, None, int]) -> Tuple[str, int]:
+        """Run a streaming command to completion."""
+        stream = CommandStream(chunks)
+        output = stream.read()
+        return output, stream.exit_code
+    
     def cmd_ls(self, args: List[str], terminal) -> Tuple[str, int]:
         """List directory contents."""
+        return self._collect(self.stream_ls(args, terminal))
+    
+    def stream_ls(self, args: List[str], terminal) -> Generator[str, None, int]:
+        """Stream a directory listing, stat-ing entries only as they are output."""
+        flags = set()
+        for arg in args:
+            if arg.startswith('-') and len(arg) > 1:
+                flags.update(arg[1:])
+        show_hidden = 'a' in flags
+        long_format = 'l' in flags
+        
+        # Remove flags from args to get path
+        path_args = [arg for arg in args if not arg.startswith('-')]
+        path = terminal.resolve_path(path_args[0] if path_args else terminal.current_directory)
+        
         try:
-            show_hidden = '-a' in args
-            long_format = '-l' in args
-            
-            # Remove flags from args to get path
-            path_args = [arg for arg in args if not arg.startswith('-')]
-            path = path_args[0] if path_args else terminal.current_directory
-            
-            if not os.path.isabs(path):
-                path = os.path.join(terminal.current_directory, path)
-            
-            if not os.path.exists(path):
-                return f"ls: cannot access '{path}': No such file or directory", 1
-            
-            if os.path.isfile(path):
-                return os.path.basename(path), 0
-            
-            items = os.listdir(path)
-            if not show_hidden:
-                items = [item for item in items if not item.startswith('.')]
-            
-            items.sort()
-            
-            if long_format:
-                output = []
-                for item in items:
-                    item_path = os.path.join(path, item)
-                    stat_info = os.stat(item_path)
-                    
-                    # File type and permissions
-                    mode = stat_info.st_mode
-                    if stat.S_ISDIR(mode):
-                        file_type = 'd'
-                    else:
-                        file_type = '-'
-                    
-                    perms = stat.filemode(mode)[1:]
-                    
-                    # Size and date
-                    size = stat_info.st_size
-                    mtime = datetime.fromtimestamp(stat_info.st_mtime)
-                    date_str = mtime.strftime('%b %d %H:%M')
-                    
-                    output.append(f"{file_type}{perms} {size:>8} {date_str} {item}")
-                
-                return '\n'.join(output), 0
-            else:
-                return '  '.join(items), 0
-                
+            stat_info = os.stat(path)
+        except FileNotFoundError:
+            yield f"ls: cannot access '{path}': No such file or directory"
+            return 1
+        except OSError as e:
+            yield f"ls: {str(e)}"
+            return 1
+        
+        if not stat.S_ISDIR(stat_info.st_mode):
+            name = os.path.basename(path)
+            yield format_long_entry(name, path, os.lstat(path)) if long_format else name
+            return 0
+        
+        try:
+            with os.scandir(path) as entries:
+                items = sorted((entry.name, entry) for entry in entries
+                               if show_hidden or not entry.name.startswith('.'))
         except PermissionError:
-            return f"ls: cannot open directory '{path}': Permission denied", 1
-        except Exception as e:
-            return f"ls: {str(e)}", 1
+            yield f"ls: cannot open directory '{path}': Permission denied"
+            return 1
+        
+        if not long_format:
+            first = True
+            for start in range(0, len(items), LINES_PER_CHUNK):
+                batch = items[start:start + LINES_PER_CHUNK]
+                yield ('' if first else '  ') + '  '.join(name for name, _ in batch)
+                first = False
+            return 0
+        
+        def lines():
+            for name, entry in items:
+                try:
+                    # DirEntry caches this; it is the only stat per entry
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    yield f"ls: cannot access '{name}': No such file or directory"
+                    continue
+                yield format_long_entry(name, entry.path, entry_stat)
+        
+        yield from join_lines(lines())
+        return 0
     
     def cmd_cd(self, args: List[str], terminal) -> Tuple[str, int]:
         """Change directory."""
@@ -115,10 +191,7 @@ class CommandRegistry:
         
         try:
             for dir_name in args:
-                if not os.path.isabs(dir_name):
-                    dir_path = os.path.join(terminal.current_directory, dir_name)
-                else:
-                    dir_path = dir_name
+                dir_path = terminal.resolve_path(dir_name)
                 
                 os.makedirs(dir_path, exist_ok=False)
             return "", 0
@@ -134,10 +207,7 @@ class CommandRegistry:
         
         try:
             for dir_name in args:
-                if not os.path.isabs(dir_name):
-                    dir_path = os.path.join(terminal.current_directory, dir_name)
-                else:
-                    dir_path = dir_name
+                dir_path = terminal.resolve_path(dir_name)
                 
                 os.rmdir(dir_path)
             return "", 0
@@ -157,10 +227,7 @@ class CommandRegistry:
         
         try:
             for file_name in files:
-                if not os.path.isabs(file_name):
-                    file_path = os.path.join(terminal.current_directory, file_name)
-                else:
-                    file_path = file_name
+                file_path = terminal.resolve_path(file_name)
                 
                 if not os.path.exists(file_path):
                     if not force:
@@ -180,66 +247,101 @@ class CommandRegistry:
     
     def cmd_cp(self, args: List[str], terminal) -> Tuple[str, int]:
         """Copy files and directories."""
-        if len(args) < 2:
-            return "cp: missing file operand", 1
-        
-        try:
-            source = args[0]
-            dest = args[1]
-            
-            if not os.path.isabs(source):
-                source = os.path.join(terminal.current_directory, source)
-            if not os.path.isabs(dest):
-                dest = os.path.join(terminal.current_directory, dest)
-            
-            if os.path.isdir(source):
-                shutil.copytree(source, dest)
-            else:
-                shutil.copy2(source, dest)
-            return "", 0
-        except Exception as e:
-            return f"cp: {str(e)}", 1
+        return self._collect(self.stream_cp(args, terminal))
+    
+    def stream_cp(self, args: List[str], terminal) -> Generator[str, None, int]:
+        """Copy files and directories, streaming progress for long copies."""
+        pairs, error = self._transfer_pairs('cp', args, terminal)
+        if error:
+            yield error
+            return 1
+        return (yield from CopyJob(pairs, 'cp').run())
     
     def cmd_mv(self, args: List[str], terminal) -> Tuple[str, int]:
         """Move/rename files and directories."""
-        if len(args) < 2:
-            return "mv: missing file operand", 1
+        return self._collect(self.stream_mv(args, terminal))
+    
+    def stream_mv(self, args: List[str], terminal) -> Generator[str, None, int]:
+        """Move files and directories, copying across filesystems with progress."""
+        pairs, error = self._transfer_pairs('mv', args, terminal)
+        if error:
+            yield error
+            return 1
         
-        try:
-            source = args[0]
-            dest = args[1]
-            
-            if not os.path.isabs(source):
-                source = os.path.join(terminal.current_directory, source)
-            if not os.path.isabs(dest):
-                dest = os.path.join(terminal.current_directory, dest)
-            
-            shutil.move(source, dest)
-            return "", 0
-        except Exception as e:
-            return f"mv: {str(e)}", 1
+        cross_device = []
+        for source, target in pairs:
+            try:
+                os.rename(source, target)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    yield f"mv: cannot move '{source}' to '{target}': {e.strerror or e}"
+                    return 1
+                cross_device.append((source, target))
+        if cross_device:
+            return (yield from CopyJob(cross_device, 'mv', move=True).run())
+        return 0
+    
+    def _transfer_pairs(self, command: str, args: List[str],
+                        terminal) -> Tuple[List[Tuple[str, str]], Optional[str]]:
+        """
+        Work out the (source, destination) paths of a cp or mv.
+        
+        Returns:
+            Tuple of (pairs, error message or None)
+        """
+        operands = [arg for arg in args if not arg.startswith('-')]
+        if len(operands) < 2:
+            return [], f"{command}: missing file operand"
+        
+        destination = terminal.resolve_path(operands[-1])
+        into_directory = os.path.isdir(destination)
+        if len(operands) > 2 and not into_directory:
+            return [], f"{command}: target '{operands[-1]}' is not a directory"
+        
+        pairs = []
+        for name in operands[:-1]:
+            source = terminal.resolve_path(name)
+            if not os.path.lexists(source):
+                return [], f"{command}: cannot stat '{name}': No such file or directory"
+            target = os.path.join(destination, os.path.basename(source)) if into_directory else destination
+            if target == source:
+                return [], f"{command}: '{name}' and '{operands[-1]}' are the same file"
+            if target.startswith(source.rstrip('/') + '/'):
+                return [], f"{command}: cannot {'copy' if command == 'cp' else 'move'} '{name}' into itself"
+            pairs.append((source, target))
+        return pairs, None
     
     def cmd_cat(self, args: List[str], terminal) -> Tuple[str, int]:
         """Display file contents."""
+        return self._collect(self.stream_cat(args, terminal))
+    
+    def stream_cat(self, args: List[str], terminal) -> Generator[str, None, int]:
+        """Stream file contents."""
         if not args:
-            return "cat: missing file operand", 1
+            yield "cat: missing file operand"
+            return 1
         
+        first = True
         try:
-            output = []
             for file_name in args:
-                if not os.path.isabs(file_name):
-                    file_path = os.path.join(terminal.current_directory, file_name)
-                else:
-                    file_path = file_name
+                file_path = terminal.resolve_path(file_name)
                 
                 with open(file_path, 'r', encoding='utf-8') as f:
-                    output.append(f.read())
-            
-            return '\n'.join(output), 0
+                    if not first:
+                        yield '\n'
+                    first = False
+                    while True:
+                        chunk = f.read(READ_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        yield chunk
+            return 0
         except FileNotFoundError:
-            return f"cat: {file_name}: No such file or directory", 1
+            yield ('' if first else '\n') + f"cat: {file_name}: No such file or directory"
+            return 1
         except Exception as e:
-            return f"cat: {str(e)}", 1
+            yield ('' if first else '\n') + f"cat: {str(e)}"
+            return 1
     
     def cmd_echo(self, args: List[str], terminal) -> Tuple[str, int]:
         """Display text."""
@@ -252,10 +354,7 @@ class CommandRegistry:
         
         try:
             for file_name in args:
-                if not os.path.isabs(file_name):
-                    file_path = os.path.join(terminal.current_directory, file_name)
-                else:
-                    file_path = file_name
+                file_path = terminal.resolve_path(file_name)
                 
                 if os.path.exists(file_path):
                     # Update timestamp
@@ -269,62 +368,166 @@ class CommandRegistry:
     
     def cmd_find(self, args: List[str], terminal) -> Tuple[str, int]:
         """Find files and directories."""
-        if not args:
-            path = terminal.current_directory
-            pattern = "*"
-        elif len(args) == 1:
-            if os.path.exists(args[0]):
-                path = args[0]
-                pattern = "*"
+        return self._collect(self.stream_find(args, terminal))
+    
+    def stream_find(self, args: List[str], terminal) -> Generator[str, None, int]:
+        """Stream paths of matching files and directories."""
+        try:
+            query = FindQuery(args, lambda path: os.path.exists(terminal.resolve_path(path)))
+        except ValueError as e:
+            yield f"find: {str(e)}"
+            return 1
+        
+        roots = [(root, terminal.resolve_path(root)) for root in query.roots]
+        index = terminal.file_index
+        if index is not None and query.names and all(index.covers(path) for _, path in roots):
+            # Name searches under indexed roots are answered without walking the disk
+            yield from join_lines(search_index(index, query, roots))
+            return 0
+        yield from join_lines(find_walk(query, roots))
+        return 1 if query.errors else 0
+    
+    def cmd_locate(self, args: List[str], terminal) -> Tuple[str, int]:
+        """Find indexed files by name."""
+        return self._collect(self.stream_locate(args, terminal))
+    
+    def stream_locate(self, args: List[str], terminal) -> Generator[str, None, int]:
+        """Stream indexed paths matching every pattern."""
+        flags = set()
+        limit = None
+        patterns = []
+        index = 0
+        while index < len(args):
+            arg = args[index]
+            if arg in ('-l', '-n', '--limit') and index + 1 < len(args):
+                if not args[index + 1].isdigit():
+                    yield f"locate: invalid limit: {args[index + 1]}"
+                    return 1
+                limit = int(args[index + 1])
+                index += 2
+                continue
+            if arg.startswith('-') and len(arg) > 1:
+                flags.update(arg[1:])
             else:
-                path = terminal.current_directory
-                pattern = args[0]
-        else:
-            path = args[0]
-            pattern = args[1]
+                patterns.append(arg)
+            index += 1
         
-        try:
-            if not os.path.isabs(path):
-                path = os.path.join(terminal.current_directory, path)
-            
-            results = []
-            for root, dirs, files in os.walk(path):
-                for item in dirs + files:
-                    if pattern == "*" or pattern in item:
-                        results.append(os.path.join(root, item))
-            
-            return '\n'.join(results), 0
-        except Exception as e:
-            return f"find: {str(e)}", 1
+        unknown = flags - set('ibe')
+        if unknown:
+            yield f"locate: invalid option -- '{sorted(unknown)[0]}'"
+            return 1
+        if not patterns:
+            yield "locate: no pattern to search for specified"
+            return 1
+        if terminal.file_index is None:
+            yield "locate: no file index configured; set FILE_INDEX_ROOTS"
+            return 1
+        
+        # Plain text matches anywhere; a glob has to match the whole path or name
+        ignore_case = 'i' in flags
+        tests = []
+        for pattern in patterns:
+            if any(char in pattern for char in GLOB_CHARS):
+                regex = re.compile(fnmatch.translate(pattern), re.IGNORECASE if ignore_case else 0)
+                tests.append(regex.match)
+            elif ignore_case:
+                tests.append(lambda text, lowered=pattern.lower(): lowered in text.lower())
+            else:
+                tests.append(lambda text, pattern=pattern: pattern in text)
+        
+        column = 'name' if 'b' in flags else 'path'
+        literal = max((longest_literal(pattern) for pattern in patterns), key=len)
+        
+        def matches():
+            found = 0
+            for path, _ in terminal.file_index.search(literal, column):
+                text = os.path.basename(path) if column == 'name' else path
+                if not all(test(text) for test in tests):
+                    continue
+                if 'e' in flags and not os.path.lexists(path):
+                    continue
+                yield path
+                found += 1
+                if found == limit:
+                    return
+        
+        first = yield from join_lines(matches())
+        return 1 if first else 0
     
     def cmd_grep(self, args: List[str], terminal) -> Tuple[str, int]:
         """Search text in files."""
-        if len(args) < 2:
-            return "grep: missing pattern or file", 1
+        return self._collect(self.stream_grep(args, terminal))
+    
+    def stream_grep(self, args: List[str], terminal) -> Generator[str, None, int]:
+        """Stream lines of files that match a pattern."""
+        flags = set()
+        operands = []
+        for arg in args:
+            if arg.startswith('-') and len(arg) > 1 and not operands:
+                flags.update(arg[1:])
+            else:
+                operands.append(arg)
         
-        pattern = args[0]
-        files = args[1:]
+        unknown = flags - set('rRiFE')
+        if unknown:
+            yield f"grep: invalid option -- '{sorted(unknown)[0]}'"
+            return 2
+        if len(operands) < 2:
+            yield "grep: missing pattern or file"
+            return 1
         
         try:
-            results = []
-            for file_name in files:
-                if not os.path.isabs(file_name):
-                    file_path = os.path.join(terminal.current_directory, file_name)
-                else:
-                    file_path = file_name
-                
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    for line_num, line in enumerate(f, 1):
-                        if pattern in line:
-                            results.append(f"{file_name}:{line_num}:{line.rstrip()}")
-            
-            return '\n'.join(results), 0
-        except Exception as e:
-            return f"grep: {str(e)}", 1
+            engine = GrepEngine(operands[0], fixed_strings='F' in flags,
+                                ignore_case='i' in flags)
+        except re.error as e:
+            yield f"grep: invalid pattern: {e}"
+            return 2
+        
+        files = collect_files(operands[1:], terminal, recursive=bool(flags & set('rR')))
+        yield from join_lines(engine.search(files))
+        return 1 if engine.errors else 0
     
     def cmd_ps(self, args: List[str], terminal) -> Tuple[str, int]:
-        """List running processes."""
-        return terminal.system_monitor.get_processes(), 0
+        """List running processes, busiest first."""
+        sort = 'cpu'
+        reverse = None
+        limit = DEFAULT_PROCESS_LIMIT
+        users = []
+        names = []
+        index = 0
+        while index < len(args):
+            arg = args[index]
+            if arg in PS_ALL_OPTIONS:
+                # Every process is always considered
+                index += 1
+                continue
+            option, _, value = arg.partition('=') if arg.startswith('--') else (arg, '', '')
+            if option in ('--sort', '-n', '-u') and not value:
+                if index + 1 >= len(args):
+                    return f"ps: option requires an argument -- '{option.lstrip('-')}'", 1
+                value = args[index + 1]
+                index += 1
+            index += 1
+            
+            if option == '--sort':
+                # ps style: a leading '-' sorts descending, '+' ascending
+                key = value.lstrip('+-').lstrip('%')
+                if key not in PROCESS_SORT_KEYS:
+                    return f"ps: unknown sort key: {value} (use cpu, mem or pid)", 1
+                sort = key
+                reverse = {'-': True, '+': False}.get(value[:1])
+            elif option == '-n':
+                if not value.isdigit():
+                    return f"ps: invalid number: {value}", 1
+                limit = int(value)
+            elif option == '-u':
+                users.extend(user for user in value.split(',') if user)
+            elif arg.startswith('-'):
+                return f"ps: unknown option: {arg}", 1
+            else:
+                names.append(arg)
+        
+        return terminal.system_monitor.get_processes(sort, reverse, limit, users, names), 0
     
     def cmd_top(self, args: List[str], terminal) -> Tuple[str, int]:
         """Display system resource usage."""
@@ -347,9 +550,45 @@ class CommandRegistry:
         return '\033[2J\033[H', 0
     
     def cmd_history(self, args: List[str], terminal) -> Tuple[str, int]:
-        """Display command history."""
+        """Display command history: recent commands, a page of older ones, or matches."""
+        history = terminal.command_history
+        limit = None
+        page = None
+        search = None
+        index = 0
+        while index < len(args):
+            arg = args[index]
+            if arg.isdigit():
+                limit = int(arg)
+                index += 1
+                continue
+            if arg not in ('-n', '-p', '-s', '--search'):
+                return f"history: unknown option: {arg}", 1
+            if index + 1 >= len(args):
+                return f"history: option requires an argument -- '{arg.lstrip('-')}'", 1
+            value = args[index + 1]
+            index += 2
+            if arg in ('-n', '-p'):
+                if not value.isdigit() or int(value) < 1:
+                    return f"history: invalid number: {value}", 1
+                if arg == '-n':
+                    limit = int(value)
+                else:
+                    page = int(value)
+            else:
+                search = value
+        
+        if search is not None:
+            entries = history.search(search, limit or history.tail.maxlen or DEFAULT_HISTORY_LIMIT)
+        elif page is not None:
+            # Page 1 is the newest
+            size = limit or HISTORY_PAGE_SIZE
+            entries = history.last(size, offset=(page - 1) * size)
+        else:
+            entries = history.last(limit or len(history.tail))
+        
         output = []
-        for i, cmd in enumerate(terminal.command_history, 1):
+        for i, cmd in entries:
             output.append(f"{i:4d}  {cmd}")
         return '\n'.join(output), 0
     
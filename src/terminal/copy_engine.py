@@ -0,0 +1,258 @@
+"""
+Parallel, kernel-side file copying behind the cp and mv commands.
+"""
+import errno
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Generator, List, Tuple
+from .shared_pool import SharedPool
+
+# Bytes moved per copy call, so progress and cancellation are checked between them
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+# Seconds between progress lines; copies finishing sooner print nothing
+PROGRESS_INTERVAL = 1.0
+# Errors meaning a zero-copy call isn't supported for this pair of files
+FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP,
+                   errno.ENOTSUP, errno.ETXTBSY, errno.EBADF}
+
+if hasattr(os, 'copy_file_range'):
+    ZERO_COPY_METHODS = ['copy_file_range', 'sendfile', 'read']
+elif hasattr(os, 'sendfile') and sys.platform.startswith('linux'):
+    # Only Linux can sendfile between regular files
+    ZERO_COPY_METHODS = ['sendfile', 'read']
+else:
+    ZERO_COPY_METHODS = ['read']
+
+_pool = SharedPool(lambda workers: ThreadPoolExecutor(max_workers=workers,
+                                                      thread_name_prefix='terminal-copy'),
+                   'COPY_WORKERS', 4)
+
+
+class CopyCancelled(Exception):
+    """Raised inside a copy when its job has been cancelled."""
+
+
+def format_size(size: float) -> str:
+    """Format a byte count for progress output."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+class CopyJob:
+    """
+    Copies a set of files and directory trees.
+
+    Directories are created up front in order; file contents are then
+    copied on a shared thread pool, in the kernel where the platform
+    allows. run() is a streaming command body: it yields progress lines
+    and returns an exit code, and closing it cancels the copy.
+    """
+
+    def __init__(self, pairs: List[Tuple[str, str]], command: str = 'cp', move: bool = False):
+        """
+        Args:
+            pairs: (source, destination) paths, with destinations fully resolved
+            command: Command name used in messages
+            move: Remove the sources once everything has been copied
+        """
+        self.pairs = pairs
+        self.command = command
+        self.move = move
+        self.cancelled = threading.Event()
+        self.total_files = 0
+        self.total_bytes = 0
+        self.files_done = 0
+        self.bytes_done = 0
+        self.errors: List[str] = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        """Stop copying; files being written are removed."""
+        self.cancelled.set()
+
+    def _plan(self) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str, int]], List[Tuple[str, str]]]:
+        """
+        List what has to be done.
+
+        Returns:
+            Tuple of (directories, files, symlinks). Directories and symlinks
+            are (source, destination) with directories in creation order;
+            files are (source, destination, size).
+        """
+        directories = []
+        files = []
+        links = []
+        for source, destination in self.pairs:
+            if os.path.islink(source):
+                links.append((source, destination))
+                continue
+            if not os.path.isdir(source):
+                files.append((source, destination, os.path.getsize(source)))
+                continue
+
+            stack = [(source, destination)]
+            while stack:
+                directory, target = stack.pop()
+                directories.append((directory, target))
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        child = os.path.join(target, entry.name)
+                        if entry.is_symlink():
+                            links.append((entry.path, child))
+                        elif entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, child))
+                        elif entry.is_file(follow_symlinks=False):
+                            files.append((entry.path, child, entry.stat(follow_symlinks=False).st_size))
+                        else:
+                            self.errors.append(f"{self.command}: skipping special file '{entry.path}'")
+        return directories, files, links
+
+    def _copy_file(self, source: str, destination: str):
+        """Copy one file's contents and metadata. Runs on the pool."""
+        if self.cancelled.is_set():
+            raise CopyCancelled()
+        with open(source, 'rb') as fsrc, open(destination, 'wb') as fdst:
+            try:
+                self._copy_data(fsrc.fileno(), fdst.fileno())
+            except CopyCancelled:
+                fdst.close()
+                os.unlink(destination)
+                raise
+        shutil.copystat(source, destination)
+        with self._lock:
+            self.files_done += 1
+
+    def _copy_data(self, source_fd: int, destination_fd: int):
+        """Copy from one file descriptor to another, falling back to slower methods as needed."""
+        methods = list(ZERO_COPY_METHODS)
+        offset = 0
+        while True:
+            if self.cancelled.is_set():
+                raise CopyCancelled()
+            method = methods[0]
+            try:
+                if method == 'copy_file_range':
+                    copied = os.copy_file_range(source_fd, destination_fd, COPY_CHUNK_SIZE)
+                elif method == 'sendfile':
+                    copied = os.sendfile(destination_fd, source_fd, offset, COPY_CHUNK_SIZE)
+                else:
+                    data = os.read(source_fd, COPY_CHUNK_SIZE)
+                    view = memoryview(data)
+                    while view:
+                        view = view[os.write(destination_fd, view):]
+                    copied = len(data)
+            except OSError as e:
+                # Only switch methods before anything has been written
+                if offset == 0 and method != 'read' and e.errno in FALLBACK_ERRNOS:
+                    methods.pop(0)
+                    continue
+                raise
+            if copied == 0:
+                return
+            offset += copied
+            with self._lock:
+                self.bytes_done += copied
+
+    def progress(self) -> str:
+        """One line describing how far the copy has got."""
+        with self._lock:
+            files_done, bytes_done = self.files_done, self.bytes_done
+        percent = bytes_done * 100 // self.total_bytes if self.total_bytes else 100
+        return (f"{self.command}: {files_done}/{self.total_files} files, "
+                f"{format_size(bytes_done)}/{format_size(self.total_bytes)} ({percent}%)")
+
+    def run(self) -> Generator[str, None, int]:
+        """
+        Run the copy, yielding a progress line every PROGRESS_INTERVAL seconds.
+
+        Returns:
+            Exit code: 0 if everything was copied, 1 otherwise
+        """
+        started = time.monotonic()
+        try:
+            directories, files, links = self._plan()
+        except OSError as e:
+            yield f"{self.command}: {e.strerror or e}: {e.filename}"
+            return 1
+        self.total_files = len(files)
+        self.total_bytes = sum(size for _, _, size in files)
+
+        first = True
+        try:
+            for source, target in directories:
+                os.makedirs(target, exist_ok=True)
+            for source, target in links:
+                if os.path.lexists(target) and not os.path.isdir(target):
+                    os.unlink(target)
+                os.symlink(os.readlink(source), target)
+        except OSError as e:
+            yield f"{self.command}: cannot create '{e.filename}': {e.strerror or e}"
+            return 1
+
+        pool, workers = _pool.get()
+        queue = list(reversed(files))
+        running = {}
+        next_progress = started + PROGRESS_INTERVAL
+        finished = False
+        try:
+            while queue or running:
+                # Keep a bounded number of files in flight
+                while queue and len(running) < workers * 4:
+                    source, target, _ = queue.pop()
+                    running[pool.submit(self._copy_file, source, target)] = source
+                done, _ = wait(running, timeout=max(0.0, next_progress - time.monotonic()),
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    source = running.pop(future)
+                    error = future.exception()
+                    if isinstance(error, OSError):
+                        self.errors.append(f"{self.command}: cannot copy '{source}': "
+                                           f"{error.strerror or error}")
+                    elif error is not None:
+                        raise error
+                if time.monotonic() >= next_progress:
+                    yield ('' if first else '\n') + self.progress()
+                    first = False
+                    next_progress = time.monotonic() + PROGRESS_INTERVAL
+            finished = True
+        finally:
+            if not finished:
+                # Closed early: stop the copies in flight and wait for them to clean up
+                self.cancel()
+                for future in running:
+                    future.cancel()
+                wait(running)
+
+        # Directory times are set last, since copying files into them changes them
+        for source, target in reversed(directories):
+            try:
+                shutil.copystat(source, target)
+            except OSError:
+                pass
+
+        if self.move and not self.errors:
+            for source, _ in self.pairs:
+                try:
+                    if os.path.isdir(source) and not os.path.islink(source):
+                        shutil.rmtree(source)
+                    else:
+                        os.unlink(source)
+                except OSError as e:
+                    self.errors.append(f"{self.command}: cannot remove '{source}': {e.strerror or e}")
+
+        if not first:
+            elapsed = time.monotonic() - started
+            yield (f"\n{self.command}: {self.files_done} files, {format_size(self.bytes_done)} "
+                   f"in {elapsed:.1f}s ({format_size(self.bytes_done / elapsed)}/s)")
+            first = False
+        if self.errors:
+            yield ('' if first else '\n') + '\n'.join(self.errors)
+            return 1
+        return 0
@@ -4,15 +4,39 @@ Core terminal engine that processes and executes commands.
 import os
 import sys
 import shlex
+from collections import deque
+from functools import lru_cache
 from typing import Dict, List, Tuple, Optional
 from .commands import CommandRegistry
 from .system_monitor import SystemMonitor
+from .prefix_index import PrefixIndex
+from .streams import CommandStream
+from .history_store import CommandHistory
+from .output_buffer import (OutputLimiter, ResultStore,
+                            DEFAULT_INLINE_LIMIT, DEFAULT_OUTPUT_CAP)
+
+# Distinct history lines kept in a terminal's completion index
+HISTORY_INDEX_SIZE = 500
+# Commands whose path arguments may be created, moved or removed
+MUTATING_COMMANDS = {'mkdir', 'rmdir', 'rm', 'cp', 'mv', 'touch'}
+
+
+@lru_cache(maxsize=4096)
+def _resolve_path(base: str, path: str) -> str:
+    """Resolve path against base without touching the process working directory."""
+    if path.startswith('~'):
+        path = os.path.expanduser(path)
+    return os.path.normpath(os.path.join(base, path))
 
 
 class TerminalCore:
     """Main terminal engine for processing commands."""
     
-    def __init__(self, initial_directory: str = None):
+    def __init__(self, initial_directory: str = None, max_history: int = None,
+                 inline_output_limit: int = DEFAULT_INLINE_LIMIT,
+                 max_output: int = DEFAULT_OUTPUT_CAP,
+                 output_caps: Optional[Dict[str, int]] = None,
+                 file_index=None, history_path: Optional[str] = None):
         # Set initial directory - default to home directory or user-specified
         if initial_directory:
             self.current_directory = os.path.expanduser(initial_directory)
@@ -24,17 +48,34 @@ class TerminalCore:
             else:
                 self.current_directory = os.getcwd()
         
-        # Change to the initial directory
-        try:
-            os.chdir(self.current_directory)
-        except (PermissionError, OSError):
-            # If we can't change to the desired directory, stay where we are
+        # The working directory is tracked per terminal rather than with
+        # os.chdir, so several terminals can run commands in parallel threads
+        self.current_directory = os.path.abspath(self.current_directory)
+        if not (os.path.isdir(self.current_directory) and
+                os.access(self.current_directory, os.X_OK)):
+            # If we can't use the desired directory, stay where we are
             self.current_directory = os.getcwd()
         
-        self.command_history = []
+        # The newest max_history commands stay in memory; with history_path,
+        # every command is also logged there and reloaded on the next start
+        self.command_history = CommandHistory(max_history, history_path)
+        self.max_history = max_history
         self.command_registry = CommandRegistry()
+        # Command names plus recent history, ranked by how often they are used
+        self.completion_index = PrefixIndex(self.command_registry.commands)
+        self._indexed_history = deque()
         self.system_monitor = SystemMonitor()
         self.environment_vars = dict(os.environ)
+        # Optional FileIndex shared between terminals, used by find and locate
+        self.file_index = file_index
+        
+        # Output past inline_output_limit is kept in self.results for paging,
+        # up to max_output bytes or the command's own entry in output_caps
+        self.inline_output_limit = inline_output_limit
+        self.max_output = max_output
+        self.output_caps = dict(output_caps or {})
+        self.results = ResultStore()
+        self.last_result: Optional[Dict] = None
         
     def execute_command(self, command_line: str) -> Tuple[str, int]:
         """
@@ -44,12 +85,62 @@ class TerminalCore:
             command_line: The command string to execute
             
         Returns:
-            Tuple of (output, exit_code)
+            Tuple of (output, exit_code). Output past the inline limit is
+            replaced by a notice; the full output is in last_result.
+        """
+        stream = self.stream_command(command_line)
+        limiter = self.output_limiter(stream)
+        try:
+            output = ''.join(limiter.limit(stream))
+        finally:
+            stream.close()
+        result = self.store_result(limiter)
+        if result is not None:
+            output += ('\n' if output else '') + limiter.notice(result['result_id'])
+        return output, stream.exit_code if stream.exit_code is not None else 0
+    
+    def output_limiter(self, stream: CommandStream) -> OutputLimiter:
+        """
+        Create the output limiter for a command's stream.
+        
+        Args:
+            stream: Stream returned by stream_command
+            
+        Returns:
+            OutputLimiter using the command's output cap
+        """
+        cap = self.output_caps.get(stream.command, self.max_output)
+        return OutputLimiter(self.inline_output_limit, cap)
+    
+    def store_result(self, limiter: OutputLimiter) -> Optional[Dict]:
+        """
+        Keep a command's full output for paging if it did not fit inline.
+        
+        Args:
+            limiter: Limiter the command's output was fed through
+            
+        Returns:
+            Result metadata from ResultStore.add, or None if the output fit inline
+        """
+        self.last_result = self.results.add(limiter) if limiter.spilled else None
+        return self.last_result
+    
+    def stream_command(self, command_line: str) -> CommandStream:
+        """
+        Execute a command, returning its output as a stream of chunks.
+        
+        Streaming commands only do their work as the stream is consumed, so
+        memory use stays bounded however large the output is.
+        
+        Args:
+            command_line: The command string to execute
+            
+        Returns:
+            CommandStream of the output; its exit_code is set once consumed
         """
         if not command_line.strip():
-            return "", 0
+            return CommandStream.from_result("", 0)
             
-        # Add to history
         self.command_history.append(command_line)
         
         try:
@@ -60,12 +151,41 @@ class TerminalCore:
             
             # Handle built-in commands
             if command in self.command_registry.commands:
-                return self.command_registry.execute(command, args, self)
+                self._index_history(command, command_line.strip())
+                stream = self.command_registry.stream(command, args, self)
+                if self.file_index is not None and command in MUTATING_COMMANDS:
+                    paths = [self.resolve_path(arg) for arg in args if not arg.startswith('-')]
+                    stream = CommandStream(self._invalidate_after(stream, paths))
+                stream.command = command
+                return stream
             else:
-                return f"Command not found: {command}", 1
+                return CommandStream.from_result(f"Command not found: {command}", 1)
                 
         except Exception as e:
-            return f"Error: {str(e)}", 1
+            return CommandStream.from_result(f"Error: {str(e)}", 1)
+    
+    def close(self):
+        """Release the command output the terminal has stored; its history log is kept."""
+        self.results.clear()
+    
+    def _invalidate_after(self, stream: CommandStream, paths: List[str]):
+        """Pass a stream through, then have the file index refresh the paths it changed."""
+        try:
+            yield from stream
+        finally:
+            for path in paths:
+                self.file_index.invalidate(path)
+        return stream.exit_code
+    
+    def _index_history(self, command: str, command_line: str):
+        """Rank a command and its full line higher in the completion index."""
+        self.completion_index.add(command)
+        if command_line == command:
+            return
+        self.completion_index.add(command_line)
+        self._indexed_history.append(command_line)
+        if len(self._indexed_history) > HISTORY_INDEX_SIZE:
+            self.completion_index.remove(self._indexed_history.popleft())
     
     def get_prompt(self) -> str:
         """Generate the terminal prompt."""
@@ -74,21 +194,27 @@ class TerminalCore:
         current_dir = os.path.basename(self.current_directory) or '/'
         return f"{username}@{hostname}:{current_dir}$ "
     
+    def resolve_path(self, path: str) -> str:
+        """
+        Resolve a path argument against this terminal's current directory.
+        
+        Args:
+            path: Absolute, relative or ~-prefixed path
+            
+        Returns:
+            Normalized absolute path
+        """
+        return _resolve_path(self.current_directory, path)
+    
     def change_directory(self, path: str) -> Tuple[str, int]:
         """Change the current working directory."""
         try:
-            if path == "~":
-                path = os.path.expanduser("~")
-            elif path.startswith("~/"):
-                path = os.path.expanduser(path)
-            elif not os.path.isabs(path):
-                path = os.path.join(self.current_directory, path)
-            
-            path = os.path.normpath(path)
+            path = self.resolve_path(path)
             
-            if os.path.exists(path) and os.path.isdir(path):
+            if os.path.isdir(path):
+                if not os.access(path, os.X_OK):
+                    raise PermissionError(path)
                 self.current_directory = path
-                os.chdir(path)
                 return "", 0
             else:
                 return f"cd: no such file or directory: {path}", 1
@@ -0,0 +1,320 @@
+"""
+Persistent index of file paths for find and locate.
+"""
+import os
+import sqlite3
+import stat
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# Glob characters; everything else in a pattern is literal text
+GLOB_CHARS = '*?['
+# Directories checked per transaction during a refresh
+DIRS_PER_COMMIT = 500
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS files ("
+    "id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, dir TEXT NOT NULL, "
+    "name TEXT NOT NULL, kind TEXT NOT NULL, mtime_ns INTEGER)",
+    "CREATE INDEX IF NOT EXISTS files_dir ON files(dir)",
+]
+# Trigram full-text index over paths and names, kept in step by triggers
+FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS entries USING fts5("
+    "path, name, content='files', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS files_insert AFTER INSERT ON files BEGIN "
+    "INSERT INTO entries(rowid, path, name) VALUES (new.id, new.path, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS files_delete AFTER DELETE ON files BEGIN "
+    "INSERT INTO entries(entries, rowid, path, name) VALUES ('delete', old.id, old.path, old.name); END",
+]
+
+
+def longest_literal(pattern: str) -> str:
+    """
+    Longest run of literal text in a glob, which every match must contain.
+
+    Args:
+        pattern: Glob pattern, or plain text
+
+    Returns:
+        Literal text, possibly empty
+    """
+    runs = []
+    current = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char in GLOB_CHARS:
+            runs.append(''.join(current))
+            current = []
+            if char == '[':
+                # Skip the bracket expression; its characters are alternatives
+                close = pattern.find(']', index + 2)
+                index = close if close != -1 else len(pattern)
+        else:
+            current.append(char)
+        index += 1
+    runs.append(''.join(current))
+    return max(runs, key=len)
+
+
+def _subtree_bounds(path: str) -> Tuple[str, str]:
+    """Range of path strings strictly inside a directory, for indexed range scans."""
+    prefix = path.rstrip('/') + '/'
+    # '0' sorts right after '/'
+    return prefix, prefix[:-1] + '0'
+
+
+class FileIndex:
+    """
+    sqlite index of every path under a set of root directories.
+
+    A background thread keeps the index up to date by mtime diffing: each
+    directory's mtime is stored, and only directories whose mtime changed
+    are listed again. Paths changed by terminal commands are refreshed
+    before the next lookup, so a terminal sees its own changes at once.
+    """
+
+    def __init__(self, path: str, roots: List[str], interval: float = 300.0):
+        """
+        Args:
+            path: sqlite file holding the index
+            roots: Directories to index
+            interval: Seconds between background refreshes
+        """
+        self.path = path
+        self.roots = [os.path.normpath(os.path.abspath(os.path.expanduser(root)))
+                      for root in roots]
+        self.interval = interval
+        self.indexed_at: Dict[str, float] = {}
+        self._pending: Set[str] = set()
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = self._connect()
+        for statement in SCHEMA:
+            self._db.execute(statement)
+        try:
+            for statement in FTS_SCHEMA:
+                self._db.execute(statement)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # sqlite without FTS5 or the trigram tokenizer; fall back to scans
+            self.fts = False
+        self._db.commit()
+
+    @classmethod
+    def from_environment(cls) -> Optional['FileIndex']:
+        """Create an index from FILE_INDEX_* variables, or None if no roots are configured."""
+        roots = [root for root in os.environ.get('FILE_INDEX_ROOTS', '').split(os.pathsep) if root]
+        if not roots:
+            return None
+        return cls(os.environ.get('FILE_INDEX_PATH', '.cache/file_index.sqlite3'), roots,
+                   float(os.environ.get('FILE_INDEX_INTERVAL', 300)))
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        # Readers see a consistent snapshot while the indexer writes
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        """Connection for lookups from the calling thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    def start(self):
+        """Index the roots and keep refreshing them on a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='file-index', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self._stop.wait(self.interval)
+
+    def refresh(self):
+        """Bring the whole index up to date, listing only directories that changed."""
+        for root in self.roots:
+            if self._stop.is_set():
+                return
+            self._update([root], deep=True)
+            self.indexed_at[root] = time.time()
+
+    def covers(self, path: str) -> bool:
+        """True if path is under a root that has been fully indexed."""
+        for root in self.indexed_at:
+            if path == root or path.startswith(root.rstrip('/') + '/'):
+                return True
+        return False
+
+    def invalidate(self, path: str):
+        """
+        Mark a path as changed, so it and its directory are refreshed before the next lookup.
+
+        Args:
+            path: Absolute path created, removed or modified
+        """
+        if not any(path == root or path.startswith(root.rstrip('/') + '/')
+                   for root in self.roots):
+            return
+        with self._pending_lock:
+            self._pending.add(path)
+            if path not in self.roots:
+                self._pending.add(os.path.dirname(path))
+
+    def _apply_pending(self):
+        """Refresh directories marked by invalidate."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, set()
+        if pending:
+            self._update(sorted(pending), deep=False)
+
+    def _update(self, directories: List[str], deep: bool):
+        """
+        Re-list directories whose mtime changed and apply the difference.
+
+        Args:
+            directories: Directories to check
+            deep: Also check every subdirectory; otherwise only new
+                subdirectories are descended into
+        """
+        stack = list(directories)
+        while stack:
+            # The lock is taken a batch at a time, so lookups can apply
+            # their own changes during a long refresh
+            with self._write_lock:
+                for _ in range(DIRS_PER_COMMIT):
+                    if not stack:
+                        break
+                    self._update_directory(stack.pop(), stack, deep)
+                self._db.commit()
+
+    def _update_directory(self, directory: str, stack: List[str], deep: bool):
+        """Bring one directory's entries up to date. Caller must hold the write lock."""
+        db = self._db
+        try:
+            # Roots may be symlinks; nothing else is followed
+            if directory in self.roots:
+                stat_info = os.stat(directory)
+            else:
+                stat_info = os.lstat(directory)
+        except OSError:
+            self._delete_subtree(directory)
+            return
+        if not stat.S_ISDIR(stat_info.st_mode):
+            # Files are updated when their directory is listed
+            return
+
+        row = db.execute("SELECT mtime_ns FROM files WHERE path = ?", (directory,)).fetchone()
+        if row is not None and row[0] == stat_info.st_mtime_ns:
+            if deep:
+                stack.extend(child for (child,) in db.execute(
+                    "SELECT path FROM files WHERE dir = ? AND kind = 'd'", (directory,)))
+            return
+
+        try:
+            with os.scandir(directory) as entries:
+                current = {entry.name: self._kind(entry) for entry in entries}
+        except OSError:
+            current = {}
+        known = dict(db.execute("SELECT name, kind FROM files WHERE dir = ?", (directory,)))
+
+        for name, kind in known.items():
+            if current.get(name) != kind:
+                self._delete_subtree(os.path.join(directory, name))
+        db.executemany(
+            "INSERT INTO files(path, dir, name, kind) VALUES (?, ?, ?, ?)",
+            [(os.path.join(directory, name), directory, name, kind)
+             for name, kind in current.items() if known.get(name) != kind]
+        )
+        db.execute(
+            "INSERT INTO files(path, dir, name, kind, mtime_ns) VALUES (?, ?, ?, 'd', ?) "
+            "ON CONFLICT(path) DO UPDATE SET mtime_ns = excluded.mtime_ns",
+            (directory, self._parent(directory),
+             os.path.basename(directory) or directory, stat_info.st_mtime_ns)
+        )
+        stack.extend(os.path.join(directory, name) for name, kind in current.items()
+                     if kind == 'd' and (deep or known.get(name) != 'd'))
+
+    @staticmethod
+    def _parent(path: str) -> str:
+        """Directory holding path; '' for the filesystem root, which has none."""
+        parent = os.path.dirname(path)
+        return '' if parent == path else parent
+
+    @staticmethod
+    def _kind(entry: os.DirEntry) -> str:
+        if entry.is_symlink():
+            return 'l'
+        return 'd' if entry.is_dir(follow_symlinks=False) else 'f'
+
+    def _delete_subtree(self, path: str):
+        """Remove a path and everything under it. Caller must hold the write lock."""
+        low, high = _subtree_bounds(path)
+        self._db.execute("DELETE FROM files WHERE path = ? OR (path > ? AND path < ?)",
+                         (path, low, high))
+
+    def search(self, text: str = '', column: str = 'path',
+               under: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Find indexed paths containing some text, in path order.
+
+        Matching is case-insensitive, so callers filter the candidates
+        with their exact test.
+
+        Args:
+            text: Text the column must contain, or '' for every path
+            column: 'path' or 'name'
+            under: Only return this directory and paths inside it
+
+        Yields:
+            (path, kind) where kind is 'f', 'd' or 'l'
+        """
+        if column not in ('path', 'name'):
+            raise ValueError(f"unknown column: {column}")
+        self._apply_pending()
+
+        if text and self.fts and len(text) >= 3:
+            sql = ("SELECT f.path, f.kind FROM entries JOIN files f ON f.id = entries.rowid "
+                   "WHERE entries MATCH ?")
+            params: list = ['{%s} : "%s"' % (column, text.replace('"', '""'))]
+        else:
+            sql = "SELECT f.path, f.kind FROM files f WHERE 1"
+            params = []
+            if text:
+                sql += f" AND instr(lower(f.{column}), lower(?)) > 0"
+                params.append(text)
+        if under is not None:
+            low, high = _subtree_bounds(under)
+            sql += " AND (f.path = ? OR (f.path > ? AND f.path < ?))"
+            params.extend([under, low, high])
+        sql += " ORDER BY f.path"
+        yield from self._reader().execute(sql, params)
+
+    def stats(self) -> Dict:
+        """Get index counters."""
+        count = self._reader().execute("SELECT count(*) FROM files").fetchone()[0]
+        return {
+            'roots': self.roots,
+            'paths': count,
+            'fts': self.fts,
+            'indexed_at': dict(self.indexed_at),
+            'pending': len(self._pending),
+        }
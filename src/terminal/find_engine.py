@@ -0,0 +1,280 @@
+"""
+Parallel directory tree walker and predicates behind the find command.
+"""
+import fnmatch
+import os
+import re
+import stat
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Iterator, List, Optional, Set, Tuple, Union
+from .file_index import longest_literal
+from .shared_pool import SharedPool
+
+# Bytes per unit of -size, as in GNU find; the default unit is 512-byte blocks
+SIZE_UNITS = {'b': 512, 'c': 1, 'w': 2, 'k': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+# File type letters accepted by -type
+TYPE_LETTERS = set('fdl')
+
+# scandir releases the GIL, so threads walk subtrees in parallel
+_pool = SharedPool(lambda workers: ThreadPoolExecutor(max_workers=workers,
+                                                      thread_name_prefix='terminal-find'),
+                   'FIND_WORKERS', 8)
+
+
+def _compare(spec: str) -> Callable[[int], bool]:
+    """Build a test for a find-style number: +N more than, -N less than, N exactly."""
+    if spec[:1] == '+':
+        limit = int(spec[1:])
+        return lambda value: value > limit
+    if spec[:1] == '-':
+        limit = int(spec[1:])
+        return lambda value: value < limit
+    limit = int(spec)
+    return lambda value: value == limit
+
+
+class FindQuery:
+    """
+    Parsed find expression: start paths, predicates and limits.
+
+    Predicates are all ANDed. Name and type tests use what the directory
+    read already returned; size and mtime need one stat per entry, which
+    DirEntry caches, and only run when the cheaper tests have passed.
+    """
+
+    def __init__(self, args: List[str], cwd_exists: Callable[[str], bool]):
+        """
+        Args:
+            args: Arguments given to find
+            cwd_exists: Tells whether a path argument exists, to tell the
+                old "find [path] text" form apart from a start path
+
+        Raises:
+            ValueError: If the expression is invalid
+        """
+        self.roots: List[str] = []
+        self.names: List[Tuple[str, bool]] = []
+        self.name_regexes: List[re.Pattern] = []
+        self.types: Set[str] = set()
+        # (bytes per unit, test on the size in units rounded up)
+        self.size_tests: List[Tuple[int, Callable[[int], bool]]] = []
+        self.mtime_tests: List[Callable[[int], bool]] = []
+        self.max_depth: Optional[int] = None
+        self.limit: Optional[int] = None
+        # Paths that could not be read during the walk
+        self.errors = 0
+
+        index = 0
+        expression_started = False
+        while index < len(args):
+            arg = args[index]
+            if not arg.startswith('-') or arg == '-':
+                if expression_started:
+                    raise ValueError(f"paths must precede expression: {arg}")
+                if not self.names and cwd_exists(arg):
+                    self.roots.append(arg)
+                else:
+                    # "find text" and "find path text" match names containing text
+                    self._add_name(arg if any(c in arg for c in '*?[') else f"*{arg}*", False)
+                index += 1
+                continue
+
+            expression_started = True
+            if index + 1 >= len(args):
+                raise ValueError(f"missing argument to `{arg}'")
+            value = args[index + 1]
+            if arg in ('-name', '-iname'):
+                self._add_name(value, arg == '-iname')
+            elif arg == '-type':
+                if not set(value.split(',')) <= TYPE_LETTERS:
+                    raise ValueError(f"unknown argument to -type: {value}")
+                self.types.update(value.split(','))
+            elif arg == '-size':
+                unit = value[-1:] if value[-1:] in SIZE_UNITS else 'b'
+                number = value[:-1] if value[-1:] in SIZE_UNITS else value
+                self.size_tests.append((SIZE_UNITS[unit], _compare(number)))
+            elif arg == '-mtime':
+                self.mtime_tests.append(_compare(value))
+            elif arg == '-maxdepth':
+                self.max_depth = int(value)
+            elif arg == '-limit':
+                self.limit = int(value)
+            else:
+                raise ValueError(f"unknown predicate `{arg}'")
+            index += 2
+
+        if not self.roots:
+            self.roots.append('.')
+        self.now = time.time()
+
+    def _add_name(self, pattern: str, ignore_case: bool):
+        """Add a -name glob, compiled once."""
+        self.names.append((pattern, ignore_case))
+        self.name_regexes.append(re.compile(fnmatch.translate(pattern),
+                                            re.IGNORECASE if ignore_case else 0))
+
+    @property
+    def needs_stat(self) -> bool:
+        """True if matching needs each entry's size or mtime."""
+        return bool(self.size_tests or self.mtime_tests)
+
+    def matches(self, name: str, entry_type: str, entry: Union[os.DirEntry, str]) -> bool:
+        """
+        Check one entry against the predicates.
+
+        Args:
+            name: Entry name
+            entry_type: 'f', 'd' or 'l'
+            entry: DirEntry, or the path of a start path, for the stat-based tests
+
+        Returns:
+            True if every predicate matches
+        """
+        if self.types and entry_type not in self.types:
+            return False
+        for regex in self.name_regexes:
+            if not regex.match(name):
+                return False
+        if self.needs_stat:
+            try:
+                if isinstance(entry, str):
+                    stat_info = os.lstat(entry)
+                else:
+                    stat_info = entry.stat(follow_symlinks=False)
+            except OSError:
+                return False
+            # Sizes are rounded up to the unit, as find does
+            for unit, test in self.size_tests:
+                if not test(-(-stat_info.st_size // unit)):
+                    return False
+            age_days = int((self.now - stat_info.st_mtime) // 86400)
+            for test in self.mtime_tests:
+                if not test(age_days):
+                    return False
+        return True
+
+
+def _entry_type(entry: os.DirEntry) -> str:
+    """Type letter of a directory entry, from the type the directory read returned."""
+    if entry.is_symlink():
+        return 'l'
+    if entry.is_dir(follow_symlinks=False):
+        return 'd'
+    return 'f'
+
+
+def _scan(query: FindQuery, display: str, path: str,
+          depth: int) -> Tuple[List[str], List[Tuple[str, str, int]], Optional[str]]:
+    """
+    Read one directory.
+
+    Returns:
+        Tuple of (matching display paths, subdirectories to walk, error)
+    """
+    matches = []
+    subdirectories = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                entry_type = _entry_type(entry)
+                child = os.path.join(display, entry.name)
+                if query.matches(entry.name, entry_type, entry):
+                    matches.append(child)
+                if entry_type == 'd' and (query.max_depth is None or depth < query.max_depth):
+                    subdirectories.append((child, entry.path, depth + 1))
+    except OSError as e:
+        return matches, subdirectories, f"find: '{display}': {e.strerror or e}"
+    return matches, subdirectories, None
+
+
+def walk(query: FindQuery, roots: List[Tuple[str, str]]) -> Iterator[str]:
+    """
+    Walk the trees under roots on the shared pool, yielding matches as directories are read.
+
+    Subtrees are read in parallel, so the order of results between
+    directories is not fixed. Stops once query.limit results have been
+    yielded, and stops reading when the generator is closed.
+
+    Args:
+        query: Parsed find expression
+        roots: (path to print, absolute path) of each start path
+
+    Yields:
+        Display paths of matching entries, and "find: ..." error lines
+    """
+    pool, workers = _pool.get()
+    remaining = query.limit
+    queued: Deque[Tuple[str, str, int]] = deque()
+
+    for display, path in roots:
+        try:
+            stat_info = os.lstat(path)
+        except OSError as e:
+            query.errors += 1
+            yield f"find: '{display}': {e.strerror or e}"
+            continue
+        if stat.S_ISLNK(stat_info.st_mode):
+            root_type = 'l'
+        else:
+            root_type = 'd' if stat.S_ISDIR(stat_info.st_mode) else 'f'
+        if remaining != 0 and query.matches(os.path.basename(display.rstrip('/')) or display, root_type, path):
+            yield display
+            remaining = None if remaining is None else remaining - 1
+        if root_type == 'd' and query.max_depth != 0:
+            queued.append((display, path, 1))
+
+    running: Set[Future] = set()
+    try:
+        while (queued or running) and remaining != 0:
+            # Keep a bounded number of directory reads in flight
+            while queued and len(running) < workers * 2:
+                running.add(pool.submit(_scan, query, *queued.popleft()))
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                matches, subdirectories, error = future.result()
+                queued.extend(subdirectories)
+                if remaining is not None:
+                    matches = matches[:remaining]
+                    remaining -= len(matches)
+                yield from matches
+                if error:
+                    query.errors += 1
+                    yield error
+    finally:
+        for future in running:
+            future.cancel()
+
+
+def search_index(index, query: FindQuery, roots: List[Tuple[str, str]]) -> Iterator[str]:
+    """
+    Answer a find query from a FileIndex instead of walking the disk.
+
+    The index narrows the candidates down by the literal text of the -name
+    patterns; the query's predicates then decide as in a walk. Paths
+    deleted since the index was last refreshed are skipped.
+
+    Args:
+        index: FileIndex covering every root
+        query: Parsed find expression with at least one -name pattern
+        roots: (path to print, absolute path) of each start path
+
+    Yields:
+        Display paths of matching entries, in path order
+    """
+    literal = max((longest_literal(pattern) for pattern, _ in query.names), key=len)
+    remaining = query.limit
+    for display, root in roots:
+        prefix_length = len(root.rstrip('/')) + 1
+        for path, kind in index.search(literal, 'name', under=root):
+            if remaining == 0:
+                return
+            relative = path[prefix_length:] if path != root else ''
+            if query.max_depth is not None and relative and relative.count('/') >= query.max_depth:
+                continue
+            name = os.path.basename(path) if relative else os.path.basename(display.rstrip('/')) or display
+            if not query.matches(name, kind, path) or not os.path.lexists(path):
+                continue
+            yield os.path.join(display, relative) if relative else display
+            remaining = None if remaining is None else remaining - 1
@@ -0,0 +1,256 @@
+"""
+Memory-mapped, parallel search engine behind the grep command.
+"""
+import mmap
+import multiprocessing
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+from .shared_pool import SharedPool
+
+# Files are split into segments of this many bytes, searched independently
+SEGMENT_SIZE = 16 * 1024 * 1024
+# Below this many bytes in total, searching in-process beats the pool overhead
+PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+# Bytes read from the start of a file to decide whether it is binary
+BINARY_CHECK_SIZE = 8 * 1024
+
+# The server is multi-threaded, so don't fork it
+_pool = SharedPool(lambda workers: ProcessPoolExecutor(
+                       max_workers=workers, mp_context=multiprocessing.get_context('spawn')),
+                   'GREP_WORKERS')
+
+
+def _line_start(data, offset: int) -> int:
+    """Offset of the first line starting at or after offset."""
+    if offset <= 0:
+        return 0
+    newline = data.find(b'\n', offset - 1)
+    return len(data) if newline == -1 else newline + 1
+
+
+def search_segment(path: str, start: int, end: int, pattern: bytes, flags: int,
+                   exists_only: bool = False) -> Tuple[List[Tuple[int, bytes]], int]:
+    """
+    Search the lines starting in one byte range of a file.
+
+    Runs in a worker process. Only the lines around hits are decoded; the
+    rest of the range is scanned by the regex engine and newline counting,
+    both over the memory-mapped bytes.
+
+    Args:
+        path: File to search
+        start: First byte of the range
+        end: Byte after the range
+        pattern: Regular expression as bytes
+        flags: re flags for the pattern
+        exists_only: Stop at the first hit and return no lines
+
+    Returns:
+        Tuple of (list of (line number within the range, line), newlines in the range)
+    """
+    regex = re.compile(pattern, flags)
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        # The range owns the lines that start inside it
+        begin = _line_start(data, start)
+        stop = _line_start(data, end) if end < len(data) else len(data)
+
+        matches = []
+        line_number = 0
+        counted = begin
+        position = begin
+        while position < stop:
+            match = regex.search(data, position, stop)
+            # An empty match at stop, such as ^$ after the range's last
+            # newline, belongs to the next range or to no line at all
+            if match is None or match.start() >= stop:
+                break
+            line_start = data.rfind(b'\n', begin, match.start()) + 1 or begin
+            line_end = data.find(b'\n', match.start(), stop)
+            if line_end == -1:
+                line_end = stop
+            # A match running past the end of its line, such as [^a] or \s
+            # matching the newline, doesn't count; the line may still match
+            # on its own
+            if match.end() > line_end and regex.search(data, line_start, line_end) is None:
+                position = line_end + 1
+                continue
+            if exists_only:
+                return [(0, b'')], 0
+            line_number += data[counted:line_start].count(b'\n')
+            counted = line_start
+            matches.append((line_number, data[line_start:line_end]))
+            position = line_end + 1
+        newlines = line_number + data[counted:stop].count(b'\n')
+    return matches, newlines
+
+
+class GrepEngine:
+    """
+    Searches files for a pattern, streaming matching lines in file order.
+
+    Large files are split into segments so several processes can search
+    one file at once, and results are merged back in order.
+    """
+
+    def __init__(self, pattern: str, fixed_strings: bool = False, ignore_case: bool = False):
+        """
+        Args:
+            pattern: Regular expression, or literal text if fixed_strings
+            fixed_strings: Treat the pattern as literal text
+            ignore_case: Match ASCII letters case-insensitively
+
+        Raises:
+            re.error: If the pattern is not a valid regular expression
+        """
+        text = re.escape(pattern) if fixed_strings else pattern
+        self.pattern = text.encode('utf-8')
+        self.flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+        re.compile(self.pattern, self.flags)
+        self.matched = 0
+        self.errors = 0
+
+    def _tasks(self, files: Iterable[Tuple[str, Optional[str], Optional[str]]]) -> Iterator[Tuple]:
+        """
+        Turn files into search tasks as they are needed.
+
+        Yields:
+            (name, binary, search_segment arguments) per segment, or
+            (name, None, error) for a file that can't be searched
+        """
+        for name, path, error in files:
+            if error is None:
+                try:
+                    size = os.path.getsize(path)
+                    with open(path, 'rb') as f:
+                        binary = b'\0' in f.read(BINARY_CHECK_SIZE)
+                except OSError as e:
+                    error = e.strerror or str(e)
+            if error is not None:
+                yield name, None, error
+                continue
+            if binary:
+                yield name, True, (path, 0, size, self.pattern, self.flags, True)
+                continue
+            for start in range(0, size, SEGMENT_SIZE):
+                end = min(start + SEGMENT_SIZE, size)
+                yield name, False, (path, start, end, self.pattern, self.flags)
+
+    def search(self, files: Iterable[Tuple[str, Optional[str], Optional[str]]]) -> Iterator[str]:
+        """
+        Search files, yielding output lines as results come in.
+
+        Files are read lazily, a bounded window ahead of the results, so
+        output starts at once and closing the generator stops the search.
+        Segments are searched in-process until PARALLEL_MIN_BYTES have been
+        seen, then on the process pool.
+
+        Args:
+            files: (name to print, path, error) triples, as from collect_files
+
+        Yields:
+            "name:line:text" for each matching line, "Binary file name matches"
+            for binary files with a hit, and "grep: name: error" for files
+            that can't be searched
+        """
+        tasks = self._tasks(files)
+        pool = None
+        window = 1
+        seen_bytes = 0
+        line_base = {}
+        pending = deque()
+        try:
+            while True:
+                # Keep a bounded number of segments in flight, so a slow
+                # reader doesn't pile up results
+                while len(pending) < window:
+                    task = next(tasks, None)
+                    if task is None:
+                        break
+                    name, binary, args = task
+                    future = None
+                    if binary is not None:
+                        seen_bytes += args[2] - args[1]
+                        if pool is None and seen_bytes >= PARALLEL_MIN_BYTES:
+                            pool, workers = _pool.get()
+                            window = workers * 2
+                        if pool is not None:
+                            future = pool.submit(search_segment, *args)
+                    pending.append((name, binary, args, future))
+                if not pending:
+                    break
+                name, binary, task, future = pending.popleft()
+
+                if binary is None:
+                    self.errors += 1
+                    yield f"grep: {name}: {task}"
+                    continue
+                try:
+                    matches, newlines = future.result() if future else search_segment(*task)
+                except (OSError, ValueError) as e:
+                    self.errors += 1
+                    yield f"grep: {name}: {e}"
+                    continue
+
+                if binary:
+                    if matches:
+                        self.matched += 1
+                        yield f"Binary file {name} matches"
+                    continue
+                base = line_base.get(name, 1)
+                line_base[name] = base + newlines
+                self.matched += len(matches)
+                for line_number, line in matches:
+                    text = line.decode('utf-8', errors='replace').rstrip()
+                    yield f"{name}:{base + line_number}:{text}"
+        finally:
+            for _, _, _, future in pending:
+                if future is not None:
+                    future.cancel()
+            tasks.close()
+
+
+def collect_files(names: List[str], terminal, recursive: bool) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """
+    Expand grep's file arguments into files to search.
+
+    Args:
+        names: File and directory arguments as typed
+        terminal: Terminal whose current directory relative paths use
+        recursive: Descend into directories
+
+    Yields:
+        (name to print, path, None) for files, or (name, None, error) for
+        arguments that can't be searched
+    """
+    for name in names:
+        path = terminal.resolve_path(name)
+        if not os.path.isdir(path):
+            if os.path.exists(path):
+                yield name, path, None
+            else:
+                yield name, None, "No such file or directory"
+            continue
+        if not recursive:
+            yield name, None, "Is a directory"
+            continue
+
+        stack = [(name, path)]
+        while stack:
+            display, directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    children = sorted(entries, key=lambda entry: entry.name)
+            except OSError as e:
+                yield display, None, e.strerror or str(e)
+                continue
+            subdirectories = []
+            for entry in children:
+                child = os.path.join(display, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    subdirectories.append((child, entry.path))
+                elif entry.is_file():
+                    yield child, entry.path, None
+            stack.extend(reversed(subdirectories))
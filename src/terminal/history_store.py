@@ -0,0 +1,301 @@
+"""
+Command history with a bounded in-memory tail and an append-only log on disk.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Deque, Iterator, List, Optional, Set, Tuple
+
+# Seconds between background flushes; commands appended in between share one fsync
+DEFAULT_SYNC_INTERVAL = 1.0
+# Bytes read at a time when scanning a log
+LOG_BLOCK_SIZE = 64 * 1024
+
+_dirty: Set['CommandHistory'] = set()
+_dirty_lock = threading.Lock()
+_flusher: Optional[threading.Thread] = None
+
+
+def _flush_loop(interval: float):
+    """Write out every history with new commands, then sleep."""
+    while True:
+        time.sleep(interval)
+        flush_all()
+
+
+def flush_all():
+    """Write and fsync every history's pending commands."""
+    with _dirty_lock:
+        histories = list(_dirty)
+        _dirty.clear()
+    for history in histories:
+        history.flush()
+
+
+def _mark_dirty(history: 'CommandHistory'):
+    """Queue a history for the next background flush, starting the flusher on first use."""
+    global _flusher
+    with _dirty_lock:
+        _dirty.add(history)
+        if _flusher is None:
+            interval = float(os.environ.get('HISTORY_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL))
+            _flusher = threading.Thread(target=_flush_loop, args=(interval,),
+                                        name='history-flush', daemon=True)
+            _flusher.start()
+            atexit.register(flush_all)
+
+
+def expire_logs(directory: str, retention: float, now: Optional[float] = None) -> int:
+    """
+    Delete the logs in a directory that haven't been written to for a while.
+
+    Args:
+        directory: Directory holding history logs
+        retention: Seconds a log is kept after its last write
+        now: Current time.time(), for testing
+
+    Returns:
+        Number of logs deleted
+    """
+    if now is None:
+        now = time.time()
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+    deleted = 0
+    for entry in entries:
+        if not entry.name.endswith(('.log', '.log.tmp')):
+            continue
+        try:
+            if now - entry.stat().st_mtime > retention:
+                os.remove(entry.path)
+                deleted += 1
+        except OSError:
+            # Removed concurrently, or not ours to delete
+            pass
+    return deleted
+
+
+def _read_lines_backwards(path: str) -> Iterator[bytes]:
+    """Yield the complete lines of a file, last first, reading from the end."""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        remainder = b''
+        while position > 0:
+            size = min(LOG_BLOCK_SIZE, position)
+            position -= size
+            f.seek(position)
+            lines = (f.read(size) + remainder).split(b'\n')
+            # The first piece may be the end of a line in an earlier block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line:
+                    yield line
+        if remainder:
+            yield remainder
+
+
+class CommandHistory:
+    """
+    History of one terminal.
+
+    The newest max_entries commands are kept in memory; with a log path,
+    every command is also appended to the log, which is what older
+    entries, searches and a restarted backend read from. Appends only
+    touch memory: a thread shared by every history writes the commands
+    appended each HISTORY_SYNC_INTERVAL seconds to the log with one fsync.
+
+    Entries are numbered from 1 in the order they were run, across
+    restarts. When the log grows past twice max_log_entries it is
+    rewritten with the newest max_log_entries, and numbering restarts
+    from there, as with a shell's history file size.
+    """
+
+    def __init__(self, max_entries: Optional[int] = 1000, path: Optional[str] = None,
+                 max_log_entries: int = 100000):
+        """
+        Args:
+            max_entries: Commands kept in memory, or None for no limit
+            path: Append-only log file, or None to keep history in memory only
+            max_log_entries: Commands kept in the log when it is compacted
+        """
+        self.path = path
+        self.max_log_entries = max_log_entries
+        self.tail: Deque[str] = deque(maxlen=max_entries or None)
+        # Commands run so far, including those only in the log
+        self.count = 0
+        self._pending: List[str] = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._load()
+
+    def _load(self):
+        """Read the entry count and the newest entries from an existing log."""
+        try:
+            with open(self.path, 'rb+') as f:
+                count = 0
+                offset = 0
+                complete = 0
+                while True:
+                    block = f.read(LOG_BLOCK_SIZE)
+                    if not block:
+                        break
+                    newlines = block.count(b'\n')
+                    if newlines:
+                        count += newlines
+                        complete = offset + block.rfind(b'\n') + 1
+                    offset += len(block)
+                if complete != offset:
+                    # A write cut short by a crash; drop the partial line
+                    f.truncate(complete)
+        except FileNotFoundError:
+            return
+        self.count = count
+        newest = []
+        for line in _read_lines_backwards(self.path):
+            if len(newest) == self.tail.maxlen:
+                break
+            newest.append(self._decode(line))
+        self.tail.extend(reversed(newest))
+
+    @staticmethod
+    def _decode(line: bytes) -> str:
+        try:
+            return json.loads(line)
+        except ValueError:
+            return line.decode('utf-8', errors='replace')
+
+    def append(self, command: str):
+        """Record a command."""
+        with self._lock:
+            self.tail.append(command)
+            self.count += 1
+            if self.path:
+                self._pending.append(command)
+        if self.path:
+            _mark_dirty(self)
+
+    def flush(self, sync: bool = True):
+        """
+        Write pending commands to the log.
+
+        Args:
+            sync: fsync the log afterwards
+        """
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return
+            data = ''.join(json.dumps(command) + '\n' for command in pending)
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(data)
+                    f.flush()
+                    if sync:
+                        os.fsync(f.fileno())
+            except OSError as e:
+                print(f"Warning: Could not write history {self.path}: {e}")
+                return
+            if self.count > 2 * self.max_log_entries:
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the log with only its newest entries. Caller must hold the write lock."""
+        newest = []
+        for line in _read_lines_backwards(self.path):
+            if len(newest) == self.max_log_entries:
+                break
+            newest.append(line)
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(b''.join(line + b'\n' for line in reversed(newest)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        with self._lock:
+            # Commands appended since the rewrite started are still pending
+            self.count = len(newest) + len(self._pending)
+
+    def _entries_backwards(self) -> Iterator[Tuple[int, str]]:
+        """Yield (number, command) from the newest entry back to the oldest still kept."""
+        with self._lock:
+            count = self.count
+            tail = list(self.tail)
+        number = count
+        for command in reversed(tail):
+            yield number, command
+            number -= 1
+        if not self.path or number <= 0:
+            return
+        # Older entries are read from the log, past the ones memory holds
+        # and any appended since
+        self.flush(sync=False)
+        with self._lock:
+            skip = self.count - len(self._pending) - number
+        try:
+            for line in _read_lines_backwards(self.path):
+                if skip:
+                    skip -= 1
+                    continue
+                if number <= 0:
+                    return
+                yield number, self._decode(line)
+                number -= 1
+        except FileNotFoundError:
+            return
+
+    def last(self, n: int, offset: int = 0) -> List[Tuple[int, str]]:
+        """
+        Get entries counted back from the newest.
+
+        Args:
+            n: Entries to return
+            offset: Newest entries to skip first, for paging
+
+        Returns:
+            (number, command) pairs, oldest first
+        """
+        entries = []
+        for index, entry in enumerate(self._entries_backwards()):
+            if index >= offset + n:
+                break
+            if index >= offset:
+                entries.append(entry)
+        entries.reverse()
+        return entries
+
+    def search(self, text: str, limit: int) -> List[Tuple[int, str]]:
+        """
+        Find the newest entries containing some text, ignoring case.
+
+        Args:
+            text: Text to look for
+            limit: Most entries returned
+
+        Returns:
+            (number, command) pairs, oldest first
+        """
+        wanted = text.lower()
+        matches = []
+        for number, command in self._entries_backwards():
+            if len(matches) >= limit:
+                break
+            if wanted in command.lower():
+                matches.append((number, command))
+        matches.reverse()
+        return matches
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over the commands held in memory, oldest first."""
+        with self._lock:
+            return iter(list(self.tail))
@@ -0,0 +1,67 @@
+"""
+Fast classification of user input as a command or natural language.
+"""
+import re
+from typing import Iterable
+
+
+# Tools users commonly type that are not built into the terminal
+EXTERNAL_COMMANDS = (
+    'git', 'npm', 'docker', 'python', 'node', 'sudo', 'chmod', 'chown'
+)
+
+NATURAL_LANGUAGE_INDICATORS = (
+    'create', 'make', 'show', 'display', 'list', 'go to', 'change to',
+    'navigate to', 'delete', 'remove', 'copy', 'move', 'find', 'search',
+    'look for', 'where', 'what', 'how', 'can you', 'please', 'help me',
+    'i want', 'i need', 'tell me', 'give me', 'open', 'close', 'start',
+    'stop', 'run', 'execute', 'launch', 'install', 'uninstall', 'update'
+)
+
+
+class InputClassifier:
+    """Classifier built once at startup from the command vocabulary."""
+
+    def __init__(self, command_names: Iterable[str]):
+        """
+        Args:
+            command_names: Commands the terminal understands, e.g. CommandRegistry.commands
+        """
+        # Words that start a natural language phrase ("help me ...") are
+        # left out so those phrases still reach the interpreter
+        phrase_leads = {phrase.split()[0] for phrase in NATURAL_LANGUAGE_INDICATORS
+                        if ' ' in phrase}
+        self.command_words = frozenset(
+            (set(command_names) | set(EXTERNAL_COMMANDS)) - phrase_leads
+        )
+        # One alternation matches every indicator in a single scan
+        self.indicator_pattern = re.compile('|'.join(
+            re.escape(indicator) for indicator in
+            sorted(NATURAL_LANGUAGE_INDICATORS, key=len, reverse=True)
+        ))
+
+    def is_natural_language(self, input_text: str) -> bool:
+        """
+        Determine if the input is natural language or a terminal command.
+
+        Args:
+            input_text: Input string to analyze
+
+        Returns:
+            True if input appears to be natural language, False if it's a command
+        """
+        words = input_text.lower().split(None, 1)
+        if not words:
+            return False
+
+        # If it starts with a known command, it's a command
+        if words[0] in self.command_words:
+            return False
+
+        # A single word, or several words separated by spaces, that doesn't
+        # start with a command is treated as natural language
+        if len(words) == 1 or ' ' in input_text.strip():
+            return True
+
+        # Otherwise it needs to contain a natural language indicator
+        return self.indicator_pattern.search(input_text.lower()) is not None
@@ -0,0 +1,155 @@
+"""
+Cache for natural language -> command interpretations.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+# Writes between deletions of expired rows from the sqlite file
+PRUNE_EVERY = 256
+
+
+class InterpretationCache:
+    """Size-bounded LRU cache with a TTL and optional sqlite persistence."""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 86400.0,
+                 path: Optional[str] = None, version: str = ""):
+        """
+        Args:
+            max_size: Maximum number of interpretations kept in memory
+            ttl: Seconds an interpretation stays valid
+            path: sqlite file to persist interpretations to, or None for memory only
+            version: Interpreter/prompt version; entries from other versions are ignored
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.version = version
+        # key -> (command, created), least recently used first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._writes = 0
+
+        if path:
+            try:
+                directory = os.path.dirname(os.path.abspath(path))
+                os.makedirs(directory, exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS interpretations "
+                    "(key TEXT PRIMARY KEY, command TEXT NOT NULL, created REAL NOT NULL)"
+                )
+                self._prune(time.time())
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not open interpretation cache {path}: {e}")
+                self._db = None
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize whitespace so trivially different phrasings share an entry."""
+        # Case is kept: it can be part of a file name the command uses
+        return ' '.join(text.split())
+
+    def _key(self, text: str) -> str:
+        return f"{self.version}\x00{self.normalize(text)}"
+
+    def get(self, text: str) -> Optional[str]:
+        """
+        Look up a cached interpretation.
+
+        Args:
+            text: Natural language input
+
+        Returns:
+            Cached command, or None on a miss
+        """
+        key = self._key(text)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                command, created = entry
+                if now - created <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return command
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT command, created FROM interpretations WHERE key = ?", (key,)
+                ).fetchone()
+                if row and now - row[1] <= self.ttl:
+                    self._store(key, row[0], row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, text: str, command: str):
+        """
+        Cache an interpretation.
+
+        Args:
+            text: Natural language input
+            command: Terminal command it was interpreted as
+        """
+        key = self._key(text)
+        now = time.time()
+        with self._lock:
+            self._store(key, command, now)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO interpretations (key, command, created) "
+                        "VALUES (?, ?, ?)", (key, command, now)
+                    )
+                    self._writes += 1
+                    if self._writes % PRUNE_EVERY == 0:
+                        self._prune(now)
+                    self._db.commit()
+                except sqlite3.Error:
+                    pass
+
+    def _prune(self, now: float):
+        """Delete expired rows from the sqlite file. Caller must hold the lock."""
+        self._db.execute("DELETE FROM interpretations WHERE created < ?", (now - self.ttl,))
+
+    def _store(self, key: str, command: str, created: float):
+        """Insert into the in-memory LRU. Caller must hold the lock."""
+        self._entries[key] = (command, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached interpretations, including persisted ones."""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM interpretations")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        """Get cache counters."""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,218 @@
+"""
+In-memory time series of system metrics, and live fan-out to subscribers.
+"""
+import asyncio
+import math
+import threading
+from array import array
+from typing import Callable, Dict, List, Optional, Set
+
+# Series kept for every sample, as read from SystemSampler samples
+METRICS = ('cpu_percent', 'memory_percent', 'memory_used', 'disk_percent',
+           'load1', 'load5', 'load15', 'process_count')
+# Points buffered per subscriber before the oldest are dropped
+SUBSCRIBER_BACKLOG = 32
+
+
+def sample_point(sample: Dict) -> Dict[str, float]:
+    """
+    Reduce a sampler sample to one value per metric.
+
+    Args:
+        sample: Sample from SystemSampler.sample
+
+    Returns:
+        Dictionary with 'time' and every metric in METRICS; missing values are NaN
+    """
+    load = sample.get('load') or (math.nan, math.nan, math.nan)
+    disk_percent = sample.get('disk_percent')
+    return {
+        'time': sample['time'],
+        'cpu_percent': float(sample['cpu_percent']),
+        'memory_percent': float(sample['memory_percent']),
+        'memory_used': float(sample['memory_used']),
+        'disk_percent': math.nan if disk_percent is None else float(disk_percent),
+        'load1': float(load[0]),
+        'load5': float(load[1]),
+        'load15': float(load[2]),
+        'process_count': float(len(sample['processes'])),
+    }
+
+
+class MetricsStore:
+    """
+    Fixed-size ring buffers of metric values, one array of doubles per metric.
+
+    Every series shares one write position, so a point is the same slot in
+    each array. Memory use is fixed at capacity doubles per series, and
+    appending a point never allocates.
+    """
+
+    def __init__(self, capacity: int = 1800):
+        """
+        Args:
+            capacity: Points kept per series
+        """
+        self.capacity = capacity
+        self.times = array('d', [math.nan]) * capacity
+        self.series: Dict[str, array] = {name: array('d', [math.nan]) * capacity
+                                         for name in METRICS}
+        # Points appended so far; the next one goes in slot count % capacity
+        self.count = 0
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Dict], None]] = []
+
+    def add_listener(self, callback: Callable[[Dict], None]):
+        """Call callback with each new point, on the thread that appends it."""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback: Callable[[Dict], None]):
+        """Stop calling a listener added with add_listener."""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def append(self, point: Dict[str, float]):
+        """
+        Add one point, overwriting the oldest once the buffers are full.
+
+        Args:
+            point: Dictionary with 'time' and a value for each metric
+        """
+        with self._lock:
+            slot = self.count % self.capacity
+            self.times[slot] = point['time']
+            for name, values in self.series.items():
+                values[slot] = point.get(name, math.nan)
+            self.count += 1
+        for callback in list(self._listeners):
+            callback(point)
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        """Get the most recent point, or None if there are none."""
+        with self._lock:
+            if not self.count:
+                return None
+            slot = (self.count - 1) % self.capacity
+            point = {'time': self.times[slot]}
+            point.update((name, values[slot]) for name, values in self.series.items())
+        return point
+
+    def query(self, seconds: Optional[float] = None, points: Optional[int] = None,
+              metrics: Optional[List[str]] = None) -> Dict[str, List[Optional[float]]]:
+        """
+        Get recent history, averaged down to at most a number of points.
+
+        Args:
+            seconds: Only points from the last this many seconds, counted
+                back from the newest point; all points if None
+            points: Maximum points returned; consecutive points are averaged
+                into buckets to fit. All points if None
+            metrics: Series to return; all of METRICS if None
+
+        Returns:
+            Dictionary with 'time' and each requested series as lists of the
+            same length, oldest first. Values that were unavailable are None
+
+        Raises:
+            ValueError: If a metric name is unknown
+        """
+        names = list(metrics or METRICS)
+        unknown = [name for name in names if name not in self.series]
+        if unknown:
+            raise ValueError(f"unknown metric: {', '.join(unknown)}")
+
+        with self._lock:
+            size = min(self.count, self.capacity)
+            first = self.count - size
+            # Copy the window out in time order, then release the lock
+            slots = [(first + i) % self.capacity for i in range(size)]
+            times = [self.times[slot] for slot in slots]
+            columns = {name: [self.series[name][slot] for slot in slots] for name in names}
+
+        if seconds is not None and times:
+            cutoff = times[-1] - seconds
+            start = next((i for i, t in enumerate(times) if t >= cutoff), len(times))
+            times = times[start:]
+            columns = {name: values[start:] for name, values in columns.items()}
+
+        if points is not None and 0 < points < len(times):
+            bounds = [len(times) * i // points for i in range(points + 1)]
+            times = [_mean(times[a:b]) for a, b in zip(bounds, bounds[1:])]
+            columns = {name: [_mean(values[a:b]) for a, b in zip(bounds, bounds[1:])]
+                       for name, values in columns.items()}
+
+        result = {'time': times}
+        for name, values in columns.items():
+            result[name] = [None if math.isnan(value) else value for value in values]
+        return result
+
+
+def json_point(point: Dict[str, float]) -> Dict[str, Optional[float]]:
+    """Copy of a point with NaN values replaced by None, which JSON can carry."""
+    return {name: None if isinstance(value, float) and math.isnan(value) else value
+            for name, value in point.items()}
+
+
+def _mean(values: List[float]) -> float:
+    """Mean of the values that are not NaN, or NaN if there are none."""
+    present = [value for value in values if not math.isnan(value)]
+    return sum(present) / len(present) if present else math.nan
+
+
+class MetricsFeed:
+    """
+    Delivers each new point of a MetricsStore to any number of asyncio subscribers.
+
+    The sampling thread hands a point to the event loop once, and the loop
+    copies it into every subscriber's queue, so each extra dashboard costs
+    a queue put rather than another round of sampling. A subscriber that
+    falls behind loses its oldest points.
+    """
+
+    def __init__(self, store: MetricsStore):
+        """
+        Args:
+            store: Store whose new points are delivered
+        """
+        self.store = store
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        store.add_listener(self._publish)
+
+    def subscribe(self) -> asyncio.Queue:
+        """
+        Start receiving points. Must be called on the event loop.
+
+        Returns:
+            Queue that new points are put on
+        """
+        self._loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_BACKLOG)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """Stop delivering to a queue returned by subscribe."""
+        self._subscribers.discard(queue)
+
+    @property
+    def subscribers(self) -> int:
+        """Number of current subscribers."""
+        return len(self._subscribers)
+
+    def _publish(self, point: Dict):
+        """Hand a point to the event loop. Runs on the sampling thread."""
+        loop = self._loop
+        if loop is None or not self._subscribers:
+            return
+        try:
+            loop.call_soon_threadsafe(self._deliver, point)
+        except RuntimeError:
+            # The loop has been closed
+            self._loop = None
+
+    def _deliver(self, point: Dict):
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(point)
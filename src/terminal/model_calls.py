@@ -0,0 +1,260 @@
+"""
+Helpers for making calls to the AI model.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class ModelUnavailable(Exception):
+    """Raised when a model call is refused, rate limited or timed out."""
+
+
+class SingleFlight:
+    """Shares one in-flight call between concurrent callers with the same key."""
+
+    def __init__(self):
+        # (event loop, key) -> future; futures can only be awaited on their own loop
+        self._inflight: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run call(), or wait for the identical call already in flight.
+
+        Args:
+            key: Identifies identical calls, e.g. the prompt text
+            call: Starts the call and returns an awaitable for its result
+
+        Returns:
+            The call's result, shared by every caller with the same key
+        """
+        flight_key = (asyncio.get_running_loop(), key)
+        future = self._inflight.get(flight_key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            future = asyncio.ensure_future(call())
+            self._inflight[flight_key] = future
+            future.add_done_callback(lambda done: self._finish(flight_key, done))
+        # A cancelled caller must not cancel the call for everyone else
+        return await asyncio.shield(future)
+
+    def _finish(self, flight_key: Tuple, future: asyncio.Future):
+        """Forget a finished call."""
+        if self._inflight.get(flight_key) is future:
+            del self._inflight[flight_key]
+        if not future.cancelled():
+            # Mark the exception as retrieved in case every caller went away
+            future.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Get call counters."""
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._inflight),
+        }
+
+
+class TokenBucket:
+    """Token-bucket rate limiter that can be shared across threads and event loops."""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum number of tokens, i.e. the allowed burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, going into debt if needed. Returns seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def refund(self):
+        """Give back a reserved token that won't be used."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+    async def acquire(self, max_wait: float):
+        """
+        Wait for a token.
+
+        Args:
+            max_wait: Longest acceptable wait in seconds
+
+        Raises:
+            ModelUnavailable: If the wait would be longer than max_wait
+        """
+        wait = self.reserve()
+        if wait > max_wait:
+            self.refund()
+            raise ModelUnavailable("rate limit exceeded")
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """Stops calls to a failing service until it has had time to recover."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds to wait before letting a trial call through
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Check whether a call may go ahead."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                # Let one trial call through
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def is_open(self) -> bool:
+        """Check whether calls are currently being refused, without claiming a trial call."""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.monotonic() - self.opened_at < self.reset_timeout
+            return self.state == self.HALF_OPEN
+
+    def record_success(self):
+        """Record a successful call."""
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_abandoned(self):
+        """Record a call that was given up before reaching the service, e.g. cancelled."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                # Let the next caller make the trial call instead
+                self.state = self.OPEN
+
+    def record_failure(self):
+        """Record a failed or timed out call."""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ModelCaller:
+    """Runs blocking model calls on a dedicated executor with rate limiting, timeouts and a circuit breaker."""
+
+    def __init__(self, max_workers: int = 4, rate: float = 5.0, burst: float = 10.0,
+                 timeout: float = 15.0, failure_threshold: int = 5,
+                 reset_timeout: float = 30.0):
+        """
+        Args:
+            max_workers: Threads dedicated to model calls
+            rate: Calls allowed per second
+            burst: Calls allowed at once before rate limiting kicks in
+            timeout: Seconds before a call, including any rate limit wait, is abandoned
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a trial call
+        """
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='model-call')
+        self.rate_limiter = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.max_workers = max_workers
+        self.succeeded = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.rejected = 0
+
+    def available(self) -> bool:
+        """Check whether calls are currently going through."""
+        return not self.breaker.is_open()
+
+    async def call(self, func: Callable, *args) -> Any:
+        """
+        Run func(*args) on the model executor.
+
+        Args:
+            func: Blocking model call, e.g. model.generate_content
+            *args: Arguments for func
+
+        Returns:
+            The return value of func
+
+        Raises:
+            ModelUnavailable: If the circuit is open, the rate limit can't be
+                met within the timeout, or the call times out
+        """
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise ModelUnavailable("circuit open")
+
+        start = time.monotonic()
+        try:
+            await self.rate_limiter.acquire(self.timeout)
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(self._executor, func, *args)
+            remaining = max(0.0, self.timeout - (time.monotonic() - start))
+            result = await asyncio.wait_for(future, remaining)
+        except ModelUnavailable:
+            self.rejected += 1
+            self.breaker.record_abandoned()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.record_abandoned()
+            raise
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            self.breaker.record_failure()
+            raise ModelUnavailable(f"model call timed out after {self.timeout}s")
+        except Exception:
+            self.failed += 1
+            self.breaker.record_failure()
+            raise
+
+        self.succeeded += 1
+        self.breaker.record_success()
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Get call counters."""
+        return {
+            'max_workers': self.max_workers,
+            'circuit': self.breaker.state,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'timed_out': self.timed_out,
+            'rejected': self.rejected,
+        }
+
+    def shutdown(self, wait: bool = False):
+        """Stop the model executor."""
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,240 @@
+"""
+Output size limits and pageable result buffers for command output.
+"""
+import secrets
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, Optional
+
+
+# Bytes of output returned or streamed with the command itself
+DEFAULT_INLINE_LIMIT = 256 * 1024
+# Bytes of output kept for paging; anything past this is dropped
+DEFAULT_OUTPUT_CAP = 64 * 1024 * 1024
+# Bytes of a result buffer held in memory before it spills to disk
+SPOOL_SIZE = 1024 * 1024
+# Largest page a client can ask for
+MAX_PAGE_SIZE = 1024 * 1024
+
+
+def char_boundary(data: bytes, end: int) -> int:
+    """Move end back so it does not split a UTF-8 character."""
+    while 0 < end < len(data) and (data[end] & 0xC0) == 0x80:
+        end -= 1
+    return end
+
+
+class OutputBuffer:
+    """Complete output of one command, in memory up to SPOOL_SIZE and on disk after that."""
+
+    def __init__(self, spool_size: int = SPOOL_SIZE):
+        self._file = tempfile.SpooledTemporaryFile(max_size=spool_size, mode='w+b')
+        self._lock = threading.Lock()
+        self.size = 0
+
+    def write(self, data: bytes):
+        """Append bytes to the buffer."""
+        with self._lock:
+            self._file.seek(0, 2)
+            self._file.write(data)
+            self.size += len(data)
+
+    def read(self, offset: int, limit: int) -> bytes:
+        """
+        Read a page of the buffer.
+
+        Args:
+            offset: Byte offset to start at
+            limit: Maximum number of bytes to read
+
+        Returns:
+            Bytes read, ending on a character boundary unless at the end
+        """
+        with self._lock:
+            self._file.seek(max(0, offset))
+            data = self._file.read(max(0, limit) + 3)
+        if len(data) <= limit:
+            return data
+        return data[:char_boundary(data, limit)]
+
+    def close(self):
+        """Release the buffer's memory or temporary file."""
+        with self._lock:
+            self._file.close()
+
+
+class OutputLimiter:
+    """
+    Applies output limits to a command's output.
+
+    The first inline_limit bytes are passed through. Once output goes past
+    that, all of it is also written to an OutputBuffer so it can be paged
+    through, up to cap bytes; the command is stopped after that.
+    """
+
+    def __init__(self, inline_limit: int = DEFAULT_INLINE_LIMIT,
+                 cap: int = DEFAULT_OUTPUT_CAP):
+        """
+        Args:
+            inline_limit: Bytes of output delivered with the command
+            cap: Bytes of output kept in total
+        """
+        self.inline_limit = inline_limit
+        self.cap = max(cap, inline_limit)
+        self.inline_size = 0
+        self.total_size = 0
+        self.capped = False
+        self.buffer: Optional[OutputBuffer] = None
+        self._inline_parts = []
+
+    @property
+    def spilled(self) -> bool:
+        """True if there is more output than was delivered inline."""
+        return self.buffer is not None
+
+    def feed(self, chunk: str) -> str:
+        """
+        Take one chunk of output.
+
+        Args:
+            chunk: Text produced by the command
+
+        Returns:
+            Part of the chunk to deliver inline, possibly empty
+        """
+        data = chunk.encode('utf-8')
+        if self.total_size + len(data) > self.cap:
+            data = data[:char_boundary(data, self.cap - self.total_size)]
+            self.capped = True
+
+        room = self.inline_limit - self.inline_size
+        inline = data if len(data) <= room else data[:char_boundary(data, room)]
+        self.inline_size += len(inline)
+        self.total_size += len(data)
+
+        if self.buffer is None and len(inline) < len(data):
+            # Output no longer fits inline; keep all of it for paging
+            self.buffer = OutputBuffer()
+            self.buffer.write(b''.join(self._inline_parts))
+            self._inline_parts = []
+        if self.buffer is not None:
+            self.buffer.write(data)
+        else:
+            self._inline_parts.append(data)
+
+        return inline.decode('utf-8')
+
+    def limit(self, chunks: Iterable[str]) -> Iterator[str]:
+        """
+        Feed a stream of chunks through the limiter.
+
+        Args:
+            chunks: Output chunks, e.g. a CommandStream
+
+        Yields:
+            Inline parts of the output
+        """
+        for chunk in chunks:
+            inline = self.feed(chunk)
+            if inline:
+                yield inline
+            if self.capped:
+                break
+
+    def notice(self, result_id: str) -> str:
+        """Line telling the user that output was cut short and where the rest is."""
+        message = (f"[output truncated: showing {self.inline_size} of "
+                   f"{self.total_size} bytes, full output in result {result_id}")
+        if self.capped:
+            message += f"; output capped at {self.cap} bytes"
+        return message + "]"
+
+
+class ResultStore:
+    """Bounded LRU of pageable command results for one terminal."""
+
+    def __init__(self, max_results: int = 8):
+        """
+        Args:
+            max_results: Number of results kept before the oldest is discarded
+        """
+        self.max_results = max_results
+        self._results: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, limiter: OutputLimiter) -> Dict:
+        """
+        Keep a spilled command result for paging.
+
+        Args:
+            limiter: Limiter that has spilled output to a buffer
+
+        Returns:
+            Result metadata: result_id, inline_size, total_size and capped
+        """
+        result = {
+            'result_id': secrets.token_hex(8),
+            'inline_size': limiter.inline_size,
+            'total_size': limiter.total_size,
+            'capped': limiter.capped,
+        }
+        with self._lock:
+            self._results[result['result_id']] = dict(result, buffer=limiter.buffer)
+            while len(self._results) > self.max_results:
+                _, evicted = self._results.popitem(last=False)
+                evicted['buffer'].close()
+        return result
+
+    def page(self, result_id: str, offset: int = 0, limit: int = 64 * 1024) -> Optional[Dict]:
+        """
+        Read a page of a stored result.
+
+        Args:
+            result_id: Id returned by add
+            offset: Byte offset to start at
+            limit: Maximum number of bytes, at most MAX_PAGE_SIZE
+
+        Returns:
+            Dictionary with 'data', 'offset', 'next_offset', 'total_size' and
+            'capped', or None if the result is unknown or has been discarded
+        """
+        with self._lock:
+            result = self._results.get(result_id)
+            if result is None:
+                return None
+            self._results.move_to_end(result_id)
+        data = result['buffer'].read(offset, min(limit, MAX_PAGE_SIZE))
+        return {
+            'result_id': result_id,
+            'data': data.decode('utf-8', errors='replace'),
+            'offset': offset,
+            'next_offset': offset + len(data),
+            'total_size': result['total_size'],
+            'capped': result['capped'],
+        }
+
+    def clear(self):
+        """Discard all stored results."""
+        with self._lock:
+            for result in self._results.values():
+                result['buffer'].close()
+            self._results.clear()
+
+
+def parse_output_caps(spec: str) -> Dict[str, int]:
+    """
+    Parse per-command output caps, e.g. "find=16777216,cat=67108864".
+
+    Args:
+        spec: Comma-separated command=bytes pairs
+
+    Returns:
+        Dictionary mapping command names to caps in bytes
+    """
+    caps = {}
+    for item in spec.split(','):
+        command, _, size = item.partition('=')
+        if command.strip() and size.strip():
+            caps[command.strip()] = int(size)
+    return caps
@@ -0,0 +1,80 @@
+"""
+Single-pass matcher for ordered tables of regex patterns.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# A pattern that starts with a literal word followed by a space can only
+# match input whose first word is that word
+LEADING_WORD = re.compile(r'([a-z]+) ')
+
+
+class PatternMatcher:
+    """
+    Finds the first matching pattern of an ordered table in one pass.
+
+    Patterns are grouped by their leading literal word, and each group is
+    compiled into a single alternation of named groups. A lookup only runs
+    the group for the input's first word plus the patterns without a
+    leading word, so the cost stays flat as the table grows. Priority is
+    the table order, as with trying re.match on each pattern in turn.
+    Patterns must not use named groups or numbered backreferences.
+    """
+
+    def __init__(self, patterns: Dict[str, str]):
+        """
+        Args:
+            patterns: Ordered mapping of regex pattern -> command template
+        """
+        self.patterns: List[Tuple[str, str]] = list(patterns.items())
+        self.group_counts = [re.compile(pattern).groups for pattern, _ in self.patterns]
+
+        by_word: Dict[str, List[int]] = {}
+        generic: List[int] = []
+        for index, (pattern, _) in enumerate(self.patterns):
+            leading = LEADING_WORD.match(pattern)
+            if leading:
+                by_word.setdefault(leading.group(1), []).append(index)
+            else:
+                generic.append(index)
+
+        self._by_word = {word: self._compile(indices) for word, indices in by_word.items()}
+        self._generic = self._compile(generic) if generic else None
+
+    def _compile(self, indices: List[int]) -> re.Pattern:
+        """Compile patterns into one alternation, named by table position."""
+        return re.compile('|'.join(f'(?P<p{i}>{self.patterns[i][0]})' for i in indices))
+
+    def _search(self, regex: Optional[re.Pattern], text: str) -> Optional[Tuple[int, tuple]]:
+        """Match text against a combined regex, returning (index, groups)."""
+        if regex is None:
+            return None
+        match = regex.match(text)
+        if not match:
+            return None
+        name = match.lastgroup
+        index = int(name[1:])
+        start = regex.groupindex[name]
+        return index, match.groups()[start:start + self.group_counts[index]]
+
+    def match(self, text: str) -> Optional[Tuple[str, tuple]]:
+        """
+        Find the first pattern in table order that matches the start of text.
+
+        Args:
+            text: Input to match
+
+        Returns:
+            Tuple of (command template, captured groups), or None if nothing matches
+        """
+        first_word = text.split(' ', 1)[0]
+        candidates = [
+            self._search(self._by_word.get(first_word), text),
+            self._search(self._generic, text),
+        ]
+        found = [candidate for candidate in candidates if candidate is not None]
+        if not found:
+            return None
+        index, groups = min(found)
+        return self.patterns[index][1], groups
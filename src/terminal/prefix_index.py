@@ -0,0 +1,139 @@
+"""
+Prefix index for ranked command and phrase completion.
+"""
+from typing import Dict, Iterable, List
+
+
+class _Node:
+    """Trie node holding the best-ranked terms of its subtree."""
+
+    __slots__ = ('children', 'top', 'is_term')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.top: List[str] = []
+        self.is_term = False
+
+
+class PrefixIndex:
+    """
+    Trie of terms ranked by frequency.
+
+    Every node keeps the top max_results terms below it, so a lookup costs
+    the length of the prefix no matter how many terms are indexed. Ties
+    are broken by the order terms were first added.
+    """
+
+    def __init__(self, terms: Iterable[str] = (), max_results: int = 10):
+        """
+        Args:
+            terms: Initial terms, each with a count of 1
+            max_results: Largest k that complete() can return
+        """
+        self.max_results = max_results
+        self._root = _Node()
+        self._counts: Dict[str, int] = {}
+        self._order: Dict[str, int] = {}
+        self._next_order = 0
+        for term in terms:
+            self.add(term)
+
+    def _rank(self, term: str):
+        return (-self._counts[term], self._order[term])
+
+    def add(self, term: str, count: int = 1):
+        """
+        Add a term or raise its count.
+
+        Args:
+            term: Term to index
+            count: Amount to add to its frequency
+        """
+        if not term:
+            return
+        if term not in self._counts:
+            self._counts[term] = 0
+            self._order[term] = self._next_order
+            self._next_order += 1
+        self._counts[term] += count
+
+        # A count only ever goes up here, so other terms can't move up past it
+        node = self._root
+        path = [node]
+        for char in term:
+            node = node.children.setdefault(char, _Node())
+            path.append(node)
+        node.is_term = True
+
+        rank = self._rank(term)
+        for node in path:
+            top = node.top
+            if term in top:
+                top.sort(key=self._rank)
+            elif len(top) < self.max_results or rank < self._rank(top[-1]):
+                top.append(term)
+                top.sort(key=self._rank)
+                del top[self.max_results:]
+
+    def remove(self, term: str, count: int = 1):
+        """
+        Lower a term's count, dropping it from the index when it reaches zero.
+
+        Args:
+            term: Term to lower
+            count: Amount to subtract from its frequency
+        """
+        if term not in self._counts:
+            return
+        self._counts[term] -= count
+
+        path = [self._root]
+        for char in term:
+            path.append(path[-1].children[char])
+
+        if self._counts[term] <= 0:
+            del self._counts[term]
+            del self._order[term]
+            path[-1].is_term = False
+
+        # Rebuild the affected nodes bottom-up; each child's list already
+        # holds the best terms of its subtree
+        for depth in range(len(path) - 1, -1, -1):
+            node = path[depth]
+            if term not in node.top:
+                continue
+            candidates = {child_term for child in node.children.values()
+                          for child_term in child.top}
+            if node.is_term:
+                candidates.add(term[:depth])
+            node.top = sorted(candidates, key=self._rank)[:self.max_results]
+            if depth > 0 and not node.top and not node.children:
+                del path[depth - 1].children[term[depth - 1]]
+
+    def complete(self, prefix: str, k: int = 5) -> List[str]:
+        """
+        Get the best-ranked terms starting with prefix.
+
+        Args:
+            prefix: Text typed so far
+            k: Number of results, at most max_results
+
+        Returns:
+            Up to k terms, most frequent first
+        """
+        node = self._root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.top[:k]
+
+    def count(self, term: str) -> int:
+        """Get a term's current count."""
+        return self._counts.get(term, 0)
+
+    def __contains__(self, term: str) -> bool:
+        return term in self._counts
+
+    def __len__(self) -> int:
+        return len(self._counts)
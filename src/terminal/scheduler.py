@@ -0,0 +1,165 @@
+"""
+Execution scheduler that keeps blocking terminal work off the event loop.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List
+
+
+class ExecutionScheduler:
+    """Runs blocking calls on a bounded thread pool with per-session ordering."""
+
+    def __init__(self, max_workers: int = 8):
+        """
+        Args:
+            max_workers: Maximum number of calls running at the same time
+        """
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='terminal-exec')
+        # session_id -> [lock, number of calls holding or waiting for it]
+        self._session_locks: Dict[str, List] = {}
+        self._stats_lock = threading.Lock()
+        self.waiting = 0
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_queue_depth = 0
+        self.total_wait_time = 0.0
+
+    @asynccontextmanager
+    async def session(self, session_id: str):
+        """
+        Hold a session's turn. Calls sharing a session id run one at a time, in order.
+
+        Args:
+            session_id: Session to serialize on
+        """
+        entry = self._session_locks.get(session_id)
+        if entry is None:
+            entry = self._session_locks[session_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            self.waiting += 1
+            try:
+                await entry[0].acquire()
+            finally:
+                self.waiting -= 1
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._session_locks.pop(session_id, None)
+
+    async def submit(self, func: Callable, *args) -> Any:
+        """
+        Run func(*args) on the pool without session ordering.
+
+        Args:
+            func: Blocking callable to run
+            *args: Arguments for func
+
+        Returns:
+            The return value of func
+        """
+        submitted = time.perf_counter()
+        with self._stats_lock:
+            self.pending += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.pending - self.running)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, self._call, submitted, func, args)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The worker thread can't be interrupted, so keep the session's
+            # turn until it is done rather than letting the next call overlap
+            await asyncio.wait({future})
+            raise
+        finally:
+            with self._stats_lock:
+                self.pending -= 1
+
+    async def run(self, session_id: str, func: Callable, *args) -> Any:
+        """
+        Run func(*args) on the pool after earlier calls for the same session finish.
+
+        Args:
+            session_id: Session to serialize on
+            func: Blocking callable to run
+            *args: Arguments for func
+
+        Returns:
+            The return value of func
+        """
+        async with self.session(session_id):
+            return await self.submit(func, *args)
+
+    async def iterate(self, iterable: Iterable) -> AsyncIterator:
+        """
+        Consume a blocking iterable on the pool, one item at a time.
+
+        The next item is only produced once the caller asks for it, so a
+        slow consumer holds back the producer instead of buffering output.
+
+        Args:
+            iterable: Blocking iterable, e.g. a CommandStream
+
+        Yields:
+            Items of the iterable
+        """
+        iterator = iter(iterable)
+        done = object()
+        while True:
+            item = await self.submit(next, iterator, done)
+            if item is done:
+                return
+            yield item
+
+    def _call(self, submitted: float, func: Callable, args: tuple) -> Any:
+        """Run a call in a worker thread, keeping the counters up to date."""
+        with self._stats_lock:
+            self.running += 1
+            self.total_wait_time += time.perf_counter() - submitted
+        try:
+            result = func(*args)
+        except Exception:
+            with self._stats_lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self.running -= 1
+                self.completed += 1
+        return result
+
+    def queue_depth(self) -> int:
+        """Number of submitted calls that have not started running yet."""
+        with self._stats_lock:
+            return self.pending - self.running
+
+    def stats(self) -> Dict[str, float]:
+        """Get scheduler counters."""
+        with self._stats_lock:
+            return {
+                'max_workers': self.max_workers,
+                'running': self.running,
+                'queue_depth': self.pending - self.running,
+                'waiting_for_session': self.waiting,
+                'max_queue_depth': self.max_queue_depth,
+                'completed': self.completed,
+                'failed': self.failed,
+                'avg_wait_ms': (self.total_wait_time / self.completed * 1000
+                                if self.completed else 0.0),
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker pool."""
+        self._executor.shutdown(wait=wait)
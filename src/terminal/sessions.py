@@ -0,0 +1,190 @@
+"""
+Per-session terminal management for multi-user backends.
+"""
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from .core import TerminalCore
+from .history_store import expire_logs
+from .output_buffer import DEFAULT_INLINE_LIMIT, DEFAULT_OUTPUT_CAP
+
+
+# Session tokens are generated with secrets.token_urlsafe, but clients may
+# send back any string, so only accept tokens that look like ours.
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+# Most seconds between sweeps for expired history logs
+HISTORY_EXPIRY_INTERVAL = 3600.0
+
+
+class SessionManager:
+    """Bounded LRU pool of TerminalCore instances keyed by session token."""
+
+    def __init__(self, max_sessions: int = 256, idle_timeout: float = 1800.0,
+                 max_history: int = 1000, initial_directory: str = "~",
+                 inline_output_limit: int = DEFAULT_INLINE_LIMIT,
+                 max_output: int = DEFAULT_OUTPUT_CAP,
+                 output_caps: Optional[Dict[str, int]] = None,
+                 file_index=None, history_dir: Optional[str] = None,
+                 history_retention: Optional[float] = None):
+        """
+        Args:
+            max_sessions: Maximum number of live sessions before the least
+                recently used one is evicted
+            idle_timeout: Seconds of inactivity after which a session is evicted
+            max_history: Per-session cap on commands kept in memory
+            initial_directory: Starting directory for new sessions
+            inline_output_limit: Bytes of command output returned inline
+            max_output: Bytes of command output kept for paging
+            output_caps: Per-command overrides of max_output
+            file_index: FileIndex shared by every session, or None
+            history_dir: Directory holding each session's history log, so
+                history outlives the session and the process; None keeps
+                history in memory only
+            history_retention: Seconds a history log is kept after its last
+                command, checked on a background thread; None keeps logs forever
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_history = max_history
+        self.initial_directory = initial_directory
+        self.inline_output_limit = inline_output_limit
+        self.max_output = max_output
+        self.output_caps = output_caps
+        self.file_index = file_index
+        self.history_dir = history_dir
+        self.history_retention = history_retention
+        self._sessions: "OrderedDict[str, Tuple[TerminalCore, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+        if history_dir and history_retention:
+            threading.Thread(target=self._expire_history, name='history-expiry',
+                             daemon=True).start()
+
+    def get(self, session_id: Optional[str] = None) -> Tuple[str, TerminalCore]:
+        """
+        Get the terminal for a session, creating it if needed.
+
+        Args:
+            session_id: Session token sent by the client, or None for a new session
+
+        Returns:
+            Tuple of (session_id, terminal)
+        """
+        if not session_id or not SESSION_ID_PATTERN.match(session_id):
+            session_id = secrets.token_urlsafe(16)
+
+        now = time.monotonic()
+        with self._lock:
+            evicted = self._evict_idle(now)
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                terminal = entry[0]
+                self._sessions.move_to_end(session_id)
+            else:
+                terminal = self._create_terminal(session_id)
+                self.created += 1
+                while len(self._sessions) >= self.max_sessions:
+                    evicted.append(self._sessions.popitem(last=False)[1][0])
+                    self.evicted += 1
+            self._sessions[session_id] = (terminal, now)
+        self._close(evicted)
+
+        return session_id, terminal
+
+    def lookup(self, session_id: Optional[str]) -> Optional[TerminalCore]:
+        """
+        Get the terminal of an existing session without creating one.
+
+        Args:
+            session_id: Session token sent by the client
+
+        Returns:
+            The session's terminal, or None if the session doesn't exist
+        """
+        if not session_id:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            evicted = self._evict_idle(now)
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions.move_to_end(session_id)
+                self._sessions[session_id] = (entry[0], now)
+        self._close(evicted)
+        return entry[0] if entry is not None else None
+
+    def remove(self, session_id: str) -> bool:
+        """Drop a session. Returns True if it existed."""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        self._close([entry[0]])
+        return True
+
+    def evict_idle(self) -> int:
+        """Evict sessions idle for longer than idle_timeout. Returns the count evicted."""
+        with self._lock:
+            evicted = self._evict_idle(time.monotonic())
+        self._close(evicted)
+        return len(evicted)
+
+    def stats(self) -> Dict[str, int]:
+        """Get session pool counters."""
+        with self._lock:
+            return {
+                'active': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'created': self.created,
+                'evicted': self.evicted,
+            }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def _create_terminal(self, session_id: str) -> TerminalCore:
+        """Build a new terminal for a session."""
+        # Session ids match SESSION_ID_PATTERN, so they are safe file names
+        history_path = (os.path.join(self.history_dir, f"{session_id}.log")
+                        if self.history_dir else None)
+        return TerminalCore(initial_directory=self.initial_directory,
+                            max_history=self.max_history,
+                            inline_output_limit=self.inline_output_limit,
+                            max_output=self.max_output,
+                            output_caps=self.output_caps,
+                            file_index=self.file_index,
+                            history_path=history_path)
+
+    def _expire_history(self):
+        """Delete history logs past their retention, now and then periodically."""
+        interval = min(self.history_retention, HISTORY_EXPIRY_INTERVAL)
+        while True:
+            expire_logs(self.history_dir, self.history_retention)
+            time.sleep(interval)
+
+    def _evict_idle(self, now: float) -> List[TerminalCore]:
+        """Evict idle sessions, returning their terminals to close. Caller must hold the lock."""
+        # The dict is kept in last-access order, so idle sessions are at the front
+        evicted = []
+        while self._sessions:
+            session_id, (terminal, last_used) = next(iter(self._sessions.items()))
+            if now - last_used <= self.idle_timeout:
+                break
+            del self._sessions[session_id]
+            evicted.append(terminal)
+        self.evicted += len(evicted)
+        return evicted
+
+    @staticmethod
+    def _close(terminals: List[TerminalCore]):
+        """Release the resources of evicted terminals, outside the lock."""
+        for terminal in terminals:
+            terminal.close()
@@ -0,0 +1,41 @@
+"""
+Worker pools shared by every terminal, started on first use.
+"""
+import os
+import threading
+from concurrent.futures import Executor
+from typing import Callable, Optional, Tuple
+
+
+class SharedPool:
+    """
+    An executor created the first time it is needed and shared from then on.
+
+    The number of workers is read from an environment variable when the
+    pool starts, so importing a module that owns a pool starts nothing.
+    """
+
+    def __init__(self, factory: Callable[[int], Executor], workers_env: str,
+                 default_workers: Optional[int] = None):
+        """
+        Args:
+            factory: Builds the executor given its number of workers
+            workers_env: Environment variable that sets the number of workers
+            default_workers: Workers when the variable is unset or 0; None
+                for one per CPU
+        """
+        self.factory = factory
+        self.workers_env = workers_env
+        self.default_workers = default_workers
+        self._executor: Optional[Executor] = None
+        self._workers = 0
+        self._lock = threading.Lock()
+
+    def get(self) -> Tuple[Executor, int]:
+        """Get the executor and its number of workers, starting it on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._workers = (int(os.environ.get(self.workers_env, 0))
+                                 or self.default_workers or os.cpu_count() or 1)
+                self._executor = self.factory(self._workers)
+            return self._executor, self._workers
@@ -0,0 +1,75 @@
+"""
+Streaming output protocol for terminal commands.
+"""
+from typing import Generator, Iterable, Iterator, Optional
+
+
+# Lines per chunk when a command streams line-oriented output
+LINES_PER_CHUNK = 256
+
+
+class CommandStream:
+    """
+    Output of a command as an iterable of text chunks.
+
+    Streaming commands are generators that yield chunks and return their
+    exit code. exit_code is None until the stream has been consumed, unless
+    the command finished before streaming started.
+    """
+
+    def __init__(self, chunks: Generator[str, None, int], exit_code: Optional[int] = None):
+        self._chunks = chunks
+        self.exit_code = exit_code
+        # Name of the command producing the output, if it was found
+        self.command: Optional[str] = None
+
+    @classmethod
+    def from_result(cls, output: str, exit_code: int) -> 'CommandStream':
+        """Wrap an already complete (output, exit_code) result."""
+        def chunks():
+            if output:
+                yield output
+            return exit_code
+        return cls(chunks(), exit_code)
+
+    def __iter__(self) -> Iterator[str]:
+        try:
+            exit_code = yield from self._chunks
+        except Exception as e:
+            yield f"Error: {str(e)}"
+            exit_code = 1
+        self.exit_code = exit_code if exit_code is not None else 0
+
+    def read(self) -> str:
+        """Consume the whole stream and return its output."""
+        return ''.join(self)
+
+    def close(self):
+        """Stop the command early, e.g. when the client goes away."""
+        self._chunks.close()
+
+
+def join_lines(lines: Iterable[str], first: bool = True,
+               lines_per_chunk: int = LINES_PER_CHUNK) -> Generator[str, None, bool]:
+    """
+    Yield newline-separated lines in chunks.
+
+    Args:
+        lines: Lines without trailing newlines
+        first: False if output has already been written, so a separator is needed
+        lines_per_chunk: Lines to batch into each chunk
+
+    Returns:
+        True while nothing has been written yet, for chaining calls
+    """
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= lines_per_chunk:
+            yield ('' if first else '\n') + '\n'.join(batch)
+            first = False
+            batch = []
+    if batch:
+        yield ('' if first else '\n') + '\n'.join(batch)
+        first = False
+    return first
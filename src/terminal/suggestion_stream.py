@@ -0,0 +1,79 @@
+"""
+Debounced, cancellable suggestion streaming for one client connection.
+"""
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+
+class SuggestionStream:
+    """
+    Streams suggestions for the latest partial input of one client.
+
+    Local suggestions are sent straight away. The model is only asked once
+    the input has been stable for the debounce interval, and any request
+    still pending when newer input arrives is cancelled.
+    """
+
+    def __init__(self, interpreter, send: Callable[[dict], Awaitable[None]],
+                 debounce: float = 0.15):
+        """
+        Args:
+            interpreter: GeminiAIInterpreter providing the suggestions
+            send: Coroutine function that sends one frame to the client
+            debounce: Seconds of quiet before the model is asked
+        """
+        self.interpreter = interpreter
+        self.send = send
+        self.debounce = debounce
+        self._task: Optional[asyncio.Task] = None
+        self.received = 0
+        self.superseded = 0
+        self.model_requests = 0
+
+    def update(self, partial: str):
+        """
+        Handle new partial input, superseding any request still in progress.
+
+        Args:
+            partial: Text typed so far
+        """
+        self.received += 1
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            self.superseded += 1
+        self._task = asyncio.ensure_future(self._suggest(partial))
+
+    async def _suggest(self, partial: str):
+        """Send local suggestions, then model suggestions once typing pauses."""
+        text = partial.strip()
+        basic = self.interpreter.get_basic_suggestions(text) if text else []
+        await self.send({
+            'partial': partial,
+            'suggestions': basic,
+            'source': 'basic',
+            'done': not text,
+        })
+        if not text:
+            return
+
+        await asyncio.sleep(self.debounce)
+        self.model_requests += 1
+        try:
+            suggestions = await self.interpreter.get_suggestions_async(text)
+        except Exception:
+            suggestions = basic
+        await self.send({
+            'partial': partial,
+            'suggestions': suggestions,
+            'source': 'ai',
+            'done': True,
+        })
+
+    async def close(self):
+        """Cancel any request still in progress."""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -3,97 +3,464 @@ System monitoring tools for the terminal.
 """
 import psutil
 import os
-from typing import List, Dict
+import heapq
+import select
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Deque, Iterable, List, Dict, Optional, Tuple
+from functools import lru_cache
+from .metrics_store import MetricsStore, sample_point
+try:
+    import grp
+    import pwd
+except ImportError:
+    # Not available on Windows; ids are shown as numbers
+    grp = pwd = None
+
+# Seconds between samples, unless SYSTEM_SAMPLE_INTERVAL is set
+DEFAULT_SAMPLE_INTERVAL = 2.0
+# Full samples kept in the ring buffer; metrics_capacity covers longer history
+SAMPLE_HISTORY = 60
+# Points kept per metric series, an hour at the default interval
+METRICS_CAPACITY = 1800
+# Seconds between priming the CPU counters and the first sample
+FIRST_SAMPLE_DELAY = 0.25
+# Per-process fields read each sample; owners come from uids where the platform has them
+PROCESS_FIELDS = ('pid', 'name', 'uids' if hasattr(psutil.Process, 'uids') else 'username',
+                  'cpu_percent', 'memory_percent', 'status')
+# ps sort keys: (position in a sample's process tuple, largest first by default)
+PROCESS_SORT_KEYS = {'cpu': (3, True), 'mem': (4, True), 'pid': (0, False)}
+# Processes listed by ps unless -n is given
+DEFAULT_PROCESS_LIMIT = 20
+# Changes whenever a filesystem is mounted or unmounted (Linux)
+MOUNTINFO_PATH = '/proc/self/mountinfo'
+# Filesystem types df leaves out
+SKIPPED_FILESYSTEMS = ('devfs', 'autofs', 'proc', 'sysfs')
+# Threads shared by df for statvfs calls
+DF_WORKERS = 16
+
+
+@lru_cache(maxsize=1024)
+def user_name(uid: int) -> str:
+    """Name of a user id, or the id itself if it has no name."""
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except (KeyError, AttributeError):
+        return str(uid)
+
+
+@lru_cache(maxsize=1024)
+def group_name(gid: int) -> str:
+    """Name of a group id, or the id itself if it has no name."""
+    try:
+        return grp.getgrgid(gid).gr_name
+    except (KeyError, AttributeError):
+        return str(gid)
+
+
+class SystemSampler:
+    """
+    Background thread sampling CPU, memory, load and per-process counters.
+    
+    Samples go into a ring buffer, so readers get the latest one without
+    waiting on psutil. psutil.Process objects are kept between samples,
+    which makes each process's CPU figure the usage since the last sample
+    rather than 0.0. Every sample is also added to a MetricsStore, which
+    keeps a longer, compact history of the system-wide figures.
+    """
+    
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL, history: int = SAMPLE_HISTORY,
+                 metrics_capacity: int = METRICS_CAPACITY):
+        """
+        Args:
+            interval: Seconds between samples
+            history: Samples kept in the ring buffer
+            metrics_capacity: Points kept per metric series
+        """
+        self.interval = interval
+        self.samples: Deque[Dict] = deque(maxlen=history)
+        self.metrics = MetricsStore(metrics_capacity)
+        self._processes: Dict[int, psutil.Process] = {}
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+    
+    def start(self):
+        """Start sampling on a background thread."""
+        with self._start_lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='system-sampler', daemon=True)
+                self._thread.start()
+    
+    def stop(self):
+        """Stop the background thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self):
+        # CPU percentages are deltas, so the first reading only primes them
+        self.sample(publish=False)
+        delay = min(FIRST_SAMPLE_DELAY, self.interval)
+        while not self._stop.wait(delay):
+            self.sample()
+            delay = self.interval
+    
+    def sample(self, publish: bool = True) -> Dict:
+        """
+        Take one sample now.
+        
+        Args:
+            publish: Add the sample to the ring buffer
+            
+        Returns:
+            Sample dictionary; processes holds one
+            (pid, name, user, cpu_percent, memory_percent, status) tuple per process
+        """
+        memory = psutil.virtual_memory()
+        try:
+            disk = psutil.disk_usage('/')
+        except OSError:
+            disk = None
+        try:
+            load = os.getloadavg()
+        except (AttributeError, OSError):
+            load = None
+        
+        processes: List[Tuple] = []
+        known = {}
+        for proc in psutil.process_iter():
+            # Reuse the object from the last sample, unless the pid now
+            # belongs to another process
+            cached = self._processes.get(proc.pid)
+            if cached is not None and cached == proc:
+                proc = cached
+            try:
+                info = proc.as_dict(PROCESS_FIELDS)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+            known[proc.pid] = proc
+            if 'uids' in info:
+                user = user_name(info['uids'].real) if info['uids'] else ''
+            else:
+                user = info['username'] or ''
+            processes.append((
+                info['pid'],
+                info['name'] or '',
+                user,
+                info['cpu_percent'] or 0.0,
+                info['memory_percent'] or 0.0,
+                info['status'] or '',
+            ))
+        self._processes = known
+        
+        sample = {
+            'time': time.time(),
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'cpu_count': psutil.cpu_count(),
+            'memory_percent': memory.percent,
+            'memory_used': memory.used,
+            'memory_total': memory.total,
+            'disk_percent': disk.percent if disk else None,
+            'disk_used': disk.used if disk else None,
+            'disk_total': disk.total if disk else None,
+            'load': load,
+            'processes': processes,
+        }
+        if publish:
+            self.samples.append(sample)
+            self._ready.set()
+            self.metrics.append(sample_point(sample))
+        return sample
+    
+    def latest(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """
+        Get the most recent sample, starting the sampler if needed.
+        
+        Args:
+            timeout: Seconds to wait for the first sample; defaults to
+                the first sample's delay plus one interval
+            
+        Returns:
+            Sample dictionary, or None if none arrived in time
+        """
+        self.start()
+        if not self._ready.wait(FIRST_SAMPLE_DELAY + self.interval if timeout is None else timeout):
+            return None
+        return self.samples[-1]
+    
+    def history(self) -> List[Dict]:
+        """Get the samples in the ring buffer, oldest first."""
+        return list(self.samples)
+
+
+_sampler: Optional[SystemSampler] = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler() -> SystemSampler:
+    """Get the sampler shared by every terminal, started on first use."""
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = SystemSampler(
+                float(os.environ.get('SYSTEM_SAMPLE_INTERVAL', DEFAULT_SAMPLE_INTERVAL)),
+                metrics_capacity=int(os.environ.get('METRICS_HISTORY', METRICS_CAPACITY))
+            )
+            _sampler.start()
+        return _sampler
+
+
+class PartitionCache:
+    """
+    Mounted partitions, listed again only when the mount table changes.
+    
+    On Linux the kernel flags /proc/self/mountinfo for poll() whenever
+    something is mounted or unmounted, so checking for changes costs one
+    poll with no timeout. Elsewhere the partitions are listed every time.
+    """
+    
+    def __init__(self, mountinfo: str = MOUNTINFO_PATH):
+        """
+        Args:
+            mountinfo: Mount table to watch
+        """
+        self._partitions: Optional[List] = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._poller = None
+        try:
+            self._file = open(mountinfo, 'rb')
+            self._poller = select.poll()
+            self._poller.register(self._file, select.POLLPRI | select.POLLERR)
+        except (OSError, AttributeError):
+            if self._file is not None:
+                self._file.close()
+            self._file = self._poller = None
+    
+    @property
+    def watching(self) -> bool:
+        """True if mount table changes are detected, so the list is cached."""
+        return self._poller is not None
+    
+    def invalidate(self):
+        """Forget the cached partitions."""
+        with self._lock:
+            self._partitions = None
+    
+    def partitions(self) -> List:
+        """Get mounted partitions, as from psutil.disk_partitions."""
+        with self._lock:
+            # Every poll after a change reports it once, so this also re-arms the check
+            changed = not self.watching or bool(self._poller.poll(0))
+            if changed or self._partitions is None:
+                self._partitions = psutil.disk_partitions()
+            return self._partitions
+
+
+_partition_cache: Optional[PartitionCache] = None
+_df_pool: Optional[ThreadPoolExecutor] = None
+# statvfs calls that have not returned yet, by mount point
+_df_pending: Dict[str, Future] = {}
+_df_lock = threading.Lock()
+
+
+def _get_df_state() -> Tuple[PartitionCache, ThreadPoolExecutor]:
+    """Get the partition cache and statvfs pool shared by every terminal, created on first use."""
+    global _partition_cache, _df_pool
+    with _df_lock:
+        if _partition_cache is None:
+            _partition_cache = PartitionCache()
+            _df_pool = ThreadPoolExecutor(max_workers=DF_WORKERS, thread_name_prefix='terminal-df')
+        return _partition_cache, _df_pool
+
+
+def disk_usages(mountpoints: List[str], timeout: float) -> Dict[str, object]:
+    """
+    Get usage of several mount points at once, giving up on slow ones.
+    
+    A mount point whose previous call is still stuck, as on a hung network
+    mount, is not asked again, so stuck calls never use up the pool.
+    
+    Args:
+        mountpoints: Mount points to check
+        timeout: Seconds to wait for all of them
+        
+    Returns:
+        Usage from psutil.disk_usage, an OSError, or None if it didn't
+        answer in time, for each mount point
+    """
+    _, pool = _get_df_state()
+    futures = {}
+    with _df_lock:
+        for mountpoint in mountpoints:
+            pending = _df_pending.get(mountpoint)
+            if pending is not None and not pending.done():
+                continue
+            future = _df_pending[mountpoint] = pool.submit(psutil.disk_usage, mountpoint)
+            futures[mountpoint] = future
+    if futures:
+        wait(list(futures.values()), timeout=timeout)
+    
+    results = {}
+    for mountpoint in mountpoints:
+        future = futures.get(mountpoint)
+        if future is None or not future.done():
+            results[mountpoint] = None
+            continue
+        with _df_lock:
+            if _df_pending.get(mountpoint) is future:
+                del _df_pending[mountpoint]
+        error = future.exception()
+        results[mountpoint] = error if error is not None else future.result()
+    return results
 
 
 class SystemMonitor:
     """System monitoring and process management."""
     
-    def get_processes(self) -> str:
-        """Get list of running processes."""
+    def __init__(self, sampler: Optional[SystemSampler] = None):
+        """
+        Args:
+            sampler: Sampler to read from; defaults to the shared one
+        """
+        self._sampler = sampler
+    
+    @property
+    def sampler(self) -> SystemSampler:
+        """Sampler this monitor reads from."""
+        if self._sampler is None:
+            self._sampler = get_sampler()
+        return self._sampler
+    
+    def _latest(self) -> Dict:
+        """Latest sample, or a fresh one if the sampler has none yet."""
+        return self.sampler.latest() or self.sampler.sample(publish=False)
+    
+    def get_processes(self, sort: str = 'cpu', reverse: Optional[bool] = None,
+                      limit: int = DEFAULT_PROCESS_LIMIT,
+                      users: Optional[Iterable[str]] = None,
+                      names: Optional[Iterable[str]] = None) -> str:
+        """
+        Get list of running processes.
+        
+        Only the processes shown are formatted; the top ones are picked
+        from the latest sample with a heap, without sorting the rest.
+        
+        Args:
+            sort: Key in PROCESS_SORT_KEYS
+            reverse: Largest first; defaults to the key's natural order
+            limit: Most processes listed
+            users: Only processes owned by one of these users
+            names: Only processes whose name contains one of these, ignoring case
+            
+        Returns:
+            Process table
+        """
         try:
+            position, largest_first = PROCESS_SORT_KEYS[sort]
+            if reverse is not None:
+                largest_first = reverse
+            
+            rows = self._latest()['processes']
+            if users:
+                wanted_users = set(users)
+                rows = (row for row in rows if row[2] in wanted_users)
+            if names:
+                wanted_names = [name.lower() for name in names]
+                rows = (row for row in rows
+                        if any(name in row[1].lower() for name in wanted_names))
+            # Ties go to the lowest pid, so the order is stable between samples
+            if largest_first:
+                rows = heapq.nlargest(limit, rows, key=lambda row: (row[position], -row[0]))
+            else:
+                rows = heapq.nsmallest(limit, rows, key=lambda row: (row[position], row[0]))
+            
             processes = []
-            processes.append(f"{'PID':<8} {'NAME':<20} {'CPU%':<8} {'MEM%':<8} {'STATUS'}")
-            processes.append("-" * 60)
+            processes.append(f"{'PID':<8} {'USER':<12} {'NAME':<20} {'CPU%':<8} {'MEM%':<8} {'STATUS'}")
+            processes.append("-" * 72)
             
-            for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent', 'status']):
-                try:
-                    info = proc.info
-                    cpu_pct = info['cpu_percent'] if info['cpu_percent'] is not None else 0.0
-                    mem_pct = info['memory_percent'] if info['memory_percent'] is not None else 0.0
-                    processes.append(
-                        f"{info['pid']:<8} {info['name'][:19]:<20} "
-                        f"{cpu_pct:<8.1f} {mem_pct:<8.1f} "
-                        f"{info['status']}"
-                    )
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
+            for pid, name, user, cpu_pct, mem_pct, status in rows:
+                processes.append(
+                    f"{pid:<8} {user[:11]:<12} {name[:19]:<20} "
+                    f"{cpu_pct:<8.1f} {mem_pct:<8.1f} "
+                    f"{status}"
+                )
             
-            return '\n'.join(processes[:20])  # Limit to first 20 processes
+            return '\n'.join(processes)
         except Exception as e:
             return f"Error getting processes: {str(e)}"
     
     def get_system_info(self) -> str:
         """Get system resource information."""
         try:
-            # CPU information
-            cpu_percent = psutil.cpu_percent(interval=1)
-            cpu_count = psutil.cpu_count()
-            
-            # Memory information
-            memory = psutil.virtual_memory()
-            
-            # Disk information
-            disk = psutil.disk_usage('/')
+            sample = self._latest()
             
-            # Load average (Unix-like systems)
-            try:
-                load_avg = os.getloadavg()
+            load_avg = sample['load']
+            if load_avg is not None:
                 load_str = f"Load average: {load_avg[0]:.2f}, {load_avg[1]:.2f}, {load_avg[2]:.2f}"
-            except (AttributeError, OSError):
+            else:
                 load_str = "Load average: N/A"
             
             output = []
             output.append("System Information:")
             output.append("-" * 40)
-            output.append(f"CPU Usage: {cpu_percent}% ({cpu_count} cores)")
-            output.append(f"Memory: {memory.percent}% used ({self._bytes_to_human(memory.used)}/{self._bytes_to_human(memory.total)})")
-            output.append(f"Disk: {disk.percent}% used ({self._bytes_to_human(disk.used)}/{self._bytes_to_human(disk.total)})")
+            output.append(f"CPU Usage: {sample['cpu_percent']}% ({sample['cpu_count']} cores)")
+            output.append(f"Memory: {sample['memory_percent']}% used ({self._bytes_to_human(sample['memory_used'])}/{self._bytes_to_human(sample['memory_total'])})")
+            if sample['disk_total'] is not None:
+                output.append(f"Disk: {sample['disk_percent']}% used ({self._bytes_to_human(sample['disk_used'])}/{self._bytes_to_human(sample['disk_total'])})")
             output.append(load_str)
             
             return '\n'.join(output)
         except Exception as e:
             return f"Error getting system info: {str(e)}"
     
-    def get_disk_usage(self) -> str:
-        """Get disk usage information."""
+    def get_disk_usage(self, timeout: Optional[float] = None) -> str:
+        """
+        Get disk usage information.
+        
+        Args:
+            timeout: Seconds to wait for slow mounts, which are shown as
+                unavailable; defaults to DF_TIMEOUT or 2 seconds
+        """
         try:
+            if timeout is None:
+                timeout = float(os.environ.get('DF_TIMEOUT', 2))
             output = []
             output.append(f"{'Filesystem':<20} {'Size':<10} {'Used':<10} {'Avail':<10} {'Use%':<6} {'Mounted on'}")
             output.append("-" * 80)
             
-            # Get all disk partitions
-            partitions = psutil.disk_partitions()
+            # Get all disk partitions, skipping special filesystems that might cause issues
+            partition_cache, _ = _get_df_state()
+            partitions = [partition for partition in partition_cache.partitions()
+                          if partition.fstype not in SKIPPED_FILESYSTEMS]
+            usages = disk_usages([partition.mountpoint for partition in partitions], timeout)
             
             for partition in partitions:
-                try:
-                    # Skip special filesystems that might cause issues
-                    if partition.fstype in ('devfs', 'autofs', 'proc', 'sysfs'):
-                        continue
-                        
-                    usage = psutil.disk_usage(partition.mountpoint)
-                    
-                    total = self._bytes_to_human(usage.total)
-                    used = self._bytes_to_human(usage.used)
-                    free = self._bytes_to_human(usage.free)
-                    percent = f"{usage.used / usage.total * 100:.1f}%" if usage.total > 0 else "0%"
-                    
+                usage = usages[partition.mountpoint]
+                if isinstance(usage, OSError):
+                    continue
+                if usage is None:
                     output.append(
-                        f"{partition.device[:19]:<20} {total:<10} {used:<10} "
-                        f"{free:<10} {percent:<6} {partition.mountpoint}"
+                        f"{partition.device[:19]:<20} {'-':<10} {'-':<10} "
+                        f"{'-':<10} {'-':<6} {partition.mountpoint} (unavailable)"
                     )
-                except (PermissionError, OSError):
                     continue
+                
+                total = self._bytes_to_human(usage.total)
+                used = self._bytes_to_human(usage.used)
+                free = self._bytes_to_human(usage.free)
+                percent = f"{usage.used / usage.total * 100:.1f}%" if usage.total > 0 else "0%"
+                
+                output.append(
+                    f"{partition.device[:19]:<20} {total:<10} {used:<10} "
+                    f"{free:<10} {percent:<6} {partition.mountpoint}"
+                )
             
             return '\n'.join(output)
         except Exception as e:
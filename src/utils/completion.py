@@ -4,6 +4,7 @@ Auto-completion logic for the terminal.
 import os
 from typing import List
 from prompt_toolkit.completion import Completer, Completion, WordCompleter
+from .dir_cache import DirectoryCache
 
 
 class AutoCompleter:
@@ -12,18 +13,20 @@ class AutoCompleter:
     def __init__(self, terminal):
         self.terminal = terminal
         self.command_names = list(terminal.command_registry.commands.keys())
+        self.dir_cache = DirectoryCache()
     
     def get_completer(self) -> Completer:
         """Get the appropriate completer based on context."""
-        return CustomCompleter(self.terminal, self.command_names)
+        return CustomCompleter(self.terminal, self.command_names, self.dir_cache)
 
 
 class CustomCompleter(Completer):
     """Custom completer that handles commands and file paths."""
     
-    def __init__(self, terminal, command_names: List[str]):
+    def __init__(self, terminal, command_names: List[str], dir_cache: DirectoryCache = None):
         self.terminal = terminal
         self.command_names = command_names
+        self.dir_cache = dir_cache or DirectoryCache()
     
     def get_completions(self, document, complete_event):
         """Generate completions for the current input."""
@@ -33,12 +36,11 @@ class CustomCompleter(Completer):
         if not words or (len(words) == 1 and not text.endswith(' ')):
             # Complete command names
             current_word = words[0] if words else ''
-            for command in self.command_names:
-                if command.startswith(current_word):
-                    yield Completion(
-                        command,
-                        start_position=-len(current_word)
-                    )
+            for command in self.terminal.completion_index.complete(current_word, 10):
+                yield Completion(
+                    command,
+                    start_position=-len(current_word)
+                )
         else:
             # Complete file/directory names
             if text.endswith(' '):
@@ -64,19 +66,9 @@ class CustomCompleter(Completer):
                 file_prefix = current_word
             
             # Find matching files/directories
-            try:
-                if os.path.exists(search_dir) and os.path.isdir(search_dir):
-                    for item in os.listdir(search_dir):
-                        if item.startswith(file_prefix):
-                            full_path = os.path.join(search_dir, item)
-                            if os.path.isdir(full_path):
-                                completion_text = item + '/'
-                            else:
-                                completion_text = item
-                            
-                            yield Completion(
-                                completion_text,
-                                start_position=start_pos
-                            )
-            except (PermissionError, OSError):
-                pass
\ No newline at end of file
+            for item, is_dir in self.dir_cache.complete(search_dir, file_prefix):
+                completion_text = item + '/' if is_dir else item
+                yield Completion(
+                    completion_text,
+                    start_position=start_pos
+                )
\ No newline at end of file
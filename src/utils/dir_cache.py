@@ -0,0 +1,91 @@
+"""
+Cached directory listings for path completion.
+"""
+import os
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+
+class DirectoryCache:
+    """
+    Bounded LRU cache of sorted directory listings.
+
+    A listing is reused until the directory's mtime changes, so a lookup
+    costs one stat instead of a listdir plus a stat per entry.
+    """
+
+    def __init__(self, max_dirs: int = 128):
+        """
+        Args:
+            max_dirs: Maximum number of directories to keep listings for
+        """
+        self.max_dirs = max_dirs
+        # path -> ((st_ino, st_mtime_ns), sorted names, is_dir flags)
+        self._entries: "OrderedDict[str, Tuple[tuple, List[str], List[bool]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def listing(self, path: str) -> Optional[Tuple[List[str], List[bool]]]:
+        """
+        Get the sorted entries of a directory.
+
+        Args:
+            path: Directory to list
+
+        Returns:
+            Tuple of (sorted names, is_dir flags), or None if path is not a readable directory
+        """
+        try:
+            stat_info = os.stat(path)
+        except OSError:
+            return None
+        version = (stat_info.st_ino, stat_info.st_mtime_ns)
+
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == version:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return cached[1], cached[2]
+
+        try:
+            # DirEntry.is_dir uses the type from the directory read, with no extra stat
+            with os.scandir(path) as entries:
+                items = sorted((entry.name, entry.is_dir()) for entry in entries)
+        except OSError:
+            return None
+        names = [name for name, _ in items]
+        is_dirs = [is_dir for _, is_dir in items]
+
+        with self._lock:
+            self.misses += 1
+            self._entries[path] = (version, names, is_dirs)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_dirs:
+                self._entries.popitem(last=False)
+        return names, is_dirs
+
+    def complete(self, path: str, prefix: str) -> List[Tuple[str, bool]]:
+        """
+        Get the entries of a directory whose names start with prefix.
+
+        Args:
+            path: Directory to search
+            prefix: Start of the name typed so far
+
+        Returns:
+            List of (name, is_dir) in name order
+        """
+        listing = self.listing(path)
+        if listing is None:
+            return []
+        names, is_dirs = listing
+        matches = []
+        index = bisect_left(names, prefix)
+        while index < len(names) and names[index].startswith(prefix):
+            matches.append((names[index], is_dirs[index]))
+            index += 1
+        return matches
@@ -6,12 +6,33 @@ import sys
 import os
 import tempfile
 import shutil
+import time
+import threading
+import asyncio
+import sqlite3
 
 # Add src directory to Python path
 sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), 'src'))
 
 from terminal.core import TerminalCore
 from terminal.ai_interpreter import AIInterpreter
+from terminal.sessions import SessionManager
+from terminal.scheduler import ExecutionScheduler
+from terminal.interpretation_cache import InterpretationCache, PRUNE_EVERY
+from terminal.pattern_matcher import PatternMatcher
+from terminal.model_calls import ModelCaller, TokenBucket
+from terminal.suggestion_stream import SuggestionStream
+from terminal.prefix_index import PrefixIndex
+from terminal.output_buffer import OutputLimiter
+from terminal.streams import CommandStream
+from terminal import grep_engine
+from terminal.file_index import FileIndex, longest_literal
+from terminal import copy_engine
+from terminal.system_monitor import SystemMonitor, SystemSampler, PartitionCache
+from terminal import system_monitor
+from terminal.metrics_store import MetricsStore, MetricsFeed, METRICS
+from terminal.history_store import CommandHistory, expire_logs, flush_all
+from utils.dir_cache import DirectoryCache
 
 
 def test_basic_commands():
@@ -157,6 +178,1033 @@ def test_system_monitoring():
     print("System monitoring test completed!\n")
 
 
+def test_session_manager():
+    """Test per-session terminal isolation and eviction."""
+    print("Testing session manager...")
+    sessions = SessionManager(max_sessions=2, max_history=3)
+    
+    # New sessions get a generated token; known tokens map back to the same terminal
+    session_a, terminal_a = sessions.get(None)
+    assert sessions.get(session_a)[1] is terminal_a
+    session_b, terminal_b = sessions.get(None)
+    assert terminal_a is not terminal_b
+    print("✓ sessions: Separate terminals per session")
+    
+    # Lookups never create sessions
+    assert sessions.lookup(session_b) is terminal_b
+    assert sessions.lookup(None) is None and sessions.lookup("unknown-session") is None
+    assert len(sessions) == 2 and sessions.created == 2
+    print("✓ sessions: Lookup without creating")
+    
+    # History is capped per session
+    for i in range(5):
+        terminal_a.execute_command(f"echo {i}")
+    assert list(terminal_a.command_history) == ["echo 2", "echo 3", "echo 4"]
+    assert len(terminal_b.command_history) == 0
+    print("✓ sessions: History capped and isolated")
+    
+    # The least recently used session is evicted when the pool is full,
+    # and evicted terminals are closed
+    closed = []
+    terminal_a.close = lambda: closed.append(terminal_a)
+    terminal_b.close = lambda: closed.append(terminal_b)
+    sessions.get(session_a)
+    sessions.get(None)
+    assert session_a in sessions and session_b not in sessions
+    assert closed == [terminal_b]
+    print("✓ sessions: LRU eviction")
+    
+    # Idle sessions are evicted
+    sessions.idle_timeout = -1
+    assert sessions.evict_idle() == 2 and len(sessions) == 0
+    assert closed[1] is terminal_a
+    print("✓ sessions: Idle eviction")
+    
+    print("Session manager test passed!\n")
+
+
+def test_session_paths():
+    """Test that terminals resolve paths without changing the process directory."""
+    print("Testing session-relative paths...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        process_cwd = os.getcwd()
+        terminal_a = TerminalCore(initial_directory=temp_dir)
+        terminal_b = TerminalCore(initial_directory=temp_dir)
+        
+        terminal_a.execute_command("mkdir a")
+        terminal_b.execute_command("mkdir b")
+        terminal_a.execute_command("cd a")
+        terminal_b.execute_command("cd b")
+        terminal_a.execute_command("touch only_a.txt")
+        
+        assert os.getcwd() == process_cwd
+        assert terminal_a.current_directory == os.path.join(temp_dir, "a")
+        assert os.path.exists(os.path.join(temp_dir, "a", "only_a.txt"))
+        output, code = terminal_b.execute_command("ls")
+        assert code == 0 and "only_a.txt" not in output
+        print("✓ paths: Terminals keep independent working directories")
+        
+        output, code = terminal_a.execute_command("cd ../b")
+        assert code == 0 and terminal_a.current_directory == os.path.join(temp_dir, "b")
+        output, code = terminal_a.execute_command("cd missing")
+        assert code == 1
+        print("✓ paths: Relative cd resolved against the session directory")
+    
+    print("Session-relative paths test passed!\n")
+
+
+def test_execution_scheduler():
+    """Test per-session ordering and off-loop execution."""
+    print("Testing execution scheduler...")
+    scheduler = ExecutionScheduler(max_workers=4)
+    order = []
+    
+    def work(name, delay):
+        time.sleep(delay)
+        order.append(name)
+        return name
+    
+    async def run():
+        # Same session runs in submission order even if the first call is slower
+        slow = asyncio.create_task(scheduler.run("a", work, "a1", 0.2))
+        await asyncio.sleep(0)
+        fast = asyncio.create_task(scheduler.run("a", work, "a2", 0))
+        # Another session is not held up by session "a"
+        other = await scheduler.run("b", work, "b1", 0)
+        return other, await slow, await fast
+    
+    results = asyncio.run(run())
+    assert results == ("b1", "a1", "a2")
+    assert order == ["b1", "a1", "a2"]
+    print("✓ scheduler: Per-session ordering and cross-session concurrency")
+    
+    stats = scheduler.stats()
+    assert stats['completed'] == 3 and stats['queue_depth'] == 0
+    print(f"✓ scheduler: Stats {stats}")
+    scheduler.shutdown()
+    
+    print("Execution scheduler test passed!\n")
+
+
+class FakeModel:
+    """Local stand-in for the Gemini model."""
+    
+    def __init__(self, text="pwd", delay=0.0):
+        self.text = text
+        self.delay = delay
+        self.calls = 0
+    
+    def generate_content(self, prompt):
+        self.calls += 1
+        time.sleep(self.delay)
+        return type("FakeResponse", (), {"text": self.text})()
+
+
+def test_async_interpretation():
+    """Test the async interpretation pipeline."""
+    print("Testing async interpretation...")
+    ai = AIInterpreter()
+    ai.model = FakeModel(text="ls -a", delay=0.2)
+    
+    async def run():
+        inputs = [f"show me hidden files {i}" for i in range(5)]
+        return await asyncio.gather(*(ai.process_input_async(text) for text in inputs))
+    
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    assert all(result['command'] == "ls -a" and result['is_natural_language'] for result in results)
+    assert elapsed < 0.2 * 5
+    print(f"✓ async: 5 interpretations in flight together ({elapsed:.2f}s)")
+    
+    result = asyncio.run(ai.process_input_async("pwd"))
+    assert result['command'] == "pwd" and not result['is_natural_language']
+    print("✓ async: Commands pass through uninterpreted")
+    
+    # Any registered command is accepted from the model, locate included
+    ai.model = FakeModel(text="locate notes.txt")
+    assert asyncio.run(ai.interpret_async("where is my notes file")) == "locate notes.txt"
+    print("✓ async: Model answers checked against the command registry")
+    
+    print("Async interpretation test passed!\n")
+
+
+def test_interpretation_cache():
+    """Test caching of model interpretations."""
+    print("Testing interpretation cache...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache_path = os.path.join(temp_dir, "cache.sqlite3")
+        ai = AIInterpreter(cache=InterpretationCache(max_size=2, path=cache_path, version="v1"))
+        ai.model = FakeModel(text="ls")
+        
+        assert asyncio.run(ai.interpret_async("show me the files")) == "ls"
+        assert asyncio.run(ai.interpret_async("  show me   the files ")) == "ls"
+        assert ai.model.calls == 1
+        print("✓ cache: Repeat phrases skip the model")
+        
+        # Case can name a file, so phrases differing in case don't share an entry
+        cache = InterpretationCache()
+        cache.put("create a folder named Reports", "mkdir Reports")
+        assert cache.get("create a folder named reports") is None
+        assert cache.get("create  a folder named Reports") == "mkdir Reports"
+        print("✓ cache: Case kept in keys")
+        
+        # A fresh cache with the same version reads the persisted entry
+        restarted = InterpretationCache(path=cache_path, version="v1")
+        assert restarted.get("show me the files") == "ls"
+        assert restarted.stats()['disk_hits'] == 1
+        assert InterpretationCache(path=cache_path, version="v2").get("show me the files") is None
+        print("✓ cache: Entries survive restarts for the same version")
+        
+        # Expired rows are deleted from the file when it is opened, and
+        # every PRUNE_EVERY writes after that
+        InterpretationCache(path=cache_path, version="v1", ttl=-1)
+        cache = InterpretationCache(path=cache_path, version="v1", ttl=3600)
+        cache.put("old phrase", "ls")
+        cache.ttl = -1
+        for i in range(PRUNE_EVERY - 1):
+            cache.put(f"phrase {i}", "ls")
+        with sqlite3.connect(cache_path) as db:
+            assert db.execute("SELECT COUNT(*) FROM interpretations").fetchone()[0] == 0
+        print("✓ cache: Expired rows pruned")
+        
+        # LRU eviction and TTL expiry
+        cache = InterpretationCache(max_size=2)
+        cache.put("a", "ls")
+        cache.put("b", "pwd")
+        cache.get("a")
+        cache.put("c", "df")
+        assert cache.get("b") is None and cache.get("a") == "ls"
+        cache.ttl = -1
+        assert cache.get("a") is None
+        print("✓ cache: LRU eviction and TTL expiry")
+    
+    print("Interpretation cache test passed!\n")
+
+
+def test_pattern_matcher():
+    """Test the combined fallback pattern matcher."""
+    print("Testing pattern matcher...")
+    
+    # Table order decides priority, across leading-word groups too
+    matcher = PatternMatcher({
+        r'show (?:me )?(?:the )?files': 'ls',
+        r'(?:please )?show (.+)': 'cat {0}',
+        r'show (.+)': 'never',
+        r'copy (.+) to (.+)': 'cp {0} {1}',
+    })
+    assert matcher.match("show me the files") == ('ls', ())
+    assert matcher.match("show notes.txt") == ('cat {0}', ('notes.txt',))
+    assert matcher.match("copy a to b") == ('cp {0} {1}', ('a', 'b'))
+    assert matcher.match("hello") is None
+    print("✓ matcher: First match in table order with its own groups")
+    
+    # Large tables still resolve to the right entry
+    table = {f'command{i} (.+)': f'run{i} {{0}}' for i in range(2000)}
+    big = PatternMatcher(table)
+    assert big.match("command1999 now") == ('run1999 {0}', ('now',))
+    print("✓ matcher: 2000-pattern table")
+    
+    ai = AIInterpreter()
+    assert ai._interpret_with_patterns("copy the file a.txt to b.txt") == "cp a.txt b.txt"
+    assert ai._interpret_with_patterns("where am i") == "pwd"
+    print("✓ matcher: Fallback interpretation")
+    
+    print("Pattern matcher test passed!\n")
+
+
+def test_input_classifier():
+    """Test command vs natural language classification."""
+    print("Testing input classifier...")
+    ai = AIInterpreter()
+    
+    for command in ["ls -la", "rmdir old", "git status", "exit", ""]:
+        assert not ai.is_natural_language(command), command
+    for phrase in ["show me the files", "help me find notes", "hello", "where am i"]:
+        assert ai.is_natural_language(phrase), phrase
+    print("✓ classifier: Commands and phrases told apart")
+    
+    # The vocabulary comes from the registry it is given
+    custom = AIInterpreter(command_names=["deploy"])
+    assert not custom.is_natural_language("deploy now")
+    assert custom.is_natural_language("rmdir old")
+    print("✓ classifier: Vocabulary taken from the command registry")
+    
+    print("Input classifier test passed!\n")
+
+
+def test_request_coalescing():
+    """Test that identical concurrent model calls share one request."""
+    print("Testing request coalescing...")
+    ai = AIInterpreter()
+    ai.model = FakeModel(text="ls", delay=0.1)
+    
+    async def run():
+        same = [ai.interpret_async("show me the files") for _ in range(10)]
+        suggestions = [ai.get_suggestions_async("show me") for _ in range(5)]
+        return await asyncio.gather(*same), await asyncio.gather(*suggestions)
+    
+    commands, suggestions = asyncio.run(run())
+    assert commands == ["ls"] * 10 and suggestions == [["ls"]] * 5
+    assert ai.model.calls == 2
+    stats = ai.single_flight.stats()
+    assert stats['coalesced'] == 13 and stats['in_flight'] == 0
+    print(f"✓ coalescing: 15 requests, {ai.model.calls} model calls")
+    
+    print("Request coalescing test passed!\n")
+
+
+def test_model_call_limits():
+    """Test timeouts, the circuit breaker and rate limiting for model calls."""
+    print("Testing model call limits...")
+    ai = AIInterpreter()
+    ai.model = FakeModel(text="ls", delay=0.5)
+    ai.model_caller = ModelCaller(max_workers=2, timeout=0.05, failure_threshold=2,
+                                  reset_timeout=60)
+    
+    # Timed out calls fall back to the patterns
+    assert asyncio.run(ai.interpret_async("where am i")) == "pwd"
+    assert asyncio.run(ai.interpret_async("show me the files")) == "ls"
+    assert ai.model_caller.stats()['timed_out'] == 2
+    print("✓ limits: Timeouts fall back to patterns")
+    
+    # Once the circuit is open the model is skipped entirely
+    start = time.perf_counter()
+    assert asyncio.run(ai.interpret_async("clear the screen")) == "clear"
+    assert time.perf_counter() - start < 0.05
+    assert ai.model.calls == 2 and ai.model_caller.stats()['circuit'] == 'open'
+    print("✓ limits: Open circuit skips the model")
+    
+    # The bucket allows a burst, then spaces calls out at the configured rate
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.reserve() == 0 and bucket.reserve() == 0
+    assert 0.05 < bucket.reserve() <= 0.1
+    print("✓ limits: Token bucket rate limiting")
+    
+    print("Model call limits test passed!\n")
+
+
+def test_suggestion_stream():
+    """Test debounced, cancellable suggestion streaming."""
+    print("Testing suggestion stream...")
+    ai = AIInterpreter()
+    ai.model = FakeModel(text="show me the files")
+    frames = []
+    
+    async def send(frame):
+        frames.append(frame)
+    
+    async def run():
+        stream = SuggestionStream(ai, send, debounce=0.05)
+        for partial in ["s", "sh", "sho", "show"]:
+            stream.update(partial)
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.2)
+        await stream.close()
+        return stream
+    
+    stream = asyncio.run(run())
+    basic = [frame for frame in frames if frame['source'] == 'basic']
+    model = [frame for frame in frames if frame['source'] == 'ai']
+    assert [frame['partial'] for frame in basic] == ["s", "sh", "sho", "show"]
+    assert len(model) == 1 and model[0]['partial'] == "show" and model[0]['done']
+    assert ai.model.calls == 1 and stream.superseded == 3
+    print("✓ suggestions: Local results first, one model call after typing pauses")
+    
+    print("Suggestion stream test passed!\n")
+
+
+def test_prefix_index():
+    """Test ranked prefix completion."""
+    print("Testing prefix index...")
+    index = PrefixIndex(["cat", "cd", "cp", "clear"], max_results=3)
+    assert index.complete("c", 5) == ["cat", "cd", "cp"]
+    
+    index.add("clear", 2)
+    index.add("cp")
+    assert index.complete("c") == ["clear", "cp", "cat"]
+    assert index.complete("cl") == ["clear"] and index.complete("x") == []
+    print("✓ index: Most frequent terms first")
+    
+    index.remove("clear", 3)
+    assert "clear" not in index and index.complete("c") == ["cp", "cat", "cd"]
+    print("✓ index: Removed terms leave the rankings")
+    
+    terminal = TerminalCore()
+    for _ in range(3):
+        terminal.execute_command("echo hi")
+    assert terminal.completion_index.complete("e", 2) == ["echo", "echo hi"]
+    assert terminal.completion_index.complete("p") == ["pwd", "ps"]
+    print("✓ index: Terminal completion ranks used commands and history")
+    
+    print("Prefix index test passed!\n")
+
+
+def test_directory_cache():
+    """Test cached directory listings for path completion."""
+    print("Testing directory cache...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for name in ["beta.txt", "alpha.txt", "alps"]:
+            open(os.path.join(temp_dir, name), "w").close()
+        os.mkdir(os.path.join(temp_dir, "alpine"))
+        
+        cache = DirectoryCache(max_dirs=1)
+        assert cache.complete(temp_dir, "al") == [
+            ("alpha.txt", False), ("alpine", True), ("alps", False)
+        ]
+        assert cache.complete(temp_dir, "b") == [("beta.txt", False)]
+        assert cache.hits == 1 and cache.misses == 1
+        print("✓ dir cache: Sorted prefix matches with directory flags")
+        
+        # A changed directory mtime invalidates the listing
+        open(os.path.join(temp_dir, "alpaca"), "w").close()
+        os.utime(temp_dir, ns=(0, os.stat(temp_dir).st_mtime_ns + 1))
+        assert ("alpaca", False) in cache.complete(temp_dir, "alp")
+        assert cache.misses == 2
+        assert cache.complete(os.path.join(temp_dir, "missing"), "") == []
+        print("✓ dir cache: Invalidated when the directory changes")
+    
+    print("Directory cache test passed!\n")
+
+
+def test_streaming_output():
+    """Test that cat, grep and find stream their output in chunks."""
+    print("Testing streaming output...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        terminal = TerminalCore(initial_directory=temp_dir)
+        with open(os.path.join(temp_dir, "big.log"), "w") as f:
+            for i in range(50000):
+                f.write(f"line {i} {'match' if i % 10 == 0 else ''}\n")
+        
+        stream = terminal.stream_command("cat big.log")
+        chunks = list(stream)
+        assert len(chunks) > 1 and stream.exit_code == 0
+        assert max(len(chunk) for chunk in chunks) <= 64 * 1024
+        print(f"✓ streaming: cat produced {len(chunks)} chunks")
+        
+        stream = terminal.stream_command("grep match big.log")
+        chunks = list(stream)
+        assert len(chunks) > 1 and ''.join(chunks).count("\n") == 4999
+        output, code = terminal.execute_command("grep match big.log")
+        assert code == 0 and output == ''.join(chunks)
+        print("✓ streaming: grep output matches the collected result")
+        
+        # Stopping a stream early stops the command
+        stream = terminal.stream_command("find .")
+        first = next(iter(stream))
+        stream.close()
+        assert "big.log" in first
+        
+        stream = terminal.stream_command("cat missing.txt")
+        assert stream.read() == "cat: missing.txt: No such file or directory"
+        assert stream.exit_code == 1
+        print("✓ streaming: Early close and errors")
+    
+    print("Streaming output test passed!\n")
+
+
+def test_scheduler_streaming():
+    """Test consuming a command stream on the scheduler's pool."""
+    print("Testing scheduler streaming...")
+    scheduler = ExecutionScheduler(max_workers=2)
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        terminal = TerminalCore(initial_directory=temp_dir)
+        with open(os.path.join(temp_dir, "data.txt"), "w") as f:
+            f.write("x" * (200 * 1024))
+        
+        async def run():
+            chunks = []
+            stream = terminal.stream_command("cat data.txt")
+            async for chunk in scheduler.iterate(stream):
+                chunks.append(chunk)
+            return chunks, stream.exit_code
+        
+        chunks, exit_code = asyncio.run(run())
+        assert len(chunks) == 4 and exit_code == 0
+        assert sum(len(chunk) for chunk in chunks) == 200 * 1024
+        print(f"✓ scheduler streaming: {len(chunks)} chunks pulled one at a time")
+    
+    scheduler.shutdown()
+    print("Scheduler streaming test passed!\n")
+
+
+def test_output_limits():
+    """Test output truncation, per-command caps and result paging."""
+    print("Testing output limits...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        terminal = TerminalCore(initial_directory=temp_dir, inline_output_limit=1000,
+                                max_output=100000, output_caps={'find': 2000})
+        with open(os.path.join(temp_dir, "big.txt"), "w", encoding="utf-8") as f:
+            f.write("é" * 30000)
+        
+        output, code = terminal.execute_command("cat big.txt")
+        result = terminal.last_result
+        assert code == 0 and result is not None
+        assert output.startswith("é" * 500) and "output truncated" in output
+        assert result['inline_size'] == 1000 and result['total_size'] == 60000
+        print("✓ output limits: Large output truncated inline")
+        
+        pages = []
+        offset = result['inline_size']
+        while offset < result['total_size']:
+            page = terminal.results.page(result['result_id'], offset, 777)
+            pages.append(page['data'])
+            offset = page['next_offset']
+        assert ''.join(pages) == "é" * 29500
+        assert terminal.results.page("missing", 0, 10) is None
+        print(f"✓ output limits: Rest of the output read in {len(pages)} pages")
+        
+        for i in range(300):
+            open(os.path.join(temp_dir, f"file_{i:03d}.txt"), "w").close()
+        output, code = terminal.execute_command("find .")
+        assert terminal.last_result['capped'] and terminal.last_result['total_size'] <= 2000
+        
+        output, code = terminal.execute_command("echo small")
+        assert output == "small" and terminal.last_result is None
+        print("✓ output limits: Per-command caps and small output")
+    
+    limiter = OutputLimiter(inline_limit=4, cap=8)
+    assert list(limiter.limit(["ab", "cd", "ef", "gh", "ij"])) == ["ab", "cd"]
+    assert limiter.capped and limiter.total_size == 8
+    assert limiter.buffer.read(0, 100) == b"abcdefgh"
+    print("✓ output limits: Limiter keeps the whole output up to the cap")
+    
+    print("Output limits test passed!\n")
+
+
+def test_grep_engine():
+    """Test regex, fixed-string and recursive grep over segmented files."""
+    print("Testing grep engine...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        terminal = TerminalCore(initial_directory=temp_dir)
+        os.makedirs(os.path.join(temp_dir, "logs", "old"))
+        with open(os.path.join(temp_dir, "logs", "app.log"), "w") as f:
+            for i in range(1, 3001):
+                f.write(f"{i} {'ERROR disk a.b' if i % 1000 == 0 else 'ok'}\n")
+        with open(os.path.join(temp_dir, "logs", "old", "app.1.log"), "w") as f:
+            f.write("error one\nfine\n")
+        with open(os.path.join(temp_dir, "logs", "data.bin"), "wb") as f:
+            f.write(b"\0\1ERROR\2")
+        
+        output, code = terminal.execute_command("grep ERROR logs/app.log")
+        assert code == 0 and output.split("\n") == [
+            "logs/app.log:1000:1000 ERROR disk a.b",
+            "logs/app.log:2000:2000 ERROR disk a.b",
+            "logs/app.log:3000:3000 ERROR disk a.b",
+        ]
+        output, _ = terminal.execute_command("grep '^2000 [A-Z]+' logs/app.log")
+        assert output == "logs/app.log:2000:2000 ERROR disk a.b"
+        output, _ = terminal.execute_command("grep -F a.b logs/app.log")
+        assert output.count("\n") == 2
+        # Matches never run into the next line
+        with open(os.path.join(temp_dir, "lines.txt"), "w") as f:
+            f.write("aaa\nb c\nxyz\n")
+        output, _ = terminal.execute_command("grep '[^a]' lines.txt")
+        assert output == "lines.txt:2:b c\nlines.txt:3:xyz"
+        output, _ = terminal.execute_command("grep '\\s' lines.txt")
+        assert output == "lines.txt:2:b c"
+        with open(os.path.join(temp_dir, "blank.txt"), "w") as f:
+            f.write("a\n\nb\n")
+        output, _ = terminal.execute_command("grep '^$' blank.txt")
+        assert output == "blank.txt:2:"
+        print("✓ grep engine: Regex and fixed strings with line numbers")
+        
+        output, code = terminal.execute_command("grep -ri error logs")
+        lines = output.split("\n")
+        assert code == 0 and len(lines) == 5
+        assert lines[3] == "Binary file logs/data.bin matches"
+        assert lines[-1] == "logs/old/app.1.log:1:error one"
+        output, code = terminal.execute_command("grep x logs missing.txt")
+        assert code == 1
+        assert output == "grep: logs: Is a directory\ngrep: missing.txt: No such file or directory"
+        output, code = terminal.execute_command("grep '(' logs/app.log")
+        assert code == 2 and output.startswith("grep: invalid pattern")
+        
+        # Files are read as results are consumed, not all up front
+        consumed = []
+        def files():
+            for i in range(1000):
+                consumed.append(i)
+                yield f"f{i}", os.path.join(temp_dir, "logs", "old", "app.1.log"), None
+        results = grep_engine.GrepEngine("error").search(files())
+        assert next(results) == "f0:1:error one" and len(consumed) <= 2
+        results.close()
+        print("✓ grep engine: Recursion, binary files and errors")
+        
+        # Small segments searched on the process pool give the same result,
+        # and segment boundaries don't add empty lines
+        with open(os.path.join(temp_dir, "gaps.txt"), "w") as f:
+            f.write("".join("\n" if i % 3 == 0 else f"line {i}\n" for i in range(1, 3001)))
+        segment_size, parallel_min = grep_engine.SEGMENT_SIZE, grep_engine.PARALLEL_MIN_BYTES
+        grep_engine.SEGMENT_SIZE, grep_engine.PARALLEL_MIN_BYTES = 1000, 0
+        try:
+            output, code = terminal.execute_command("grep -r ERROR logs")
+            blank_output, _ = terminal.execute_command("grep '^$' gaps.txt")
+        finally:
+            grep_engine.SEGMENT_SIZE, grep_engine.PARALLEL_MIN_BYTES = segment_size, parallel_min
+        assert code == 0 and output.split("\n")[:3] == [
+            "logs/app.log:1000:1000 ERROR disk a.b",
+            "logs/app.log:2000:2000 ERROR disk a.b",
+            "logs/app.log:3000:3000 ERROR disk a.b",
+        ]
+        assert blank_output.split("\n") == [f"gaps.txt:{i}:" for i in range(3, 3001, 3)]
+        print("✓ grep engine: Parallel segments keep order and line numbers")
+    
+    print("Grep engine test passed!\n")
+
+
+def test_find_engine():
+    """Test find predicates, limits and the parallel walk."""
+    print("Testing find engine...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        terminal = TerminalCore(initial_directory=temp_dir)
+        for i in range(20):
+            os.makedirs(os.path.join(temp_dir, "src", f"pkg{i}", "sub"))
+            with open(os.path.join(temp_dir, "src", f"pkg{i}", "sub", f"mod{i}.py"), "w") as f:
+                f.write("x" * (i * 100))
+        old = os.path.join(temp_dir, "src", "pkg0", "old.txt")
+        open(old, "w").close()
+        os.utime(old, (time.time() - 10 * 86400, time.time() - 10 * 86400))
+        
+        output, code = terminal.execute_command('find . -name "*.py"')
+        assert code == 0 and len(output.split("\n")) == 20
+        assert "./src/pkg3/sub/mod3.py" in output.split("\n")
+        output, _ = terminal.execute_command("find src mod1")
+        assert sorted(output.split("\n")) == ["src/pkg1/sub/mod1.py"] + [
+            f"src/pkg{i}/sub/mod{i}.py" for i in range(10, 20)]
+        print("✓ find engine: -name globs and the substring form")
+        
+        output, _ = terminal.execute_command("find src -type f -size +1500c")
+        assert sorted(output.split("\n")) == sorted(
+            f"src/pkg{i}/sub/mod{i}.py" for i in range(16, 20))
+        output, _ = terminal.execute_command("find . -mtime +5")
+        assert output == "./src/pkg0/old.txt"
+        output, _ = terminal.execute_command("find . -type d -maxdepth 2")
+        assert len(output.split("\n")) == 22
+        print("✓ find engine: -type, -size, -mtime and -maxdepth")
+        
+        output, code = terminal.execute_command("find . -type f -limit 5")
+        assert code == 0 and len(output.split("\n")) == 5
+        output, code = terminal.execute_command("find . -frobnicate")
+        assert code == 1 and output.startswith("find: ")
+        output, code = terminal.execute_command("find . missing")
+        assert code == 0 and output == ""
+        print("✓ find engine: Limits and errors")
+    
+    print("Find engine test passed!\n")
+
+
+def test_file_index():
+    """Test the path index behind locate and indexed find."""
+    print("Testing file index...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root = os.path.join(temp_dir, "tree")
+        for name in ["docs/guide.md", "docs/api/Readme.MD", "src/main.py", "src/util.py"]:
+            os.makedirs(os.path.dirname(os.path.join(root, name)), exist_ok=True)
+            open(os.path.join(root, name), "w").close()
+        index = FileIndex(os.path.join(temp_dir, "index.sqlite3"), [root], interval=3600)
+        index.refresh()
+        terminal = TerminalCore(initial_directory=root, file_index=index)
+        
+        assert longest_literal("*re[ad]*.md") == ".md"
+        output, code = terminal.execute_command("locate guide")
+        assert code == 0 and output == os.path.join(root, "docs", "guide.md")
+        output, _ = terminal.execute_command("locate -b -i '*.md'")
+        assert output.split("\n") == [os.path.join(root, "docs", "api", "Readme.MD"),
+                                      os.path.join(root, "docs", "guide.md")]
+        output, code = terminal.execute_command("locate nothing-here")
+        assert code == 1 and output == ""
+        print("✓ file index: locate by path, name and glob")
+        
+        output, _ = terminal.execute_command('find . -name "*.py"')
+        assert output.split("\n") == ["./src/main.py", "./src/util.py"]
+        output, _ = terminal.execute_command('find src -name "*ma*" -type f')
+        assert output == "src/main.py"
+        print("✓ file index: find -name answered from the index")
+        
+        # Changes made through the terminal are visible to the next search
+        terminal.execute_command("touch src/new.py")
+        terminal.execute_command("rm src/util.py")
+        output, _ = terminal.execute_command('find . -name "*.py"')
+        assert output.split("\n") == ["./src/main.py", "./src/new.py"]
+        
+        # Changes made elsewhere show up after a refresh
+        os.makedirs(os.path.join(root, "lib", "deep"))
+        open(os.path.join(root, "lib", "deep", "extra.py"), "w").close()
+        index.refresh()
+        output, _ = terminal.execute_command("locate extra.py")
+        assert output == os.path.join(root, "lib", "deep", "extra.py")
+        shutil.rmtree(os.path.join(root, "lib"))
+        index.refresh()
+        assert index.stats()["paths"] == 8
+        print("✓ file index: Incremental updates")
+    
+    print("File index test passed!\n")
+
+
+def test_ls_listing():
+    """Test streamed ls output and the long format."""
+    print("Testing ls listing...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        terminal = TerminalCore(initial_directory=temp_dir)
+        for i in range(600):
+            open(os.path.join(temp_dir, f"f{i:04d}.txt"), "w").close()
+        with open(os.path.join(temp_dir, ".hidden"), "w") as f:
+            f.write("12345")
+        os.mkdir(os.path.join(temp_dir, "dir"))
+        os.symlink("dir", os.path.join(temp_dir, "link"))
+        
+        stream = terminal.stream_command("ls")
+        chunks = list(stream)
+        assert len(chunks) == 3 and stream.exit_code == 0
+        names = "".join(chunks).split("  ")
+        assert names[0] == "dir" and names[-1] == "link" and len(names) == 602
+        print(f"✓ ls: {len(names)} names in {len(chunks)} chunks")
+        
+        output, code = terminal.execute_command("ls -la")
+        lines = output.split("\n")
+        assert code == 0 and len(lines) == 603
+        assert lines[0].startswith("-rw") and lines[0].endswith(" 5 " + time.strftime(
+            "%b %d %H:%M", time.localtime(os.stat(os.path.join(temp_dir, ".hidden")).st_mtime // 60 * 60)
+        ) + " .hidden")
+        assert lines[1].startswith("drwx") and lines[-1].startswith("l")
+        assert lines[-1].endswith("link -> dir")
+        print("✓ ls: Long format with owners, dates and symlinks")
+        
+        output, code = terminal.execute_command("ls -l f0001.txt")
+        assert code == 0 and output.endswith(" f0001.txt") and output.startswith("-")
+        output, code = terminal.execute_command("ls missing")
+        assert code == 1 and "No such file or directory" in output
+        print("✓ ls: Single files and errors")
+    
+    print("ls listing test passed!\n")
+
+
+def test_copy_engine():
+    """Test tree copies, progress, cancellation and moves."""
+    print("Testing copy engine...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        terminal = TerminalCore(initial_directory=temp_dir)
+        for i in range(30):
+            os.makedirs(os.path.join(temp_dir, "src", f"d{i % 3}"), exist_ok=True)
+            with open(os.path.join(temp_dir, "src", f"d{i % 3}", f"f{i}.bin"), "wb") as f:
+                f.write(os.urandom(i * 1000))
+        os.symlink("d0", os.path.join(temp_dir, "src", "link"))
+        os.mkdir(os.path.join(temp_dir, "backup"))
+        
+        output, code = terminal.execute_command("cp -r src backup")
+        assert code == 0 and output == ""
+        for i in range(30):
+            name = os.path.join(f"d{i % 3}", f"f{i}.bin")
+            with open(os.path.join(temp_dir, "src", name), "rb") as a, \
+                    open(os.path.join(temp_dir, "backup", "src", name), "rb") as b:
+                assert a.read() == b.read()
+        assert os.readlink(os.path.join(temp_dir, "backup", "src", "link")) == "d0"
+        output, code = terminal.execute_command("cp src src/d0")
+        assert code == 1 and "into itself" in output
+        print("✓ copy engine: Trees copied with contents and symlinks")
+        
+        # Plain reads give the same result when zero-copy calls are unavailable
+        methods, interval = copy_engine.ZERO_COPY_METHODS, copy_engine.PROGRESS_INTERVAL
+        copy_engine.ZERO_COPY_METHODS, copy_engine.PROGRESS_INTERVAL = ['read'], 0
+        try:
+            stream = terminal.stream_command("cp src/d2/f29.bin copy.bin")
+            chunks = list(stream)
+        finally:
+            copy_engine.ZERO_COPY_METHODS, copy_engine.PROGRESS_INTERVAL = methods, interval
+        assert stream.exit_code == 0 and os.path.getsize(os.path.join(temp_dir, "copy.bin")) == 29000
+        assert chunks[0].startswith("cp: ") and "files" in "".join(chunks)
+        print("✓ copy engine: Progress lines and read/write fallback")
+        
+        copy_engine.PROGRESS_INTERVAL = 0
+        try:
+            stream = terminal.stream_command("cp -r src cancelled")
+            next(iter(stream))
+            stream.close()
+        finally:
+            copy_engine.PROGRESS_INTERVAL = interval
+        copied = sum(len(files) for _, _, files in os.walk(os.path.join(temp_dir, "cancelled")))
+        assert copied < 30
+        print(f"✓ copy engine: Cancelled after {copied} files")
+        
+        output, code = terminal.execute_command("mv copy.bin backup")
+        assert code == 0 and os.path.exists(os.path.join(temp_dir, "backup", "copy.bin"))
+        assert not os.path.exists(os.path.join(temp_dir, "copy.bin"))
+        job = copy_engine.CopyJob([(os.path.join(temp_dir, "src"), os.path.join(temp_dir, "moved"))],
+                                  'mv', move=True)
+        assert CommandStream(job.run()).read() == "" and job.files_done == 30
+        assert not os.path.exists(os.path.join(temp_dir, "src"))
+        print("✓ copy engine: Renames and copy-then-remove moves")
+    
+    print("Copy engine test passed!\n")
+
+
+def test_system_sampler():
+    """Test background sampling and per-process CPU deltas."""
+    print("Testing system sampler...")
+    
+    sampler = SystemSampler(interval=0.2)
+    monitor = SystemMonitor(sampler)
+    try:
+        first = sampler.latest(timeout=5)
+        assert first is not None and first['memory_total'] > 0
+        # Burn CPU in this process until a sample has seen it
+        deadline = time.time() + 5
+        own = 0.0
+        while time.time() < deadline and own == 0.0:
+            sum(i * i for i in range(200000))
+            for pid, name, user, cpu, mem, status in sampler.samples[-1]['processes']:
+                if pid == os.getpid():
+                    own = cpu
+        assert own > 0, "own process CPU never sampled above 0"
+        print(f"✓ system sampler: Own process at {own:.1f}% CPU")
+        
+        started = time.perf_counter()
+        for _ in range(100):
+            output = monitor.get_system_info()
+        elapsed = time.perf_counter() - started
+        assert "CPU Usage" in output and elapsed < 1
+        assert "PID" in monitor.get_processes()
+        time.sleep(sampler.interval * 2)
+        assert len(sampler.history()) >= 2
+        print(f"✓ system sampler: 100 top reads in {elapsed * 1000:.1f}ms")
+    finally:
+        sampler.stop()
+    
+    print("System sampler test passed!\n")
+
+
+def test_metrics_store():
+    """Test metric ring buffers, downsampling and fan-out to subscribers."""
+    print("Testing metrics store...")
+    
+    store = MetricsStore(capacity=100)
+    for i in range(250):
+        point = {name: float(i) for name in METRICS}
+        point['time'] = 1000.0 + i
+        point['disk_percent'] = float('nan')
+        store.append(point)
+    history = store.query()
+    assert len(history['time']) == 100 and history['time'][0] == 1150.0
+    assert history['cpu_percent'][-1] == 249.0 and history['disk_percent'][0] is None
+    assert store.latest()['load1'] == 249.0
+    print("✓ metrics store: Ring buffers keep the newest points")
+    
+    recent = store.query(seconds=9, metrics=['cpu_percent'])
+    assert recent['cpu_percent'] == [float(i) for i in range(240, 250)]
+    assert set(recent) == {'time', 'cpu_percent'}
+    downsampled = store.query(points=10, metrics=['cpu_percent'])
+    assert downsampled['cpu_percent'] == [154.5 + 10 * i for i in range(10)]
+    try:
+        store.query(metrics=['nope'])
+        assert False, "unknown metric accepted"
+    except ValueError:
+        pass
+    print("✓ metrics store: History windows and averaged downsampling")
+    
+    async def receive():
+        feed = MetricsFeed(store)
+        queues = [feed.subscribe() for _ in range(3)]
+        # Points arrive from another thread, as from the sampler
+        point = dict(store.latest(), time=2000.0)
+        thread = threading.Thread(target=store.append, args=(point,))
+        thread.start()
+        received = [await asyncio.wait_for(queue.get(), 5) for queue in queues]
+        thread.join()
+        feed.unsubscribe(queues[0])
+        return received, feed.subscribers
+    
+    received, subscribers = asyncio.run(receive())
+    assert [point['time'] for point in received] == [2000.0] * 3 and subscribers == 2
+    print("✓ metrics store: One sample delivered to every subscriber")
+    
+    print("Metrics store test passed!\n")
+
+
+def test_disk_usage():
+    """Test the cached partition list and df timeouts on hung mounts."""
+    print("Testing disk usage...")
+    
+    cache = PartitionCache()
+    partitions = cache.partitions()
+    if cache.watching:
+        assert cache.partitions() is partitions
+        print("✓ df: Partition list cached until the mount table changes")
+    cache.invalidate()
+    assert cache.partitions() is not partitions
+    
+    # One mount point hangs until released, like an unresponsive NFS server
+    hung = partitions[0].mountpoint
+    release = threading.Event()
+    calls = []
+    disk_usage = system_monitor.psutil.disk_usage
+    
+    def slow_disk_usage(path):
+        calls.append(path)
+        if path == hung:
+            release.wait(10)
+        return disk_usage(path)
+    
+    monitor = SystemMonitor()
+    system_monitor.psutil.disk_usage = slow_disk_usage
+    try:
+        for _ in range(2):
+            started = time.perf_counter()
+            output = monitor.get_disk_usage(timeout=0.3)
+            elapsed = time.perf_counter() - started
+            assert elapsed < 2, elapsed
+            assert f"{hung} (unavailable)" in output, output
+        # The stuck call is not repeated while it is still running
+        assert calls.count(hung) == 1
+        print(f"✓ df: Hung mount shown as unavailable after {elapsed:.2f}s")
+    finally:
+        release.set()
+        system_monitor.psutil.disk_usage = disk_usage
+    
+    deadline = time.time() + 5
+    while "(unavailable)" in monitor.get_disk_usage(timeout=1) and time.time() < deadline:
+        time.sleep(0.05)
+    assert "(unavailable)" not in monitor.get_disk_usage(timeout=1)
+    print("✓ df: Mount reported again once it answers")
+    
+    print("Disk usage test passed!\n")
+
+
+class FixedSampler:
+    """Sampler stand-in returning one fixed sample."""
+    
+    def __init__(self, processes):
+        self.sample = {'processes': processes}
+    
+    def latest(self):
+        return self.sample
+
+
+def test_process_listing():
+    """Test ps sorting, top-N selection and filters."""
+    print("Testing process listing...")
+    
+    processes = [(pid, f"worker{pid % 7}", "root" if pid % 2 else "app",
+                  float(pid % 50), float(pid % 13), "running")
+                 for pid in range(1, 5001)]
+    terminal = TerminalCore()
+    terminal.system_monitor = SystemMonitor(FixedSampler(processes))
+    
+    def pids(command):
+        output, code = terminal.execute_command(command)
+        assert code == 0, output
+        return [int(line.split()[0]) for line in output.splitlines()[2:]]
+    
+    top = pids("ps")
+    assert len(top) == 20 and top[:3] == [49, 99, 149]
+    assert pids("ps --sort mem -n 3") == [12, 25, 38]
+    assert pids("ps --sort=pid -n 4") == [1, 2, 3, 4]
+    assert pids("ps --sort=-pid -n 2") == [5000, 4999]
+    assert pids("ps aux -n 1") == [49]
+    print("✓ ps: Sorted by cpu, mem and pid with -n")
+    
+    assert all(pid % 2 == 0 for pid in pids("ps -u app -n 50"))
+    assert all(pid % 7 == 3 for pid in pids("ps WORKER3 --sort pid"))
+    assert pids("ps -u nobody") == []
+    for command in ("ps --sort name", "ps -n x", "ps -z", "ps -n"):
+        output, code = terminal.execute_command(command)
+        assert code == 1 and output.startswith("ps: "), command
+    print("✓ ps: User and name filters, bad options rejected")
+    
+    started = time.perf_counter()
+    for _ in range(20):
+        terminal.system_monitor.get_processes('cpu', limit=10)
+    elapsed = (time.perf_counter() - started) / 20
+    print(f"✓ ps: Top 10 of 5000 processes in {elapsed * 1000:.2f}ms")
+    
+    print("Process listing test passed!\n")
+
+
+def test_command_history():
+    """Test bounded history memory, the on-disk log, paging and search."""
+    print("Testing command history...")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sessions = SessionManager(max_history=5, history_dir=temp_dir)
+        session_id, terminal = sessions.get(None)
+        for i in range(1, 31):
+            terminal.execute_command(f"echo {'even' if i % 2 == 0 else 'odd'} {i}")
+        assert len(terminal.command_history) == 30 and len(terminal.command_history.tail) == 5
+        output, code = terminal.execute_command("history")
+        assert code == 0 and output.splitlines()[0] == "  27  echo odd 27"
+        assert output.splitlines()[-1] == "  31  history"
+        print("✓ history: Memory holds only the newest entries")
+        
+        # Older entries come from the log
+        output, _ = terminal.execute_command("history -n 3 -p 4")
+        assert [line.split()[0] for line in output.splitlines()] == ["21", "22", "23"]
+        output, _ = terminal.execute_command("history -s 'ECHO EVEN' -n 2")
+        # Like history | grep, the search finds itself too
+        assert output.splitlines() == ["  30  echo even 30", "  33  history -s 'ECHO EVEN' -n 2"]
+        output, _ = terminal.execute_command("history 40")
+        assert len(output.splitlines()) == 34 and output.startswith("   1  echo odd 1")
+        output, code = terminal.execute_command("history -p 0")
+        assert code == 1
+        print("✓ history: -n, paging and search reach past memory")
+        
+        # A new backend process reloads each session's history from its log
+        flush_all()
+        with open(os.path.join(temp_dir, f"{session_id}.log"), "a") as f:
+            f.write('"echo cut sho')
+        restarted = SessionManager(max_history=5, history_dir=temp_dir)
+        _, terminal = restarted.get(session_id)
+        assert len(terminal.command_history) == 35
+        assert list(terminal.command_history)[-1] == "history -p 0"
+        terminal.execute_command("pwd")
+        output, _ = terminal.execute_command("history 2")
+        assert output.splitlines() == ["  36  pwd", "  37  history 2"]
+        flush_all()
+        print("✓ history: Survives restarts, dropping a partly written entry")
+        
+        # Evicting a session keeps its log; logs expire after the retention period
+        terminal.execute_command("pwd")
+        assert restarted.remove(session_id)
+        flush_all()
+        _, terminal = restarted.get(session_id)
+        assert list(terminal.command_history)[-1] == "pwd"
+        stale_path = os.path.join(temp_dir, "stale-session.log")
+        with open(stale_path, "w") as f:
+            f.write('"ls"\n')
+        os.utime(stale_path, (time.time() - 7200, time.time() - 7200))
+        assert expire_logs(temp_dir, 3600) == 1
+        assert not os.path.exists(stale_path)
+        assert os.path.exists(os.path.join(temp_dir, f"{session_id}.log"))
+        print("✓ history: Logs outlive eviction and expire after retention")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        history = CommandHistory(max_entries=10, path=os.path.join(temp_dir, "log"),
+                                 max_log_entries=100)
+        for i in range(450):
+            history.append(f"cmd {i}")
+            if i % 50 == 0:
+                history.flush()
+        history.flush()
+        with open(history.path) as f:
+            lines = f.read().splitlines()
+        assert len(lines) <= 200 and lines[-1] == '"cmd 449"'
+        assert len(history) == len(lines) and history.last(1) == [(len(lines), "cmd 449")]
+        assert history.search("cmd 350", 5) == [(len(lines) - 99, "cmd 350")]
+        print(f"✓ history: Log compacted to {len(lines)} entries")
+    
+    print("Command history test passed!\n")
+
+
 def main():
     """Run all tests."""
     print("Python Terminal Emulator - Test Suite")
@@ -167,6 +1215,31 @@ def main():
         test_file_operations()
         test_ai_interpreter()
         test_system_monitoring()
+        test_session_manager()
+        test_session_paths()
+        test_execution_scheduler()
+        test_async_interpretation()
+        test_interpretation_cache()
+        test_pattern_matcher()
+        test_input_classifier()
+        test_request_coalescing()
+        test_model_call_limits()
+        test_suggestion_stream()
+        test_prefix_index()
+        test_directory_cache()
+        test_streaming_output()
+        test_scheduler_streaming()
+        test_output_limits()
+        test_grep_engine()
+        test_find_engine()
+        test_file_index()
+        test_ls_listing()
+        test_copy_engine()
+        test_system_sampler()
+        test_metrics_store()
+        test_process_listing()
+        test_disk_usage()
+        test_command_history()
         
         print("🎉 All tests completed!")
         